@@ -0,0 +1,118 @@
+
+import os
+import shutil
+import subprocess
+from typing import Iterator, Optional
+
+# NumPy - xử lý PCM (tùy chọn)
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+
+# Định dạng PCM dùng chung với pygame mixer
+SAMPLE_RATE = 44100
+CHANNELS = 2
+
+
+def _pcm_command(ffmpeg_path: str, path: str, start: float, duration: Optional[float],
+                 from_end: bool, sample_rate: int, channels: int) -> list:
+    cmd = [ffmpeg_path, "-v", "error"]
+    if from_end and duration:
+        cmd += ["-sseof", f"-{duration:.3f}"]
+    elif start > 0:
+        cmd += ["-ss", f"{start:.3f}"]
+    cmd += ["-i", path]
+    if duration and not from_end:
+        cmd += ["-t", f"{duration:.3f}"]
+    cmd += [
+        "-vn",
+        "-f", "s16le",
+        "-acodec", "pcm_s16le",
+        "-ar", str(sample_rate),
+        "-ac", str(channels),
+        "pipe:1"
+    ]
+    return cmd
+
+
+def decode_pcm(path: str, start: float = 0.0, duration: Optional[float] = None,
+               from_end: bool = False, sample_rate: int = SAMPLE_RATE,
+               channels: int = CHANNELS) -> Optional['np.ndarray']:
+    """
+    Decode một đoạn audio thành PCM int16 shape (frames, channels) qua pipe FFmpeg
+
+    - start/duration: đoạn cần decode (giây), duration=None là đến hết file
+    - from_end=True: lấy duration giây CUỐI file (-sseof), chính xác theo
+      độ dài thực tế thay vì duration ước tính
+    Trả về None nếu không có NumPy/FFmpeg hoặc decode lỗi.
+    """
+    if not NUMPY_AVAILABLE:
+        return None
+    ffmpeg_path = shutil.which("ffmpeg")
+    if not ffmpeg_path:
+        return None
+
+    cmd = _pcm_command(ffmpeg_path, path, start, duration, from_end, sample_rate, channels)
+    try:
+        result = subprocess.run(
+            cmd,
+            capture_output=True,
+            timeout=120,
+            creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+        )
+    except (subprocess.TimeoutExpired, OSError) as e:
+        print(f"⚠️ PCM decode failed for {os.path.basename(path)}: {e}")
+        return None
+    if result.returncode != 0:
+        print(f"⚠️ PCM decode error: {result.stderr.decode('utf-8', errors='ignore')}")
+        return None
+
+    samples = np.frombuffer(result.stdout, dtype=np.int16)
+    frames = len(samples) // channels
+    return samples[:frames * channels].reshape(frames, channels)
+
+
+def iter_pcm_blocks(path: str, block_frames: int, start: float = 0.0,
+                    sample_rate: int = SAMPLE_RATE, channels: int = CHANNELS) -> Iterator['np.ndarray']:
+    """
+    Đọc PCM int16 từng block (frames, channels) từ pipe FFmpeg
+
+    Chỉ giữ một block trong RAM - dùng cho các phân tích một lượt trên cả file.
+    Mọi block có đúng block_frames frame, trừ block cuối.
+    """
+    if not NUMPY_AVAILABLE:
+        return
+    ffmpeg_path = shutil.which("ffmpeg")
+    if not ffmpeg_path:
+        return
+
+    cmd = _pcm_command(ffmpeg_path, path, start, None, False, sample_rate, channels)
+    try:
+        proc = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+        )
+    except OSError as e:
+        print(f"⚠️ PCM decode failed for {os.path.basename(path)}: {e}")
+        return
+
+    block_bytes = block_frames * channels * 2
+    try:
+        while True:
+            data = proc.stdout.read(block_bytes)
+            if not data:
+                break
+            samples = np.frombuffer(data, dtype=np.int16)
+            frames = len(samples) // channels
+            if frames:
+                yield samples[:frames * channels].reshape(frames, channels)
+    finally:
+        proc.stdout.close()
+        if proc.poll() is None:
+            proc.kill()
+        proc.wait()
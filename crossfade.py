@@ -0,0 +1,55 @@
+
+from typing import Optional
+
+from audio_decode import NUMPY_AVAILABLE, SAMPLE_RATE, decode_pcm
+
+if NUMPY_AVAILABLE:
+    import numpy as np
+
+
+def fade_curves(frames: int):
+    """Cặp đường gain equal-power (fade out, fade in) - tổng công suất không đổi"""
+    t = np.linspace(0.0, 1.0, frames, dtype=np.float32)
+    return np.cos(t * (np.pi / 2)), np.sin(t * (np.pi / 2))
+
+
+def apply_gain(pcm: 'np.ndarray', gain: 'np.ndarray') -> 'np.ndarray':
+    """Nhân gain theo từng sample (mọi kênh), clip về int16"""
+    scaled = pcm.astype(np.float32) * gain[:, None]
+    return np.clip(scaled, -32768, 32767).astype(np.int16)
+
+
+def build_crossfade(tail: 'np.ndarray', head: 'np.ndarray'):
+    """
+    Tạo hai đoạn PCM đã áp ramp cho vùng chồng nhau
+
+    tail: cuối bài đang phát, head: đầu bài kế tiếp (int16, (frames, channels)).
+    Độ dài overlap là đoạn ngắn hơn. Trả về (fade_out, fade_in, frames).
+    """
+    frames = min(len(tail), len(head))
+    fade_out, fade_in = fade_curves(frames)
+    return (apply_gain(tail[len(tail) - frames:], fade_out),
+            apply_gain(head[:frames], fade_in),
+            frames)
+
+
+def prepare_crossfade(current_path: str, next_path: str, length: float,
+                      tail_end: float = 0.0, head_start: float = 0.0) -> Optional[tuple]:
+    """
+    Decode + áp ramp cho vùng overlap giữa hai file (chạy trên thread nền)
+
+    tail_end/head_start: điểm cắt im lặng (0 = cuối/đầu file).
+
+    Trả về (fade_out_pcm, fade_in_pcm, seconds) hoặc None nếu không decode được.
+    """
+    if not NUMPY_AVAILABLE or length <= 0:
+        return None
+    if tail_end > 0:
+        tail = decode_pcm(current_path, start=max(0.0, tail_end - length), duration=length)
+    else:
+        tail = decode_pcm(current_path, duration=length, from_end=True)
+    head = decode_pcm(next_path, start=head_start, duration=length)
+    if tail is None or head is None or not len(tail) or not len(head):
+        return None
+    fade_out, fade_in, frames = build_crossfade(tail, head)
+    return fade_out, fade_in, frames / SAMPLE_RATE
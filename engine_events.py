@@ -0,0 +1,70 @@
+
+import queue
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+
+# Loại sự kiện engine gửi về UI
+TRACK_ENDED = 'track_ended'
+TRACK_CHANGED = 'track_changed'   # Chuyển sang bài đã queue (gapless)
+LOAD_COMPLETE = 'load_complete'
+ERROR = 'error'
+
+
+@dataclass
+class EngineEvent:
+    """Một sự kiện từ audio engine"""
+    kind: str
+    data: dict = field(default_factory=dict)
+
+
+class EngineEventChannel:
+    """
+    Kênh sự kiện engine -> UI qua MỘT hàng đợi dispatch
+
+    Engine post() từ bất kỳ thread nào; notifier báo cho UI lên lịch
+    dispatch() trên main thread (root.after), handler chỉ chạy ở đó.
+    """
+
+    def __init__(self):
+        self._queue: queue.Queue = queue.Queue()
+        self._handlers: dict[str, list[Callable[[EngineEvent], None]]] = {}
+        self._notifier: Optional[Callable[[], None]] = None
+        self._lock = threading.Lock()
+        self._dispatch_scheduled = False
+
+    def set_notifier(self, notifier: Optional[Callable[[], None]]) -> None:
+        """notifier() được gọi (từ thread bất kỳ) khi có sự kiện mới"""
+        self._notifier = notifier
+
+    def subscribe(self, kind: str, handler: Callable[[EngineEvent], None]) -> None:
+        self._handlers.setdefault(kind, []).append(handler)
+
+    def post(self, kind: str, **data) -> None:
+        """Gửi sự kiện - gộp nhiều sự kiện liên tiếp vào một lần dispatch"""
+        self._queue.put(EngineEvent(kind, data))
+        with self._lock:
+            if self._dispatch_scheduled:
+                return
+            self._dispatch_scheduled = True
+        if self._notifier:
+            self._notifier()
+
+    def dispatch(self) -> int:
+        """Xử lý hết sự kiện đang chờ - gọi trên main thread"""
+        with self._lock:
+            self._dispatch_scheduled = False
+        count = 0
+        while True:
+            try:
+                event = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            count += 1
+            for handler in self._handlers.get(event.kind, []):
+                try:
+                    handler(event)
+                except Exception as e:
+                    print(f"Error handling engine event {event.kind}: {e}")
+        return count
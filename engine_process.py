@@ -0,0 +1,452 @@
+
+import multiprocessing
+import os
+import threading
+import time
+from typing import Optional
+
+from engine_events import EngineEventChannel, TRACK_ENDED, TRACK_CHANGED, LOAD_COMPLETE, ERROR
+from playback_clock import PlaybackClock
+from media_probe import MediaProbe, ProbeStore
+from loudness import LoudnessAnalyzer
+from silence import SilenceAnalyzer, analyze_track
+from transcoder import PRIORITY_PREFETCH
+
+
+# Giao thức qua multiprocessing Pipe (tuple, pickle):
+#   UI -> engine:  (seq, 'call', name, args, kwargs, want_reply)
+#                  (seq, 'set', name, value)
+#                  (seq, 'analysis', path, fields)    kết quả phân tích từ process UI
+#                  (seq, 'shutdown')
+#   engine -> UI:  ('state', snapshot)                định kỳ + trước mỗi sự kiện
+#                  ('event', kind, data)
+#                  ('reply', seq, ok, value, snapshot)
+
+# Lệnh UI được phép gọi trên engine
+COMMANDS = {
+    'load', 'play', 'pause', 'stop', 'seek', 'play_from_pos',
+    'queue_next', 'prefetch', 'refresh_loudness',
+    'set_eq_gain', 'set_eq_enabled', 'attach_store_file', 'cleanup_temp',
+}
+SETTABLE = {'volume', 'gapless', 'crossfade', 'normalize', 'trim_silence', 'duration'}
+EVENT_KINDS = (TRACK_ENDED, TRACK_CHANGED, LOAD_COMPLETE, ERROR)
+ANALYSIS_FIELDS = ('loudness', 'trim')
+
+STATE_INTERVAL = 0.1     # Giây giữa hai snapshot trạng thái
+LOAD_TIMEOUT = 300.0     # load() có thể phải convert cả file
+
+
+def _snapshot(engine, ack: int) -> dict:
+    """Trạng thái engine gửi về UI (chỉ kiểu dữ liệu đơn giản)"""
+    return {
+        'ack': ack,
+        'loaded': bool(engine._current_loaded_path),
+        'is_playing': engine.is_playing,
+        'is_paused': engine.is_paused,
+        'position': engine.get_pos(),
+        'duration': engine.duration,
+        'has_video': engine._has_video,
+        'video_path': engine._video_path,
+        'temp_file': engine._temp_file,
+        'eq_active': engine.equalizer.active,
+        'eq_cost': engine.equalizer.cost_per_second(),
+        'eq_bypassed': engine.eq_bypassed,
+        'time': time.monotonic(),
+    }
+
+
+class EngineServer:
+    """
+    Chạy trong process engine: nhận lệnh từ Pipe, stream clock + sự kiện về UI
+
+    Lệnh được xử lý tuần tự trên main thread của process; watcher, convert,
+    decode vẫn chạy trên các thread riêng của MusicEngine như khi chạy in-process.
+    """
+
+    def __init__(self, engine, conn):
+        self.engine = engine
+        self.conn = conn
+        self._send_lock = threading.Lock()
+        self._ack = 0
+        self._running = True
+        for kind in EVENT_KINDS:
+            engine.events.subscribe(kind, self._forward_event)
+        # Không có Tk - dispatch ngay trên thread vừa post sự kiện
+        engine.events.set_notifier(engine.events.dispatch)
+
+    def _send(self, message) -> None:
+        with self._send_lock:
+            try:
+                self.conn.send(message)
+            except (OSError, EOFError, BrokenPipeError):
+                self._running = False
+
+    def _forward_event(self, event) -> None:
+        # Snapshot trước để handler bên UI đọc được trạng thái mới
+        self._send(('state', _snapshot(self.engine, self._ack)))
+        self._send(('event', event.kind, event.data))
+
+    def _state_loop(self) -> None:
+        while self._running:
+            self._send(('state', _snapshot(self.engine, self._ack)))
+            time.sleep(STATE_INTERVAL)
+
+    def serve_forever(self) -> None:
+        threading.Thread(target=self._state_loop, daemon=True, name="engine-state").start()
+        while self._running:
+            try:
+                message = self.conn.recv()
+            except (EOFError, OSError):
+                break  # Process UI đã thoát
+            seq, kind = message[0], message[1]
+            if kind == 'shutdown':
+                break
+            self._handle(seq, kind, message[2:])
+            self._ack = seq
+        self._running = False
+        self.engine.stop()
+        self.engine.shutdown()
+
+    def _handle(self, seq: int, kind: str, payload: tuple) -> None:
+        if kind == 'set':
+            name, value = payload
+            if name in SETTABLE:
+                setattr(self.engine, name, value)
+            return
+        if kind == 'analysis':
+            path, fields = payload
+            store = self.engine.probe.store
+            if store is not None:
+                for field, value in fields.items():
+                    if value is not None:
+                        store.put(path, field, value)
+            self.engine.refresh_loudness(path)
+            return
+        if kind != 'call':
+            return
+
+        name, args, kwargs, want_reply = payload
+        ok, value = True, None
+        try:
+            if name not in COMMANDS:
+                raise ValueError(f"Unknown engine command: {name}")
+            if name == 'attach_store_file':
+                # Bản đọc của probe store - chỉ process UI ghi file
+                self.engine.attach_store(ProbeStore(*args))
+            else:
+                value = getattr(self.engine, name)(*args, **kwargs)
+        except Exception as e:
+            print(f"⚠️ Engine command {name} failed: {e}")
+            ok, value = False, str(e)
+        if want_reply:
+            self._ack = seq
+            self._send(('reply', seq, ok, value, _snapshot(self.engine, seq)))
+
+
+def run_engine_process(conn, options: dict) -> None:
+    """Entry của process engine"""
+    from music_engine import MusicEngine
+    engine = MusicEngine(**options)
+    EngineServer(engine, conn).serve_forever()
+
+
+def _remote_setting(name: str) -> property:
+    """Thuộc tính cấu hình: đọc giá trị cục bộ, ghi thì gửi sang engine"""
+    def getter(self):
+        return self._settings[name]
+
+    def setter(self, value):
+        self._settings[name] = value
+        self._send('set', name, value)
+    return property(getter, setter)
+
+
+class RemoteEqualizer:
+    """Phía UI của Equalizer - giữ gain đã đặt, chi phí CPU lấy từ state stream"""
+
+    def __init__(self, remote: 'RemoteEngine'):
+        from equalizer import EQ_BANDS
+        self._remote = remote
+        self.gains = [0.0] * len(EQ_BANDS)
+        self.enabled = True
+
+    @property
+    def active(self) -> bool:
+        return self._remote._state.get('eq_active', False)
+
+    def cost_per_second(self) -> float:
+        return self._remote._state.get('eq_cost', 0.0)
+
+
+class RemoteEngine:
+    """
+    Proxy của MusicEngine chạy ở process riêng - cùng giao diện app đang dùng
+
+    - Lệnh điều khiển (play/pause/seek/...) gửi một chiều, không chờ engine
+    - load() chờ kết quả như bản in-process
+    - Clock cục bộ bám theo snapshot engine gửi về để UI/video nội suy mượt
+    - Probe/phân tích thư viện chạy ở process UI, kết quả đẩy sang engine
+    """
+
+    volume = _remote_setting('volume')
+    gapless = _remote_setting('gapless')
+    crossfade = _remote_setting('crossfade')
+    normalize = _remote_setting('normalize')
+    trim_silence = _remote_setting('trim_silence')
+
+    def __init__(self, **options):
+        # spawn: process mới sạch, không kế thừa Tk/thread của UI
+        context = multiprocessing.get_context('spawn')
+        self._conn, child_conn = context.Pipe()
+        self._process = context.Process(target=run_engine_process, args=(child_conn, options),
+                                        daemon=True, name="melodify-engine")
+        self._process.start()
+        child_conn.close()
+
+        self._send_lock = threading.Lock()
+        self._seq = 0
+        self._replies: dict = {}
+        self._reply_cond = threading.Condition()
+        self._state: dict = {}
+        self._settings = {'volume': 0.7, 'gapless': True, 'crossfade': 0.0,
+                          'normalize': True, 'trim_silence': True}
+
+        self.events = EngineEventChannel()
+        self.clock = PlaybackClock()
+        self.probe = MediaProbe()
+        self.loudness = LoudnessAnalyzer()
+        self.silence = SilenceAnalyzer()
+        self.equalizer = RemoteEqualizer(self)
+        base_dir = os.path.dirname(__file__)
+        self._temp_dir = os.path.join(base_dir, '.temp_audio')
+        self._youtube_dir = os.path.join(base_dir, '.youtube_downloads')
+        if not os.path.exists(self._youtube_dir):
+            os.makedirs(self._youtube_dir)
+
+        threading.Thread(target=self._reader_loop, daemon=True, name="engine-reader").start()
+
+    # ==================== IPC ====================
+
+    def _send(self, *message) -> int:
+        with self._send_lock:
+            self._seq += 1
+            seq = self._seq
+            try:
+                self._conn.send((seq,) + message)
+            except (OSError, BrokenPipeError) as e:
+                print(f"⚠️ Engine process unavailable: {e}")
+        return seq
+
+    def _call(self, name: str, *args, wait: bool = False, timeout: float = 5.0, **kwargs):
+        seq = self._send('call', name, args, kwargs, wait)
+        if not wait:
+            return None
+        deadline = time.monotonic() + timeout
+        with self._reply_cond:
+            while seq not in self._replies:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._process.is_alive():
+                    print(f"⚠️ Engine did not answer {name}")
+                    return None
+                self._reply_cond.wait(remaining)
+            ok, value = self._replies.pop(seq)
+        return value if ok else None
+
+    def _reader_loop(self) -> None:
+        while True:
+            try:
+                message = self._conn.recv()
+            except (EOFError, OSError):
+                break
+            kind = message[0]
+            if kind == 'state':
+                self._apply_state(message[1])
+            elif kind == 'event':
+                self.events.post(message[1], **message[2])
+            elif kind == 'reply':
+                _, seq, ok, value, snapshot = message
+                self._apply_state(snapshot)
+                with self._reply_cond:
+                    self._replies[seq] = (ok, value)
+                    self._reply_cond.notify_all()
+
+    def _apply_state(self, state: dict) -> None:
+        """Nhận snapshot - phần phát/vị trí chỉ áp khi engine đã xử lý hết lệnh đã gửi"""
+        playback = state['ack'] >= self._seq
+        if not playback:
+            # Giữ trạng thái lạc quan của lệnh đang chờ
+            state = dict(state, is_playing=self._state.get('is_playing', False),
+                         is_paused=self._state.get('is_paused', False))
+        self._state = state
+        self.clock.duration = state['duration']
+        if not playback:
+            return
+        # Bù thời gian truyền qua pipe rồi bám clock cục bộ theo engine
+        position = state['position']
+        if state['is_playing'] and not state['is_paused']:
+            position += time.monotonic() - state['time']
+            if not self.clock.running:
+                self.clock.start(position)
+            elif abs(self.clock.position() - position) > 0.05:
+                self.clock.seek(position)
+        else:
+            self.clock.pause()
+            if abs(self.clock.position() - position) > 0.05:
+                self.clock.seek(position)
+
+    def _set_optimistic(self, **values) -> None:
+        self._state = dict(self._state, **values)
+
+    # ==================== Giao diện MusicEngine ====================
+
+    def attach_store(self, store: ProbeStore) -> None:
+        self.probe.store = store
+        self.loudness.store = store
+        self.silence.store = store
+        self._call('attach_store_file', store.filepath)
+
+    def load(self, path: str) -> bool:
+        self.clock.stop()
+        self._set_optimistic(is_playing=False, is_paused=False)
+        return bool(self._call('load', path, wait=True, timeout=LOAD_TIMEOUT))
+
+    def play(self, start_pos: float = 0.0) -> None:
+        if self.is_paused:
+            self.clock.resume()
+        else:
+            self.clock.start(start_pos)
+        self._set_optimistic(is_playing=True, is_paused=False)
+        self._call('play', start_pos)
+
+    def pause(self) -> None:
+        if self.is_playing and not self.is_paused:
+            self.clock.pause()
+            self._set_optimistic(is_paused=True)
+            self._call('pause')
+
+    def stop(self) -> None:
+        self.clock.stop()
+        self._set_optimistic(is_playing=False, is_paused=False, loaded=False,
+                             has_video=False, video_path=None)
+        self._call('stop')
+
+    def seek(self, position: float) -> bool:
+        if not self._state.get('loaded'):
+            return False
+        self.clock.seek(position)
+        self._call('seek', position)
+        return True
+
+    def play_from_pos(self, position: float) -> None:
+        self.clock.seek(position)
+        self._call('play_from_pos', position)
+
+    def get_pos(self) -> float:
+        return self.clock.position()
+
+    def is_active(self) -> bool:
+        return self.is_playing and not self.is_paused
+
+    def queue_next(self, path: str) -> None:
+        self._call('queue_next', path)
+
+    def prefetch(self, path: str, priority: int = PRIORITY_PREFETCH) -> None:
+        self._call('prefetch', path, priority)
+
+    def has_video_stream(self, path: str) -> bool:
+        info = self.probe.probe(path)
+        return bool(info and info.has_video)
+
+    def cleanup_temp(self) -> None:
+        self._call('cleanup_temp')
+
+    def refresh_loudness(self, path: str) -> None:
+        """Kết quả phân tích (ở process UI) -> store của engine"""
+        store = self.probe.store
+        if store is None:
+            return
+        fields = {field: store.get(path, field) for field in ANALYSIS_FIELDS}
+        self._send('analysis', path, fields)
+
+    def set_eq_gain(self, band: int, gain_db: float) -> None:
+        self.equalizer.gains[band] = gain_db
+        self._call('set_eq_gain', band, gain_db)
+
+    def set_eq_enabled(self, enabled: bool) -> None:
+        self.equalizer.enabled = enabled
+        self._call('set_eq_enabled', enabled)
+
+    def analyze_track(self, path: str) -> Optional[dict]:
+        # Cùng cách phân tích với MusicEngine - chạy trên LibraryJob của process UI
+        return analyze_track(self.loudness, self.silence, path)
+
+    def is_track_analyzed(self, path: str) -> bool:
+        return self.loudness.is_known(path) and self.silence.is_known(path)
+
+    def shutdown(self) -> None:
+        self._send('shutdown')
+        self._process.join(timeout=3)
+        if self._process.is_alive():
+            self._process.terminate()
+
+    @property
+    def pcm(self):
+        return None  # PCM nằm trong process engine
+
+    @property
+    def is_playing(self) -> bool:
+        return self._state.get('is_playing', False)
+
+    @property
+    def is_paused(self) -> bool:
+        return self._state.get('is_paused', False)
+
+    @property
+    def duration(self) -> float:
+        return self._state.get('duration', 0.0)
+
+    @duration.setter
+    def duration(self, value: float) -> None:
+        self._set_optimistic(duration=value)
+        self.clock.duration = value
+        self._send('set', 'duration', value)
+
+    @property
+    def eq_bypassed(self) -> bool:
+        return self._state.get('eq_bypassed', False)
+
+    @property
+    def _has_video(self) -> bool:
+        return self._state.get('has_video', False)
+
+    @property
+    def _video_path(self) -> Optional[str]:
+        return self._state.get('video_path')
+
+    @property
+    def _temp_file(self) -> Optional[str]:
+        return self._state.get('temp_file')
+
+
+if __name__ == '__main__':
+    # Chạy engine headless: python engine_process.py <file> [giây]
+    import sys
+    if len(sys.argv) < 2:
+        print("Usage: python engine_process.py <file> [seconds]")
+        sys.exit(1)
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 10.0
+    engine = RemoteEngine()
+    for kind in EVENT_KINDS:
+        engine.events.subscribe(kind, lambda event: print(f"event {event.kind}: {event.data}"))
+    if not engine.load(sys.argv[1]):
+        print("Load failed")
+        engine.shutdown()
+        sys.exit(1)
+    engine.play()
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        engine.events.dispatch()
+        print(f"\r{engine.get_pos():7.2f}s / {engine.duration:.2f}s", end="", flush=True)
+        time.sleep(0.2)
+    print()
+    engine.shutdown()
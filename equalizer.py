@@ -0,0 +1,236 @@
+
+import math
+import threading
+import time
+from typing import Optional
+
+from audio_decode import NUMPY_AVAILABLE, SAMPLE_RATE
+
+if NUMPY_AVAILABLE:
+    import numpy as np
+
+
+# Tần số trung tâm 10 dải (Hz) - dải đầu/cuối là shelf, còn lại peaking
+EQ_BANDS = (31, 62, 125, 250, 500, 1000, 2000, 4000, 8000, 16000)
+EQ_Q = 1.41
+MAX_GAIN_DB = 12.0
+
+
+def biquad_coefficients(kind: str, freq: float, gain_db: float, q: float = EQ_Q,
+                        sample_rate: int = SAMPLE_RATE) -> tuple:
+    """Hệ số biquad theo RBJ Audio EQ Cookbook - (b0, b1, b2, a0, a1, a2)"""
+    A = math.pow(10.0, gain_db / 40.0)
+    w0 = 2 * math.pi * freq / sample_rate
+    cos_w0 = math.cos(w0)
+    sin_w0 = math.sin(w0)
+
+    if kind == 'peaking':
+        alpha = sin_w0 / (2 * q)
+        return (1 + alpha * A, -2 * cos_w0, 1 - alpha * A,
+                1 + alpha / A, -2 * cos_w0, 1 - alpha / A)
+
+    # Shelf với độ dốc S = 1
+    alpha = sin_w0 / 2 * math.sqrt(2)
+    sqrt_a = 2 * math.sqrt(A) * alpha
+    if kind == 'lowshelf':
+        return (A * ((A + 1) - (A - 1) * cos_w0 + sqrt_a),
+                2 * A * ((A - 1) - (A + 1) * cos_w0),
+                A * ((A + 1) - (A - 1) * cos_w0 - sqrt_a),
+                (A + 1) + (A - 1) * cos_w0 + sqrt_a,
+                -2 * ((A - 1) + (A + 1) * cos_w0),
+                (A + 1) + (A - 1) * cos_w0 - sqrt_a)
+    if kind == 'highshelf':
+        return (A * ((A + 1) + (A - 1) * cos_w0 + sqrt_a),
+                -2 * A * ((A - 1) + (A + 1) * cos_w0),
+                A * ((A + 1) + (A - 1) * cos_w0 - sqrt_a),
+                (A + 1) - (A - 1) * cos_w0 + sqrt_a,
+                2 * ((A - 1) - (A + 1) * cos_w0),
+                (A + 1) - (A - 1) * cos_w0 - sqrt_a)
+    raise ValueError(f"Unknown biquad kind: {kind}")
+
+
+class Equalizer:
+    """
+    EQ 10 dải = chuỗi biquad nối tiếp, áp lên PCM bằng FFT (không cần SciPy)
+
+    Vòng lặp IIR từng sample trong Python quá chậm, nên đáp ứng tần số của cả
+    chuỗi biquad được tính một lần khi đổi gain, chuyển thành impulse response
+    (TAPS sample), rồi lọc mỗi block bằng nhân phổ. Mỗi block kèm TAPS-1 frame
+    lịch sử nên xử lý block nào, theo thứ tự nào cũng cho kết quả liền mạch.
+    """
+
+    TAPS = 8192   # ~186ms - đủ cho biquad 31Hz tắt dần
+
+    def __init__(self, sample_rate: int = SAMPLE_RATE):
+        self.sample_rate = sample_rate
+        self.gains = [0.0] * len(EQ_BANDS)
+        self.enabled = True
+        self.version = 0
+        self._lock = threading.Lock()
+        self._impulse = None          # IR của thiết lập hiện tại (None = phẳng)
+        self._spectra: dict = {}      # Kích thước FFT -> phổ IR
+        # Thống kê chi phí CPU
+        self.cpu_seconds = 0.0
+        self.audio_seconds = 0.0
+
+    @property
+    def active(self) -> bool:
+        return NUMPY_AVAILABLE and self.enabled and self._impulse is not None
+
+    def set_gain(self, band: int, gain_db: float) -> None:
+        self.gains[band] = max(-MAX_GAIN_DB, min(MAX_GAIN_DB, float(gain_db)))
+        self._redesign()
+
+    def set_gains(self, gains) -> None:
+        for i, gain in enumerate(list(gains)[:len(EQ_BANDS)]):
+            self.gains[i] = max(-MAX_GAIN_DB, min(MAX_GAIN_DB, float(gain)))
+        self._redesign()
+
+    def reset(self) -> None:
+        self.set_gains([0.0] * len(EQ_BANDS))
+
+    def cost_per_second(self) -> float:
+        """Giây CPU cho mỗi giây audio đã xử lý (0.01 = 1%)"""
+        with self._lock:
+            if self.audio_seconds <= 0:
+                return 0.0
+            return self.cpu_seconds / self.audio_seconds
+
+    def _redesign(self) -> None:
+        """Tính lại impulse response của chuỗi biquad (vectorized theo tần số)"""
+        if not NUMPY_AVAILABLE:
+            return
+        if all(abs(g) < 0.05 for g in self.gains):
+            impulse = None
+        else:
+            size = self.TAPS * 4
+            w = 2 * np.pi * np.fft.rfftfreq(size, 1.0 / self.sample_rate) / self.sample_rate
+            z1 = np.exp(-1j * w)
+            z2 = z1 * z1
+            response = np.ones_like(z1)
+            for i, (freq, gain) in enumerate(zip(EQ_BANDS, self.gains)):
+                if abs(gain) < 0.05:
+                    continue
+                kind = 'lowshelf' if i == 0 else 'highshelf' if i == len(EQ_BANDS) - 1 else 'peaking'
+                b0, b1, b2, a0, a1, a2 = biquad_coefficients(kind, freq, gain, sample_rate=self.sample_rate)
+                response *= (b0 + b1 * z1 + b2 * z2) / (a0 + a1 * z1 + a2 * z2)
+
+            # Preamp: chừa headroom cho dải được boost
+            response *= math.pow(10.0, -max(0.0, max(self.gains)) / 20.0)
+            impulse = np.fft.irfft(response, size)[:self.TAPS]
+            # Fade đuôi để cắt IR không gây ringing
+            fade = self.TAPS // 8
+            impulse[-fade:] *= np.hanning(2 * fade)[fade:]
+            impulse = impulse.astype(np.float32)
+
+        with self._lock:
+            self._impulse = impulse
+            self._spectra = {}
+            self.version += 1
+
+    def _spectrum(self, size: int):
+        with self._lock:
+            impulse = self._impulse
+            spectrum = self._spectra.get(size)
+            if spectrum is None and impulse is not None:
+                spectrum = np.fft.rfft(impulse, size)
+                self._spectra[size] = spectrum
+            return spectrum
+
+    def process(self, pcm, start: int, end: int):
+        """Block [start, end) của pcm (int16, (frames, channels)) sau EQ"""
+        if not self.active:
+            return pcm[start:end]
+        started = time.perf_counter()
+
+        history = max(0, start - (self.TAPS - 1))
+        segment = pcm[history:end].astype(np.float32)
+        size = 1 << (len(segment) + self.TAPS - 2).bit_length()
+        spectrum = self._spectrum(size)
+        if spectrum is None:
+            return pcm[start:end]
+        filtered = np.fft.irfft(np.fft.rfft(segment, size, axis=0) * spectrum[:, None],
+                                size, axis=0)
+        offset = start - history
+        out = np.clip(filtered[offset:offset + (end - start)], -32768, 32767).astype(np.int16)
+
+        elapsed = time.perf_counter() - started
+        # Thread look-ahead và thread feeder cùng gọi process() - cộng dồn dưới lock
+        with self._lock:
+            self.cpu_seconds += elapsed
+            self.audio_seconds += (end - start) / self.sample_rate
+        return out
+
+
+class EqualizerStage:
+    """
+    Gắn Equalizer vào PCMStreamer: xử lý trước các chunk sắp phát trên thread nền
+
+    Đổi gain -> bỏ các chunk đã xử lý (đều chưa phát) và tính lại từ vị trí
+    con trỏ của streamer; chunk đã giao cho Channel giữ nguyên.
+    """
+
+    LOOKAHEAD_CHUNKS = 10   # ~2 giây với chunk 0.2s
+
+    def __init__(self, equalizer: Equalizer, streamer):
+        self.equalizer = equalizer
+        self.streamer = streamer
+        self._ready: dict = {}
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def process_chunk(self, pcm, start: int, end: int):
+        """Hook process_chunk của PCMStreamer - dùng chunk đã xử lý sẵn nếu còn hợp lệ"""
+        if not self.equalizer.active:
+            return pcm[start:end]
+        with self._cond:
+            entry = self._ready.pop((id(pcm), start, end), None)
+            self._cond.notify()
+        self._ensure_worker()
+        if entry is not None and entry[0] == self.equalizer.version:
+            return entry[1]
+        return self.equalizer.process(pcm, start, end)
+
+    def invalidate(self) -> None:
+        """Thiết lập EQ vừa đổi - xử lý lại phần chưa phát"""
+        with self._cond:
+            self._ready.clear()
+            self._cond.notify()
+        self._ensure_worker()
+
+    def _ensure_worker(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._worker_loop, daemon=True, name="eq-ahead")
+            self._thread.start()
+
+    def _worker_loop(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait(timeout=self.streamer.CHUNK_SECONDS)
+            if not self.equalizer.active or not self.streamer.active:
+                continue
+
+            pcm, cursor = self.streamer.unplayed()
+            if pcm is None:
+                continue
+            chunk = self.streamer.chunk_frames
+            version = self.equalizer.version
+            for k in range(self.LOOKAHEAD_CHUNKS):
+                start = cursor + k * chunk
+                if start >= len(pcm):
+                    break
+                end = min(start + chunk, len(pcm))
+                key = (id(pcm), start, end)
+                with self._cond:
+                    entry = self._ready.get(key)
+                if entry is not None and entry[0] == version:
+                    continue
+                data = self.equalizer.process(pcm, start, end)
+                with self._cond:
+                    if version != self.equalizer.version:
+                        break  # Gain lại đổi giữa chừng
+                    self._ready[key] = (version, data)
+            # Bỏ chunk đã lỗi thời (trước con trỏ hoặc của bài khác)
+            with self._cond:
+                for key in [k for k in self._ready if k[0] != id(pcm) or k[1] < cursor]:
+                    del self._ready[key]
@@ -0,0 +1,174 @@
+import os
+import hashlib
+import shutil
+import subprocess
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from media_probe import file_fingerprint
+
+
+class FileCache:
+    """
+    Cache file dẫn xuất từ media (poster, sprite sheet, waveform, proxy) trên đĩa
+
+    - Tên file theo hash (path, size, mtime) - file gốc đổi thì tạo lại
+    - Ghi ra file .part rồi os.replace để không bao giờ đọc phải file dở
+    - Gộp request trùng: key đang tạo thì chỉ thêm callback, xong gọi tất cả
+    - LRU nhỏ trong RAM cho giá trị đã load (max_items=0 = không giới hạn)
+
+    Lớp con chỉ cần command() (lệnh ffmpeg) hoặc produce(), và load(); mỗi lớp
+    tự có request() công khai theo tham số của mình, gọi _request().
+    """
+
+    SUFFIX = ''
+    LABEL = "File cache"     # Tên trong log lỗi
+    TIMEOUT = 60             # Giây tối đa cho một lệnh ffmpeg
+
+    def __init__(self, cache_dir: str, call_on_main: Optional[Callable[[Callable], None]] = None,
+                 max_items: int = 0, max_workers: int = 1, thread_name: str = "file-cache"):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        self.call_on_main = call_on_main     # None = gọi callback ngay trên worker
+        self.max_items = max_items
+        self._memory: OrderedDict = OrderedDict()
+        self._pending: Dict[object, List[Callable]] = {}   # key -> callback đang chờ
+        self._building: Dict[str, threading.Event] = {}     # cache_path -> Event, set khi ghi xong
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=thread_name)
+
+    def cache_path(self, path: str) -> Optional[str]:
+        """File cache của path - None nếu không đọc được file gốc"""
+        key = file_fingerprint(path)
+        if key is None:
+            return None
+        digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.cache_dir, f"{digest}{self.SUFFIX}")
+
+    def recall(self, key):
+        """Giá trị đã load trong RAM - None nếu chưa có (đánh dấu vừa dùng)"""
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+            return value
+
+    def remember(self, key, value) -> None:
+        with self._lock:
+            self._memory[key] = value
+            while self.max_items and len(self._memory) > self.max_items:
+                self._memory.popitem(last=False)
+
+    def _request(self, path: str, callback: Optional[Callable[[str, object], None]],
+                 key=None, args: tuple = ()) -> None:
+        """
+        Gọi callback(path, value) khi có giá trị - ngay nếu đã trong RAM, không thì
+        sau khi build + load ở nền (trên Tk thread nếu có call_on_main)
+        """
+        key = path if key is None else key
+        value = self.recall(key)
+        if value is not None:
+            if callback is not None:
+                callback(path, value)
+            return
+        with self._lock:
+            if key in self._pending:
+                if callback is not None:
+                    self._pending[key].append(callback)
+                return
+            self._pending[key] = [callback] if callback is not None else []
+        self._executor.submit(self._run, path, key, args)
+
+    def _run(self, path: str, key, args: tuple) -> None:
+        value = None
+        try:
+            cache_path = self.build(path, *args)
+            if cache_path is not None:
+                value = self.load(path, cache_path, key)
+        except Exception as e:
+            print(f"⚠️ {self.LABEL} failed for {os.path.basename(path)}: {e}")
+        if self.call_on_main is not None:
+            self.call_on_main(lambda: self._finish(path, key, value))
+        else:
+            self._finish(path, key, value)
+
+    def _finish(self, path: str, key, value) -> None:
+        with self._lock:
+            callbacks = self._pending.pop(key, [])
+        if value is None:
+            return
+        value = self.deliver(key, value)
+        self.remember(key, value)
+        for callback in callbacks:
+            try:
+                callback(path, value)
+            except Exception as e:
+                print(f"⚠️ {self.LABEL} callback failed for {os.path.basename(path)}: {e}")
+
+    def build(self, path: str, *args) -> Optional[str]:
+        """File cache trên đĩa (tạo nếu chưa có) - chạy trên thread nền"""
+        cache_path = self.cache_path(path)
+        if cache_path is None:
+            return None
+        with self._lock:
+            done = self._building.get(cache_path)
+            if done is None and not os.path.exists(cache_path):
+                self._building[cache_path] = threading.Event()
+        if done is not None:
+            done.wait()  # Thread khác đang tạo cùng file
+        if done is not None or os.path.exists(cache_path):
+            return cache_path if os.path.exists(cache_path) else None
+
+        part_path = cache_path + '.part'
+        try:
+            if self.produce(path, part_path, *args) and os.path.exists(part_path):
+                os.replace(part_path, cache_path)
+                return cache_path
+        except Exception as e:
+            print(f"⚠️ {self.LABEL} failed for {os.path.basename(path)}: {e}")
+        finally:
+            with self._lock:
+                self._building.pop(cache_path).set()
+        try:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+        except OSError:
+            pass
+        return None
+
+    def produce(self, path: str, part_path: str, *args) -> bool:
+        """Ghi kết quả ra part_path - mặc định chạy lệnh ffmpeg từ command()"""
+        ffmpeg_path = shutil.which("ffmpeg")
+        if not ffmpeg_path:
+            return False
+        cmd = self.command(ffmpeg_path, path, part_path, *args)
+        if cmd is None:
+            return False
+        result = subprocess.run(
+            cmd,
+            capture_output=True,
+            timeout=self.TIMEOUT,
+            creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+        )
+        if result.returncode != 0:
+            print(f"⚠️ {self.LABEL} failed for {os.path.basename(path)}: "
+                  f"{result.stderr.decode('utf-8', errors='ignore').strip()}")
+            return False
+        return True
+
+    def command(self, ffmpeg_path: str, path: str, output_path: str, *args) -> Optional[list]:
+        """Lệnh ffmpeg ghi kết quả ra output_path - None nếu không tạo được (lớp con override)"""
+        return None
+
+    def load(self, path: str, cache_path: str, key):
+        """Đọc file cache (thread nền) -> giá trị giao cho deliver/callback"""
+        return cache_path
+
+    def deliver(self, key, value):
+        """Chuyển giá trị đã load trước khi lưu RAM + gọi callback (Tk thread nếu có call_on_main)"""
+        return value
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
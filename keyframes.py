@@ -0,0 +1,105 @@
+
+import os
+import bisect
+import subprocess
+from typing import List, Optional
+
+from media_probe import ProbeStore, find_ffprobe
+
+
+def probe_keyframes(path: str, ffprobe_path: Optional[str] = None) -> Optional[List[float]]:
+    """
+    Timestamp (giây) các keyframe của video stream đầu tiên
+
+    Chỉ đọc cờ packet (demux, không decode) - nhanh kể cả với file dài.
+    """
+    ffprobe_path = ffprobe_path or find_ffprobe()
+    if not ffprobe_path:
+        return None
+
+    cmd = [
+        ffprobe_path,
+        "-v", "error",
+        "-select_streams", "v:0",
+        "-show_entries", "packet=pts_time,flags",
+        "-of", "csv=p=0",
+        path
+    ]
+    try:
+        result = subprocess.run(
+            cmd,
+            capture_output=True,
+            text=True,
+            timeout=60,
+            creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+        )
+        if result.returncode != 0:
+            return None
+    except Exception as e:
+        print(f"Warning: keyframe scan failed for {os.path.basename(path)}: {e}")
+        return None
+
+    times = []
+    for line in result.stdout.splitlines():
+        parts = line.strip().split(',')
+        if len(parts) < 2 or 'K' not in parts[1]:
+            continue
+        try:
+            times.append(round(float(parts[0]), 3))
+        except ValueError:
+            continue  # pts_time = N/A
+    return sorted(set(times)) or None
+
+
+class KeyframeIndex:
+    """Danh sách keyframe đã sắp xếp - tra cứu bằng bisect"""
+
+    def __init__(self, times: List[float]):
+        self.times = times
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def before(self, position: float) -> float:
+        """Keyframe gần nhất tại hoặc trước position (điểm bắt đầu decode cho seek chính xác)"""
+        i = bisect.bisect_right(self.times, position + 1e-3) - 1
+        return self.times[max(0, i)]
+
+    def nearest(self, position: float) -> float:
+        """Keyframe gần position nhất (seek xấp xỉ khi kéo slider)"""
+        i = bisect.bisect_left(self.times, position)
+        candidates = self.times[max(0, i - 1):i + 1]
+        return min(candidates, key=lambda t: abs(t - position))
+
+
+class KeyframeIndexer:
+    """
+    Index keyframe cho từng file video, lưu vào ProbeStore (field 'keyframes')
+
+    Quét một lần khi video được mở lần đầu; file đổi thì store tự bỏ entry cũ.
+    """
+
+    def __init__(self, store: Optional[ProbeStore] = None):
+        self.store = store
+        self._ffprobe_path: Optional[str] = None
+
+    def get(self, path: str) -> Optional[KeyframeIndex]:
+        """Index đã lưu - None nếu chưa quét"""
+        if self.store is None:
+            return None
+        times = self.store.get(path, 'keyframes')
+        return KeyframeIndex(times) if times else None
+
+    def build(self, path: str) -> Optional[KeyframeIndex]:
+        """Quét keyframe (chạy trên thread nền) và lưu lại"""
+        index = self.get(path)
+        if index is not None:
+            return index
+        if self._ffprobe_path is None:
+            self._ffprobe_path = find_ffprobe()
+        times = probe_keyframes(path, self._ffprobe_path)
+        if not times:
+            return None
+        if self.store is not None:
+            self.store.put(path, 'keyframes', times)
+        return KeyframeIndex(times)
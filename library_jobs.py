@@ -0,0 +1,114 @@
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Iterable, Optional
+
+
+class LibraryJob:
+    """
+    Chạy một tác vụ nền cho toàn bộ thư viện bằng worker pool giới hạn
+
+    - task(path) chạy trên worker, trả về kết quả (None = thất bại)
+    - is_fresh(path) cho biết file đã có kết quả và không đổi -> bỏ qua
+    - Các callback được gọi từ thread nền; UI tự chuyển về main thread
+      (root.after) để không block Tk
+    """
+
+    PROGRESS_INTERVAL = 0.25  # Giây giữa hai lần báo progress
+
+    def __init__(self, name: str, task: Callable[[str], object],
+                 is_fresh: Optional[Callable[[str], bool]] = None,
+                 max_workers: int = 4):
+        self.name = name
+        self.task = task
+        self.is_fresh = is_fresh
+        self.max_workers = max(1, max_workers)
+        self._thread: Optional[threading.Thread] = None
+        self._cancelled = threading.Event()
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, paths: Iterable[str],
+              on_result: Optional[Callable[[str, object], None]] = None,
+              on_progress: Optional[Callable[[int, int], None]] = None,
+              on_done: Optional[Callable[[int, int], None]] = None) -> bool:
+        """Bắt đầu job - trả về False nếu job đang chạy"""
+        if self.is_running:
+            return False
+
+        # Bỏ trùng, giữ thứ tự
+        unique_paths = list(dict.fromkeys(p for p in paths if p))
+        self._cancelled.clear()
+        self._thread = threading.Thread(
+            target=self._run,
+            args=(unique_paths, on_result, on_progress, on_done),
+            daemon=True
+        )
+        self._thread.start()
+        return True
+
+    def cancel(self) -> None:
+        """Hủy job - các task đang chạy sẽ xong, task còn lại bị bỏ"""
+        self._cancelled.set()
+
+    def _run(self, paths, on_result, on_progress, on_done):
+        processed = 0
+        skipped = 0
+        pending = []
+
+        for path in paths:
+            if not os.path.exists(path):
+                skipped += 1
+                continue
+            if self.is_fresh and self.is_fresh(path):
+                # Đã có kết quả - vẫn báo để caller ghi lại vào Song
+                if on_result:
+                    result = self._safe_task(path)
+                    if result is not None:
+                        on_result(path, result)
+                skipped += 1
+                continue
+            pending.append(path)
+
+        total = len(pending)
+        last_report = 0.0
+        if on_progress and total:
+            on_progress(0, total)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers,
+                                thread_name_prefix=self.name) as pool:
+            futures = {}
+            for path in pending:
+                if self._cancelled.is_set():
+                    break
+                futures[pool.submit(self._safe_task, path)] = path
+
+            for future in as_completed(futures):
+                if self._cancelled.is_set():
+                    for f in futures:
+                        f.cancel()
+                    break
+                path = futures[future]
+                result = future.result()
+                processed += 1
+                if on_result and result is not None:
+                    on_result(path, result)
+
+                now = time.monotonic()
+                if on_progress and (now - last_report >= self.PROGRESS_INTERVAL or processed == total):
+                    last_report = now
+                    on_progress(processed, total)
+
+        if on_done:
+            on_done(processed, skipped)
+
+    def _safe_task(self, path: str):
+        try:
+            return self.task(path)
+        except Exception as e:
+            print(f"⚠️ {self.name} failed for {os.path.basename(path)}: {e}")
+            return None
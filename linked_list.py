@@ -13,6 +13,7 @@ class Song:
     path: str
     duration: float = 0.0
     youtube_url: Optional[str] = None  # URL YouTube nếu có
+    audio_only: bool = False  # Video: chỉ nghe nhạc, không mở/decode video
     
     def __str__(self) -> str:
         return f"{self.title} - {self.artist}"
@@ -252,6 +253,16 @@ class PlaylistLinkedList:
             return self._current.data
         return None
     
+    def peek_next(self) -> Optional[Song]:
+        """Xem bài tiếp theo mà không di chuyển current - O(1)"""
+        if not self._current:
+            return None
+        if self._current.next:
+            return self._current.next.data
+        if self._circular and self._head:
+            return self._head.data
+        return None
+    
     def has_next(self) -> bool:
         """Kiểm tra có bài tiếp theo không"""
         if not self._current:
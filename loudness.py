@@ -0,0 +1,110 @@
+
+import math
+import shutil
+from typing import Callable, Optional
+
+from audio_decode import NUMPY_AVAILABLE, SAMPLE_RATE, iter_pcm_blocks
+from media_probe import ProbeStore
+
+if NUMPY_AVAILABLE:
+    import numpy as np
+
+
+# Mức đích (LUFS) - thấp hơn master thương mại để đa số bài chỉ cần giảm gain
+# (pygame không khuếch đại quá volume 1.0)
+TARGET_LUFS = -18.0
+
+SUB_BLOCK = SAMPLE_RATE // 10     # 100ms
+GATE_BLOCK = 4                    # Block gating 400ms = 4 sub-block (overlap 75%)
+ABSOLUTE_GATE = -70.0             # LUFS
+RELATIVE_GATE = -10.0             # LU dưới mức trung bình
+
+# Kết quả cho file im lặng / không decode được - vẫn lưu để không đo lại mỗi lần mở app
+UNMEASURED = {'lufs': None, 'peak': 0.0, 'gain_db': 0.0}
+
+
+def _to_lufs(mean_square):
+    return -0.691 + 10 * np.log10(np.maximum(mean_square, 1e-12))
+
+
+def measure_loudness(path: str, on_block: Optional[Callable] = None) -> Optional[dict]:
+    """
+    Đo loudness tích hợp kiểu EBU R128 (gating tuyệt đối + tương đối) trong MỘT lượt decode
+
+    Xấp xỉ: bỏ bộ lọc K-weighting, chỉ dùng năng lượng RMS theo block 400ms.
+    Đọc PCM từng block qua pipe - không giữ cả file trong RAM.
+    on_block(block): nhận từng block PCM - phân tích khác dùng chung lượt decode.
+    Trả về {'lufs', 'peak', 'gain_db'}; UNMEASURED nếu file im lặng hoặc không
+    decode được; None nếu thiếu NumPy/FFmpeg (chưa đo được).
+    """
+    if not NUMPY_AVAILABLE or not shutil.which("ffmpeg"):
+        return None
+
+    energies = []
+    peak = 0
+    for block in iter_pcm_blocks(path, SUB_BLOCK * 50):
+        if on_block is not None:
+            on_block(block)
+        peak = max(peak, int(np.abs(block.astype(np.int32)).max()))
+        usable = len(block) - len(block) % SUB_BLOCK
+        if not usable:
+            continue
+        samples = block[:usable].astype(np.float32) / 32768.0
+        # Năng lượng mỗi sub-block: trung bình bình phương từng kênh, cộng các kênh
+        sub = samples.reshape(-1, SUB_BLOCK, samples.shape[1])
+        energies.append(np.mean(sub * sub, axis=1).sum(axis=1))
+
+    if not energies:
+        return dict(UNMEASURED)
+    energy = np.concatenate(energies)
+    if len(energy) < GATE_BLOCK:
+        blocks = np.array([energy.mean()])
+    else:
+        blocks = np.convolve(energy, np.ones(GATE_BLOCK) / GATE_BLOCK, mode='valid')
+
+    gated = blocks[_to_lufs(blocks) > ABSOLUTE_GATE]
+    if not len(gated):
+        return dict(UNMEASURED, peak=round(peak / 32768.0, 4))  # Gần như im lặng
+    threshold = _to_lufs(gated.mean()) + RELATIVE_GATE
+    gated = gated[_to_lufs(gated) > threshold]
+    lufs = float(_to_lufs(gated.mean()))
+
+    peak_ratio = peak / 32768.0
+    return {
+        'lufs': round(lufs, 2),
+        'peak': round(peak_ratio, 4),
+        'gain_db': round(TARGET_LUFS - lufs, 2),
+    }
+
+
+class LoudnessAnalyzer:
+    """
+    Phân tích loudness cho thư viện, lưu vào ProbeStore (field 'loudness')
+
+    analyze() chạy trên worker của LibraryJob; is_known() để bỏ qua file không đổi.
+    """
+
+    def __init__(self, store: Optional[ProbeStore] = None):
+        self.store = store
+
+    def analyze(self, path: str, on_block: Optional[Callable] = None) -> Optional[dict]:
+        if self.store is not None:
+            stored = self.store.get(path, 'loudness')
+            if stored:
+                return stored
+        result = measure_loudness(path, on_block)
+        if result is not None and self.store is not None:
+            self.store.put(path, 'loudness', result)
+        return result
+
+    def is_known(self, path: str) -> bool:
+        return self.store is not None and self.store.get(path, 'loudness') is not None
+
+    def gain_for(self, path: Optional[str]) -> float:
+        """Hệ số volume tuyến tính cho file (1.0 nếu chưa phân tích)"""
+        if not path or self.store is None:
+            return 1.0
+        stored = self.store.get(path, 'loudness')
+        if not stored or stored.get('lufs') is None:
+            return 1.0  # UNMEASURED - giữ nguyên volume
+        return math.pow(10.0, stored.get('gain_db', 0.0) / 20.0)
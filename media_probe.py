@@ -0,0 +1,311 @@
+
+import os
+import json
+import shutil
+import subprocess
+import threading
+from dataclasses import dataclass, asdict, fields
+from typing import Optional
+
+# Mutagen - đọc header audio không cần decode (tùy chọn)
+try:
+    import mutagen
+    MUTAGEN_AVAILABLE = True
+except ImportError:
+    MUTAGEN_AVAILABLE = False
+
+
+# Định dạng audio mà mutagen đọc được header nhanh hơn gọi ffprobe
+HEADER_FORMATS = {'.mp3', '.ogg', '.flac', '.wav', '.m4a', '.aac', '.wma'}
+
+
+@dataclass
+class MediaInfo:
+    """Thông tin stream của một file media"""
+    duration: float = 0.0
+    has_video: bool = False
+    fps: float = 0.0
+    width: int = 0
+    height: int = 0
+    video_codec: Optional[str] = None
+    audio_codec: Optional[str] = None
+    sample_rate: int = 0
+    channels: int = 0
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'MediaInfo':
+        """Tạo MediaInfo từ dict, bỏ qua key lạ (store cũ/mới hơn)"""
+        known = {f.name for f in fields(cls)}
+        return cls(**{k: v for k, v in data.items() if k in known})
+
+
+def file_fingerprint(path: str) -> Optional[tuple]:
+    """Khóa nhận diện file: (path tuyệt đối, size, mtime_ns) - None nếu không đọc được"""
+    try:
+        st = os.stat(path)
+        return (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    except OSError:
+        return None
+
+
+def find_ffprobe() -> Optional[str]:
+    """Tìm ffprobe trong PATH hoặc cạnh ffmpeg"""
+    ffprobe_path = shutil.which("ffprobe")
+    if ffprobe_path:
+        return ffprobe_path
+
+    # Thử tìm ffprobe trong cùng thư mục với ffmpeg
+    ffmpeg_path = shutil.which("ffmpeg")
+    if ffmpeg_path:
+        name = "ffprobe.exe" if os.name == 'nt' else "ffprobe"
+        candidate = os.path.join(os.path.dirname(ffmpeg_path), name)
+        if os.path.exists(candidate):
+            return candidate
+    return None
+
+
+def _parse_rate(rate: Optional[str]) -> float:
+    """Parse frame rate dạng '30000/1001' của ffprobe"""
+    if not rate:
+        return 0.0
+    try:
+        if '/' in rate:
+            num, den = rate.split('/', 1)
+            return float(num) / float(den) if float(den) else 0.0
+        return float(rate)
+    except (ValueError, ZeroDivisionError):
+        return 0.0
+
+
+class ProbeStore:
+    """
+    Lưu kết quả probe/phân tích xuống đĩa (JSON)
+
+    Mỗi file có một entry gắn với size + mtime; khi file thay đổi thì
+    toàn bộ entry cũ bị bỏ. Mỗi entry chứa nhiều field ('info', ...)
+    để các bước phân tích khác dùng chung một store.
+    """
+
+    def __init__(self, filepath: str):
+        self.filepath = filepath
+        self._entries: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self.load()
+
+    def get(self, path: str, field: str = 'info'):
+        """Lấy field đã lưu - None nếu chưa có hoặc file đã thay đổi"""
+        key = file_fingerprint(path)
+        if key is None:
+            return None
+        abs_path, size, mtime_ns = key
+        with self._lock:
+            entry = self._entries.get(abs_path)
+            if not entry or entry.get('size') != size or entry.get('mtime_ns') != mtime_ns:
+                return None
+            return entry.get(field)
+
+    def put(self, path: str, field: str, value) -> None:
+        """Lưu field cho file (ghi đè entry nếu file đã thay đổi)"""
+        key = file_fingerprint(path)
+        if key is None:
+            return
+        abs_path, size, mtime_ns = key
+        with self._lock:
+            entry = self._entries.get(abs_path)
+            if not entry or entry.get('size') != size or entry.get('mtime_ns') != mtime_ns:
+                entry = {'size': size, 'mtime_ns': mtime_ns}
+                self._entries[abs_path] = entry
+            entry[field] = value
+            self._dirty = True
+
+    def load(self) -> None:
+        """Load store từ file JSON"""
+        if not os.path.exists(self.filepath):
+            return
+        try:
+            with open(self.filepath, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            with self._lock:
+                self._entries = data.get('entries', {})
+        except Exception as e:
+            print(f"Error loading probe store: {e}")
+
+    def save(self) -> bool:
+        """Lưu store nếu có thay đổi - ghi file tạm rồi replace để không hỏng store"""
+        with self._lock:
+            if not self._dirty:
+                return True
+            data = {'entries': dict(self._entries)}
+            self._dirty = False
+        try:
+            tmp_path = self.filepath + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.filepath)
+            return True
+        except Exception as e:
+            print(f"Error saving probe store: {e}")
+            with self._lock:
+                self._dirty = True
+            return False
+
+
+class MediaProbe:
+    """
+    Probe file media bằng MỘT lần gọi ffprobe (hoặc đọc header bằng mutagen)
+
+    Thay cho 3 lần probe riêng lẻ mỗi lần load (cv2 kiểm tra video,
+    pydub decode toàn bộ file để lấy duration, ffprobe/cv2 fallback).
+    Kết quả được cache theo (path, size, mtime) nên load lại gần như tức thì.
+    Nếu gắn ProbeStore thì kết quả còn được giữ qua các lần mở app.
+    """
+
+    def __init__(self, store: Optional[ProbeStore] = None):
+        self._cache: dict[tuple, MediaInfo] = {}
+        self._lock = threading.Lock()
+        self._ffprobe_path: Optional[str] = None
+        self.store = store
+
+    def probe(self, path: str) -> Optional[MediaInfo]:
+        """Lấy MediaInfo của file - dùng cache nếu file không đổi"""
+        key = file_fingerprint(path)
+        if key is None:
+            return None
+
+        with self._lock:
+            cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+
+        # Store trên đĩa - bỏ qua file không đổi
+        if self.store is not None:
+            stored = self.store.get(path, 'info')
+            if stored:
+                info = MediaInfo.from_dict(stored)
+                with self._lock:
+                    self._cache[key] = info
+                return info
+
+        info = self._probe_uncached(path)
+        if info is not None:
+            with self._lock:
+                self._cache[key] = info
+            if self.store is not None:
+                self.store.put(path, 'info', info.to_dict())
+        return info
+
+    def is_known(self, path: str) -> bool:
+        """File đã có kết quả probe (RAM hoặc store) và chưa thay đổi"""
+        if self.get_cached(path) is not None:
+            return True
+        return self.store is not None and self.store.get(path, 'info') is not None
+
+    def get_cached(self, path: str) -> Optional[MediaInfo]:
+        """Chỉ đọc cache, không chạy probe"""
+        key = file_fingerprint(path)
+        if key is None:
+            return None
+        with self._lock:
+            return self._cache.get(key)
+
+    def _probe_uncached(self, path: str) -> Optional[MediaInfo]:
+        ext = os.path.splitext(path)[1].lower()
+
+        # Audio thuần: đọc header bằng mutagen, không cần tạo process
+        if MUTAGEN_AVAILABLE and ext in HEADER_FORMATS:
+            info = self._probe_mutagen(path)
+            if info is not None and info.duration > 0:
+                return info
+
+        info = self._probe_ffprobe(path)
+        if info is not None:
+            return info
+
+        # Không có ffprobe - thử mutagen cho mọi định dạng
+        if MUTAGEN_AVAILABLE and ext not in HEADER_FORMATS:
+            return self._probe_mutagen(path)
+        return None
+
+    def _probe_ffprobe(self, path: str) -> Optional[MediaInfo]:
+        """Một lần gọi ffprobe: format + tất cả streams"""
+        if self._ffprobe_path is None:
+            self._ffprobe_path = find_ffprobe()
+        if not self._ffprobe_path:
+            return None
+
+        cmd = [
+            self._ffprobe_path,
+            "-v", "quiet",
+            "-print_format", "json",
+            "-show_format",
+            "-show_streams",
+            path
+        ]
+        try:
+            result = subprocess.run(
+                cmd,
+                capture_output=True,
+                text=True,
+                timeout=10,
+                creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+            )
+            if result.returncode != 0:
+                return None
+            data = json.loads(result.stdout)
+        except Exception as e:
+            print(f"Warning: ffprobe failed for {os.path.basename(path)}: {e}")
+            return None
+
+        info = MediaInfo()
+        fmt = data.get('format', {})
+        try:
+            info.duration = float(fmt.get('duration', 0) or 0)
+        except ValueError:
+            info.duration = 0.0
+
+        for stream in data.get('streams', []):
+            codec_type = stream.get('codec_type')
+            if codec_type == 'video' and not info.has_video:
+                # Ảnh bìa trong MP3/M4A cũng là "video stream" - bỏ qua
+                if stream.get('disposition', {}).get('attached_pic'):
+                    continue
+                info.has_video = True
+                info.video_codec = stream.get('codec_name')
+                info.width = int(stream.get('width', 0) or 0)
+                info.height = int(stream.get('height', 0) or 0)
+                info.fps = _parse_rate(stream.get('avg_frame_rate')) or _parse_rate(stream.get('r_frame_rate'))
+            elif codec_type == 'audio' and info.audio_codec is None:
+                info.audio_codec = stream.get('codec_name')
+                info.sample_rate = int(stream.get('sample_rate', 0) or 0)
+                info.channels = int(stream.get('channels', 0) or 0)
+
+            # Một số container không có duration ở format
+            if info.duration <= 0:
+                try:
+                    info.duration = float(stream.get('duration', 0) or 0)
+                except ValueError:
+                    pass
+
+        return info
+
+    def _probe_mutagen(self, path: str) -> Optional[MediaInfo]:
+        """Đọc header bằng mutagen - chỉ có thông tin audio"""
+        try:
+            audio = mutagen.File(path)
+            if audio is None or audio.info is None:
+                return None
+            stream = audio.info
+            codec = getattr(stream, 'codec', None) or type(audio).__name__.lower()
+            return MediaInfo(
+                duration=float(getattr(stream, 'length', 0) or 0),
+                audio_codec=codec,
+                sample_rate=int(getattr(stream, 'sample_rate', 0) or 0),
+                channels=int(getattr(stream, 'channels', 0) or 0),
+            )
+        except Exception as e:
+            print(f"Warning: mutagen failed for {os.path.basename(path)}: {e}")
+            return None
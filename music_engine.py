@@ -2,12 +2,17 @@
 
 import os
 import threading
+import time
+from dataclasses import dataclass
 from typing import Optional
 
-# Pygame
+# Cấu hình mixer - clock dùng để tính độ trễ buffer
+MIXER_FREQUENCY = 44100
+MIXER_BUFFER = 2048
+
+# Pygame - mixer chỉ mở khi tạo MusicEngine (process UI không giữ thiết bị audio khi engine chạy riêng)
 try:
     import pygame
-    pygame.mixer.init(frequency=44100, size=-16, channels=2, buffer=2048)
     PYGAME_AVAILABLE = True
 except ImportError:
     PYGAME_AVAILABLE = False
@@ -15,6 +20,22 @@ except ImportError:
 
 import sys
 
+from media_probe import MediaProbe, MediaInfo
+from playback_clock import PlaybackClock
+from engine_events import EngineEventChannel, TRACK_ENDED, TRACK_CHANGED, LOAD_COMPLETE, ERROR
+from transcoder import TranscodePool, PRIORITY_PLAY_NOW, PRIORITY_PREFETCH
+from crossfade import prepare_crossfade
+from audio_decode import NUMPY_AVAILABLE
+from pcm_cache import PCMCache
+from pcm_stream import PCMStreamer
+from loudness import LoudnessAnalyzer
+from equalizer import Equalizer, EqualizerStage
+from silence import SilenceAnalyzer, analyze_track
+from video_decode import FFmpegVideoDecoder, VideoDecoder
+from video_process import ProcessVideoDecoder, VideoProcess
+from video_proxy import ProxyCache
+from keyframes import KeyframeIndexer
+
 class SuppressFFmpegAssertion:
     def __init__(self):
         self.original_stderr = sys.stderr
@@ -96,7 +117,7 @@ else:
 
 # Kiểm tra pydub
 try:
-    from pydub import AudioSegment
+    import pydub  # noqa: F401 - chỉ kiểm tra có cài; transcoder.py import khi cần
     PYDUB_AVAILABLE = True
     print("✅ pydub loaded successfully")
 except ImportError as e:
@@ -105,6 +126,25 @@ except Exception as e:
     print(f"⚠️ pydub error: {e}")
 
 
+@dataclass
+class QueuedTrack:
+    """Bài kế tiếp đã chuẩn bị sẵn và giao cho mixer (gapless)"""
+    source_path: str
+    playable_path: str
+    duration: float
+    has_video: bool
+    info: Optional[MediaInfo] = None
+    pcm: object = None  # PCM trong RAM - dùng khi đang phát qua PCMStreamer
+    # Crossfade: hai Sound đã áp ramp cho vùng overlap (None = chuyển gapless)
+    fade_out: object = None
+    fade_in: object = None
+    fade_length: float = 0.0
+    # Điểm cắt im lặng (giây, 0 = không cắt)
+    trim_start: float = 0.0
+    trim_end: float = 0.0
+    handed: bool = False  # Đã giao cho output nối liền (False = watcher tự chuyển tại điểm cắt)
+
+
 class MusicEngine:
     """Engine phát nhạc sử dụng pygame với hỗ trợ MP4"""
     
@@ -113,7 +153,14 @@ class MusicEngine:
     AUDIO_ONLY_FORMATS = {'.m4a', '.aac', '.wma'}
     CONVERT_FORMATS = VIDEO_FORMATS | AUDIO_ONLY_FORMATS
     
-    def __init__(self):
+    def __init__(self, convert_workers: Optional[int] = None, convert_threads: int = 2,
+                 pcm_cache_mb: int = 256):
+        if PYGAME_AVAILABLE and not pygame.mixer.get_init():
+            pygame.mixer.init(frequency=MIXER_FREQUENCY, size=-16, channels=2, buffer=MIXER_BUFFER)
+        # Đồng hồ phát duy nhất cho audio, UI và video
+        buffer_seconds = MIXER_BUFFER / MIXER_FREQUENCY
+        self.clock = PlaybackClock(latency=buffer_seconds, quantum=buffer_seconds)
+        
         self.is_playing = False
         self.is_paused = False
         self.current_pos = 0.0
@@ -125,11 +172,56 @@ class MusicEngine:
         self._video_path = None  # Path to video file
         self._has_video = False  # Whether current file has video
         self._is_youtube = False  # Whether current file is from YouTube
-        self._convert_lock = threading.Lock()  # Lock cho FFmpeg convert
+        # Pool convert song song, dùng chung Future cho cùng một file
+        self.transcoder = TranscodePool(self._temp_dir, max_workers=convert_workers,
+                                        threads_per_job=convert_threads)
+        self.probe = MediaProbe()  # Probe duration/stream một lần, có cache
+        self.media_info: Optional[MediaInfo] = None
+        self._current_loaded_path = None
+        self._source_path = None
+        
+        # Gapless: bài kế tiếp được convert ở nền rồi queue vào mixer
+        self.gapless = True
+        self._queued: Optional[QueuedTrack] = None
+        self._queue_token = 0
+        
+        # Crossfade (giây, 0 = tắt): hai Channel phát đuôi bài cũ + đầu bài mới
+        self.crossfade = 0.0
+        self._fade_channels = None
+        self._channels_reserved = False
+        self._crossfading = False
+        self._fade_active_length = 0.0
+        
+        # PCM của các bài vừa phát trong RAM - replay/seek lùi phát thẳng từ bộ nhớ
+        self.pcm_cache = PCMCache(pcm_cache_mb * 1024 * 1024)
+        self.streamer = PCMStreamer(lambda: self._reserved_channel(2))
+        self.streamer.on_switch = self._on_stream_switch
+        self._pcm = None          # PCM của bài hiện tại nếu đã có trong cache
+        self._streaming = False   # Đang phát qua streamer thay vì mixer.music
+        
+        # EQ 10 dải - áp lên PCM trong RAM, xử lý trước các chunk sắp phát
+        self.equalizer = Equalizer(MIXER_FREQUENCY)
+        self._eq_stage = EqualizerStage(self.equalizer, self.streamer)
+        self.streamer.process_chunk = self._eq_stage.process_chunk
         
-        # Tracking position sau khi seek
-        self._play_start_time = None
-        self._play_start_pos = 0.0
+        # Chuẩn hóa loudness: volume thực = volume user × gain của bài (ProbeStore)
+        self.loudness = LoudnessAnalyzer()
+        self._normalize = True
+        self._track_gain = 1.0
+        
+        # Cắt im lặng đầu/cuối bài: clock chạy từ trim_start, duration = trim_end
+        self.silence = SilenceAnalyzer()
+        self.trim_silence = True
+        self._trim_start = 0.0
+        self._trim_end = 0.0
+        
+        # Kênh sự kiện về UI + thread phát hiện hết bài
+        self.events = EngineEventChannel()
+        self._watch_cond = threading.Condition()
+        self._watch_generation = 0
+        if PYGAME_AVAILABLE:
+            threading.Thread(target=self._end_watch_loop, daemon=True,
+                             name="engine-end-watch").start()
         
         # Tạo thư mục temp
         if not os.path.exists(self._temp_dir):
@@ -142,27 +234,40 @@ class MusicEngine:
     
     def has_video_stream(self, path: str) -> bool:
         """Kiểm tra file có video stream không"""
-        if not VIDEO_AVAILABLE:
-            return False
-        
-        try:
-            cap = cv2.VideoCapture(path)
-            has_video = cap.isOpened() and cap.get(cv2.CAP_PROP_FRAME_COUNT) > 0
-            cap.release()
-            return has_video
-        except:
-            return False
+        info = self.probe.probe(path)
+        return bool(info and info.has_video)
     
     def load(self, path: str) -> bool:
         """Load file nhạc - tự động convert MP4/M4A nếu cần"""
         if not PYGAME_AVAILABLE:
             return False
         
+        source_path = path
+        # Track mới chưa phát - end watcher không được coi là "hết bài"
+        self.is_playing = False
+        self.is_paused = False
+        self._drop_queue()
+        self._cancel_crossfade()
+        self._rearm_end_watch()
+        
         try:
             ext = os.path.splitext(path)[1].lower()
             
+            # Một lần probe cho duration + stream layout (có cache)
+            self.media_info = self.probe.probe(path)
+            
             # Kiểm tra có video không
-            self._has_video = ext in self.VIDEO_FORMATS and self.has_video_stream(path)
+            self._has_video = (ext in self.VIDEO_FORMATS and VIDEO_AVAILABLE
+                               and bool(self.media_info and self.media_info.has_video))
+            
+            self._stop_output()
+            self._pcm = self.pcm_cache.get(path)
+            if self._pcm is not None:
+                # Đã có PCM trong RAM - không đọc file, không convert
+                self._video_path = path if self._has_video else None
+                self.duration = len(self._pcm) / MIXER_FREQUENCY
+                self._finish_load(path, source_path)
+                return True
             
             if self._has_video:
                 # Giữ video path để phát video
@@ -172,6 +277,7 @@ class MusicEngine:
                 if converted_path:
                     path = converted_path
                 else:
+                    self.events.post(ERROR, path=source_path, message="Convert failed")
                     return False
             elif ext in self.AUDIO_ONLY_FORMATS:
                 # Chỉ audio, convert như bình thường
@@ -184,109 +290,191 @@ class MusicEngine:
                 self._has_video = False
             
             pygame.mixer.music.load(path)
-            self.duration = self._get_duration(path)
-            self.current_pos = 0
-            # Lưu lại path để có thể reload khi seek
-            self._current_loaded_path = path
+            if self.media_info and self.media_info.duration > 0:
+                self.duration = self.media_info.duration
+            else:
+                self.duration = self._get_duration(path)
+            self._finish_load(path, source_path)
             return True
         except Exception as e:
             print(f"Error loading: {e}")
+            self.events.post(ERROR, path=source_path, message=str(e))
             return False
     
-    def _convert_to_wav(self, path: str) -> Optional[str]:
-        """Convert MP4/M4A sang WAV để pygame phát được - Thread-safe với FFmpeg"""
-        if not PYDUB_AVAILABLE:
-            print("⚠️ pydub not installed. Run: pip install pydub")
-            return None
+    def _finish_load(self, playable_path: str, source_path: str) -> None:
+        self.clock.stop()
+        self.current_pos = 0
+        # Lưu lại path để có thể reload khi seek
+        self._current_loaded_path = playable_path
+        self._source_path = source_path
+        self._apply_trim(self._silence_trim(source_path))
+        self._update_track_gain()
+        self.events.post(LOAD_COMPLETE, path=source_path, duration=self.duration,
+                         has_video=self._has_video)
+    
+    def _cache_current_async(self) -> None:
+        """Decode toàn bộ bài đang phát vào PCMCache ở nền (lần sau phát từ RAM)"""
+        source, playable = self._source_path, self._current_loaded_path
+        if not NUMPY_AVAILABLE or not source or not self.pcm_cache.fits(self.duration):
+            return
         
+        def worker():
+            pcm = self.pcm_cache.load(source, playable)
+            if pcm is not None:
+                with self._watch_cond:
+                    if self._source_path == source and self._pcm is None:
+                        self._pcm = pcm
+                # Có PCM rồi thì tính điểm cắt im lặng luôn (áp dụng từ lần phát sau)
+                self.silence.analyze_pcm(source, pcm)
+                # EQ chỉ áp được trên PCM trong RAM - chuyển sang streamer ngay
+                self._ensure_eq_output()
+        
+        threading.Thread(target=worker, daemon=True, name="pcm-cache").start()
+    
+    def _convert_to_wav(self, path: str) -> Optional[str]:
+        """Convert MP4/M4A sang WAV để pygame phát được - qua TranscodePool (ưu tiên cao nhất)"""
         if not FFMPEG_AVAILABLE:
             print("⚠️ FFmpeg not found. Please restart terminal or add FFmpeg to PATH.")
             return None
         
-        try:
-            from pydub import AudioSegment
-            import subprocess
-            
-            with self._convert_lock:  # Thread-safe convert - chỉ một process tại một thời điểm
-                # Tạo tên file temp
-                filename = os.path.basename(path)
-                temp_path = os.path.join(self._temp_dir, f"{os.path.splitext(filename)[0]}.wav")
-                
-                # Kiểm tra file đã tồn tại chưa
-                if os.path.exists(temp_path):
-                    print(f" Using cached: {filename}")
-                    return temp_path
-                
-                print(f"Converting {filename}...")
-                
-                # Convert - đảm bảo thread-safe
-                ext = os.path.splitext(path)[1].lower()
-                if ext == '.mp4' or ext == '.m4a':
-                    audio = AudioSegment.from_file(path, format="mp4")
-                elif ext == '.webm':
-                    audio = AudioSegment.from_file(path, format="webm")
-                else:
-                    audio = AudioSegment.from_file(path)
-                
-                try:
-                    import subprocess
-                    import shutil
-                    
-                    # Tìm ffmpeg path
-                    ffmpeg_path = shutil.which("ffmpeg")
-                    if not ffmpeg_path:
-                        # Fallback về pydub nếu không tìm thấy ffmpeg trực tiếp
-                        raise FileNotFoundError("FFmpeg not in PATH")
-                    
-                    # Sử dụng subprocess trực tiếp với các tham số an toàn
-                    cmd = [
-                        ffmpeg_path,
-                        "-i", path,
-                        "-threads", "1",           # Single thread
-                        "-thread_type", "none",    # Disable threading để tránh assertion
-                        "-acodec", "pcm_s16le",   # PCM 16-bit
-                        "-ar", "44100",            # Sample rate
-                        "-ac", "2",                # Stereo
-                        "-y",                       # Overwrite output
-                        temp_path
-                    ]
-                    
-                    # Chạy với timeout và không hiển thị output
-                    result = subprocess.run(
-                        cmd,
-                        capture_output=True,
-                        timeout=300,  # 5 phút timeout
-                        creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
-                    )
-                    
-                    if result.returncode == 0 and os.path.exists(temp_path):
-                        self._temp_file = temp_path
-                        print(f" Converted successfully!")
-                        return temp_path
-                    else:
-                        raise Exception(f"FFmpeg error: {result.stderr.decode('utf-8', errors='ignore')}")
-                        
-                except (FileNotFoundError, subprocess.TimeoutExpired, Exception) as e:
-                    # Fallback về pydub nếu subprocess thất bại
-                    print(f" Subprocess failed, using pydub: {e}")
-                    export_params = [
-                        "-threads", "1",           # Single thread
-                        "-thread_type", "none",    # Disable threading
-                    ]
-                    audio.export(temp_path, format="wav", parameters=export_params)
-                self._temp_file = temp_path
-                
-                print(f" Converted successfully!")
-                return temp_path
-        except Exception as e:
-            print(f" Convert error: {e}")
-            # Thử cleanup nếu có lỗi
+        temp_path = self.transcoder.convert(path, PRIORITY_PLAY_NOW)
+        if temp_path:
+            self._temp_file = temp_path
+        return temp_path
+    
+    def prefetch(self, path: str, priority: int = PRIORITY_PREFETCH) -> None:
+        """Convert trước ở nền (bài kế tiếp, file vừa import) - không block"""
+        ext = os.path.splitext(path)[1].lower()
+        if FFMPEG_AVAILABLE and ext in self.CONVERT_FORMATS and os.path.exists(path):
+            self.transcoder.submit(path, priority)
+    
+    def queue_next(self, path: str) -> None:
+        """Chuẩn bị bài kế tiếp ở nền rồi giao cho mixer phát liền sau bài hiện tại
+        
+        Mixer tự chuyển bài trong audio thread (pygame.mixer.music.queue) nên không
+        có khoảng lặng và main thread không phải làm gì tại ranh giới bài.
+        Gọi lại với bài khác sẽ thay bài đã queue.
+        """
+        if not PYGAME_AVAILABLE or not path:
+            return
+        if not self.gapless and self.crossfade <= 0:
+            return
+        with self._watch_cond:
+            self._queue_token += 1
+            token = self._queue_token
+        threading.Thread(target=self._prepare_queued, args=(path, token),
+                         daemon=True, name="engine-queue").start()
+    
+    def _prepare_queued(self, path: str, token: int) -> None:
+        """Probe + convert (ưu tiên prefetch) trên thread nền, rồi queue vào mixer
+        
+        Khi bật crossfade: decode + áp ramp vùng overlap luôn ở đây để lúc chuyển bài
+        chỉ còn việc phát hai Sound có sẵn.
+        """
+        current_playable = self._current_loaded_path
+        ext = os.path.splitext(path)[1].lower()
+        info = self.probe.probe(path)
+        has_video = (ext in self.VIDEO_FORMATS and VIDEO_AVAILABLE
+                     and bool(info and info.has_video))
+        
+        playable = path
+        if ext in self.CONVERT_FORMATS:
+            if not FFMPEG_AVAILABLE:
+                return
             try:
-                if os.path.exists(temp_path):
-                    os.remove(temp_path)
-            except:
-                pass
-            return None
+                playable = self.transcoder.submit(path, PRIORITY_PREFETCH).result(timeout=300)
+            except Exception as e:
+                print(f"⚠️ Gapless prepare failed: {e}")
+                return
+            if not playable:
+                return
+        
+        duration = info.duration if info and info.duration > 0 else self._get_duration(playable)
+        queued = QueuedTrack(path, playable, duration, has_video, info)
+        # Decode trước vào RAM - cần khi bài hiện tại phát qua streamer
+        if NUMPY_AVAILABLE and self.pcm_cache.fits(duration):
+            queued.pcm = self.pcm_cache.load(path, playable)
+            self.silence.analyze_pcm(path, queued.pcm)
+        queued.trim_start, queued.trim_end = self._silence_trim(path, duration)
+        if queued.trim_end:
+            queued.duration = queued.trim_end
+        
+        if self.crossfade > 0 and current_playable:
+            # Overlap không dài quá nửa bài nào
+            length = self.crossfade
+            for d in (self.duration - self._trim_start, queued.duration - queued.trim_start):
+                if d > 0:
+                    length = min(length, d / 2)
+            fade = prepare_crossfade(current_playable, playable, length,
+                                     tail_end=self._trim_end, head_start=queued.trim_start)
+            if fade is not None:
+                fade_out, fade_in, queued.fade_length = fade
+                queued.fade_out = pygame.mixer.Sound(buffer=fade_out.tobytes())
+                queued.fade_in = pygame.mixer.Sound(buffer=fade_in.tobytes())
+        
+        with self._watch_cond:
+            # Đã load bài khác / stop / queue bài khác trong lúc convert
+            if (token != self._queue_token or not self._current_loaded_path
+                    or self._current_loaded_path != current_playable):
+                return
+            if queued.fade_out is None:
+                if not self.gapless or not self._offer_queued(queued):
+                    return
+            self._queued = queued
+            self._watch_generation += 1
+            self._watch_cond.notify()
+    
+    def _offer_queued(self, queued: QueuedTrack) -> bool:
+        """Giao bài kế tiếp cho output - trừ khi phải cắt im lặng ở ranh giới bài
+        
+        Mixer/streamer chỉ nối được hết file này sang đầu file kia; khi có điểm cắt
+        thì watcher tự chuyển bài đúng tại trim_end (_cut_to_queued).
+        """
+        if queued.trim_start > 0 or self._trim_end > 0:
+            queued.handed = False
+            return True
+        queued.handed = self._hand_queued_to_output(queued)
+        return queued.handed
+    
+    def _hand_queued_to_output(self, queued: QueuedTrack) -> bool:
+        """Giao bài kế tiếp cho output đang phát (streamer hoặc mixer.music)"""
+        if self._streaming:
+            if queued.pcm is None:
+                return False
+            self.streamer.queue(queued.pcm)
+            return True
+        try:
+            pygame.mixer.music.queue(queued.playable_path)
+            return True
+        except pygame.error as e:
+            print(f"⚠️ Cannot queue next track: {e}")
+            return False
+    
+    def _reserved_channel(self, index: int):
+        """Channel 0-1: crossfade, 2: PCMStreamer (reserve để Sound khác không chiếm)"""
+        if not self._channels_reserved:
+            pygame.mixer.set_reserved(3)
+            self._channels_reserved = True
+        return pygame.mixer.Channel(index)
+    
+    def _get_fade_channels(self):
+        """Hai Channel dành riêng cho crossfade"""
+        if self._fade_channels is None:
+            self._fade_channels = (self._reserved_channel(0), self._reserved_channel(1))
+        return self._fade_channels
+    
+    def _cancel_crossfade(self) -> None:
+        """Dừng vùng overlap đang phát (seek/stop/load giữa lúc crossfade)"""
+        if self._crossfading and self._fade_channels:
+            for channel in self._fade_channels:
+                channel.stop()
+        self._crossfading = False
+    
+    def _drop_queue(self) -> None:
+        """Bỏ bài đã queue (load/stop xóa hàng đợi của mixer)"""
+        with self._watch_cond:
+            self._queue_token += 1
+            self._queued = None
     
     def cleanup_temp(self):
         """Dọn dẹp file tạm"""
@@ -301,138 +489,166 @@ class MusicEngine:
         if not PYGAME_AVAILABLE:
             return
         
-        import time
-        
         if self.is_paused:
-            # Resume từ pause - lấy position hiện tại và tiếp tục từ đó
-            pygame.mixer.music.unpause()
-            # Nếu có _play_start_pos đã được lưu khi pause, dùng nó
-            if hasattr(self, '_play_start_pos'):
-                current_pos = self._play_start_pos
+            # Resume từ pause - clock tiếp tục từ vị trí đã dừng
+            if self._crossfading:
+                pygame.mixer.unpause()
+            elif self._streaming:
+                self.streamer.resume()
             else:
-                current_pos = self.current_pos
-            self._play_start_time = time.time()
-            self._play_start_pos = current_pos
+                pygame.mixer.music.unpause()
+            self.clock.resume()
         else:
-            # Play mới
-            if start_pos > 0:
-                # Với MP3/MP4, pygame không hỗ trợ start position tốt
-                # Cần track position thủ công
-                pygame.mixer.music.play()
-                self._play_start_time = time.time()
-                self._play_start_pos = start_pos
-                # Thử seek (có thể không hoạt động)
-                try:
-                    pygame.mixer.music.set_pos(start_pos)
-                except:
-                    pass
-            else:
-                # Play từ đầu - set tracking ngay
-                pygame.mixer.music.play()
-                import time
-                self._play_start_time = time.time()
-                self._play_start_pos = 0.0
-                # Đảm bảo current_pos được set
-                self.current_pos = 0.0
+            # Play mới - bắt đầu thẳng từ start_pos trên source đã load
+            if start_pos <= 0 and self._trim_start > 0:
+                start_pos = self._trim_start  # Bỏ đoạn im lặng đầu bài
+            self._start_output_at(start_pos)
+            self.clock.start(start_pos)
+            if self._pcm is None:
+                self._cache_current_async()
         
         self.is_playing = True
         self.is_paused = False
-        
-        # Set current_pos dựa trên trạng thái
-        if self.is_paused:  # Resume từ pause
-            self.current_pos = self._play_start_pos
-        else:  # Play mới
-            self.current_pos = start_pos
-        
-        # Đảm bảo tracking variables được set (fallback)
-        if not hasattr(self, '_play_start_time') or self._play_start_time is None:
-            import time
-            self._play_start_time = time.time()
-            self._play_start_pos = start_pos if start_pos > 0 else 0.0
+        self.current_pos = self.clock.position()
+        self._rearm_end_watch()
     
     def pause(self) -> None:
         if not PYGAME_AVAILABLE:
             return
         # Chỉ pause nếu đang playing
         if self.is_playing and not self.is_paused:
-            pygame.mixer.music.pause()
+            # Đổi trạng thái trước khi mixer dừng để watcher không hiểu nhầm là hết bài
             self.is_paused = True
-            # Lưu lại position hiện tại khi pause
-            if hasattr(self, '_play_start_time') and self._play_start_time is not None:
-                import time
-                elapsed = time.time() - self._play_start_time
-                self._play_start_pos = self._play_start_pos + elapsed
-                self._play_start_time = None  # Reset để không tính elapsed khi pause
+            self._rearm_end_watch()
+            self._pause_output()
+            self.clock.pause()
+            self.current_pos = self.clock.position()
     
     def stop(self) -> None:
         if not PYGAME_AVAILABLE:
             return
-        pygame.mixer.music.stop()
         self.is_playing = False
         self.is_paused = False
+        self._drop_queue()
+        self._cancel_crossfade()
+        self._rearm_end_watch()
+        self._stop_output()
+        self._pcm = None
         self.current_pos = 0
         self._video_path = None
         self._has_video = False
-        # Reset tracking
-        self._play_start_time = None
-        self._play_start_pos = 0.0
-        self.cleanup_temp()
-    
-    def seek(self, position: float) -> None:
-        """Seek đến vị trí (giây) - chỉ update current_pos, không thực sự seek"""
-        # Giới hạn position trong khoảng hợp lệ
-        position = max(0, min(position, self.duration))
+        self.clock.stop()
+        # Giữ file WAV đã convert trong cache (dọn khi đóng app) để seek/replay không convert lại
+        self._current_loaded_path = None
+    
+    def _pause_output(self) -> None:
+        if self._crossfading:
+            pygame.mixer.pause()  # Hai Channel đang overlap
+        elif self._streaming:
+            self.streamer.pause()
+        else:
+            pygame.mixer.music.pause()
+    
+    def _stop_output(self) -> None:
+        """Dừng cả streamer và mixer.music"""
+        if self._streaming:
+            self.streamer.stop()
+            self._streaming = False
+        pygame.mixer.music.stop()
+    
+    def _output_busy(self) -> bool:
+        if self._streaming:
+            return self.streamer.busy
+        return pygame.mixer.music.get_busy()
+    
+    def _start_output_at(self, position: float) -> bool:
+        """Phát bài hiện tại từ position: từ RAM nếu có PCM, không thì mixer.music"""
+        if self._pcm is not None:
+            if not self._streaming:
+                pygame.mixer.music.stop()
+            self.streamer.start(self._pcm, position)
+            self.streamer.set_volume(self._effective_volume())
+            self._streaming = True
+            return True
+        if self._streaming:
+            self.streamer.stop()
+            self._streaming = False
+        return self._start_music_at(position)
+    
+    def _start_music_at(self, position: float) -> bool:
+        """Phát source đang load từ position (giây) - không reload file"""
+        try:
+            pygame.mixer.music.play(start=position)
+            return True
+        except pygame.error:
+            # Một số định dạng không nhận start= -> play rồi set_pos
+            try:
+                pygame.mixer.music.play()
+                if position > 0:
+                    pygame.mixer.music.set_pos(position)
+                return True
+            except pygame.error as e:
+                print(f"Error seeking: {e}")
+                return False
+    
+    def seek(self, position: float) -> bool:
+        """Seek đến vị trí (giây) trên source đã load - không stop, không reload, không convert lại
+        
+        Trả về False nếu chưa có source (đã stop) - caller cần load lại.
+        """
+        if self.duration > 0:
+            position = max(0.0, min(position, self.duration))
+        else:
+            position = max(0.0, position)
+        
+        if not PYGAME_AVAILABLE or not self._current_loaded_path:
+            return False
+        
         self.current_pos = position
+        if not self.is_playing:
+            # Chưa phát - chỉ nhớ vị trí
+            self.clock.seek(position)
+            return True
         
-        # pygame.mixer.music.set_pos() không hoạt động tốt với MP3/MP4
-        # Cần reload file và play từ vị trí mới (được xử lý ở music_player.py)
-        if not PYGAME_AVAILABLE:
-            return
+        was_paused = self.is_paused
+        self._rearm_end_watch()
+        # Seek giữa lúc crossfade: bỏ overlap, phát thẳng bài mới (đã load)
+        self._cancel_crossfade()
+        if not self._start_output_at(position):
+            return False
         
-        # Thử seek nếu đang playing (có thể không hoạt động với MP3/MP4)
-        if self.is_playing:
-            try:
-                pygame.mixer.music.set_pos(position)
-            except:
-                pass
+        if was_paused:
+            # Giữ trạng thái pause sau khi định vị
+            self._pause_output()
+        queued = self._queued
+        if queued is not None and queued.fade_out is None:
+            # play()/đổi output có thể làm mất bài đã queue - giao lại
+            if not self._offer_queued(queued):
+                self._drop_queue()
+        self.clock.seek(position)
+        self._rearm_end_watch()
+        return True
     
     def play_from_pos(self, position: float) -> None:
-        """Play từ vị trí cụ thể (giây) - reload và play"""
+        """Play từ vị trí cụ thể (giây) trên source đã load"""
         if not PYGAME_AVAILABLE:
             return
-        
-        # Giới hạn position
-        position = max(0, min(position, self.duration))
-        self.current_pos = position
-        
-        # Stop hiện tại
-        if self.is_playing:
-            pygame.mixer.music.stop()
-        
-        # Reload và play từ vị trí mới
-        # Lưu lại path hiện tại
-        current_path = None
-        if hasattr(self, '_current_loaded_path'):
-            current_path = self._current_loaded_path
-        
-        if current_path and os.path.exists(current_path):
-            # Reload file
-            try:
-                pygame.mixer.music.load(current_path)
-                # Play từ vị trí mới (có thể không hoạt động với MP3/MP4)
-                try:
-                    pygame.mixer.music.play(start=position)
-                except:
-                    # Fallback: play từ đầu
-                    pygame.mixer.music.play()
-                    try:
-                        pygame.mixer.music.set_pos(position)
-                    except:
-                        pass
-                self.is_playing = True
-                self.is_paused = False
-            except Exception as e:
-                print(f"Error seeking: {e}")
+        if self.seek(position) and not self.is_playing:
+            self.play(start_pos=position)
+    
+    @property
+    def duration(self) -> float:
+        return self.clock.duration
+    
+    @duration.setter
+    def duration(self, value: float) -> None:
+        # Clock giới hạn vị trí theo duration
+        self.clock.duration = value
+    
+    @property
+    def pcm(self):
+        """PCM int16 (frames, 2) của bài hiện tại nếu đã decode vào RAM, không thì None"""
+        return self._pcm
     
     @property
     def volume(self) -> float:
@@ -441,140 +657,350 @@ class MusicEngine:
     @volume.setter
     def volume(self, value: float) -> None:
         self._volume = max(0.0, min(1.0, value))
-        if PYGAME_AVAILABLE:
-            pygame.mixer.music.set_volume(self._volume)
+        self._apply_volume()
+    
+    @property
+    def normalize(self) -> bool:
+        return self._normalize
+    
+    @normalize.setter
+    def normalize(self, value: bool) -> None:
+        self._normalize = bool(value)
+        self._apply_volume()
+    
+    def _effective_volume(self, gain: Optional[float] = None) -> float:
+        """Volume user × gain loudness của bài (mixer không khuếch đại quá 1.0)"""
+        if not self._normalize:
+            return self._volume
+        if gain is None:
+            gain = self._track_gain
+        return max(0.0, min(1.0, self._volume * gain))
+    
+    def _apply_volume(self) -> None:
+        if not PYGAME_AVAILABLE:
+            return
+        volume = self._effective_volume()
+        pygame.mixer.music.set_volume(volume)
+        for channel in self._fade_channels or ():
+            channel.set_volume(volume)
+        self.streamer.set_volume(volume)
+    
+    def set_eq_gain(self, band: int, gain_db: float) -> None:
+        """Đổi gain một dải EQ - chỉ các chunk chưa phát được xử lý lại"""
+        self.equalizer.set_gain(band, gain_db)
+        self._on_eq_changed()
+    
+    def set_eq_enabled(self, enabled: bool) -> None:
+        self.equalizer.enabled = enabled
+        self._on_eq_changed()
+    
+    def _on_eq_changed(self) -> None:
+        self._eq_stage.invalidate()
+        if self.equalizer.active and self._pcm is None and self.is_playing:
+            self._cache_current_async()  # Decode xong sẽ tự chuyển sang streamer
+        self._ensure_eq_output()
+    
+    @property
+    def eq_bypassed(self) -> bool:
+        """EQ đang bật nhưng bài hiện tại quá dài để giữ PCM trong RAM - phát thẳng, không qua EQ"""
+        return (self.equalizer.active and bool(self._source_path)
+                and not self.pcm_cache.fits(self.duration))
+    
+    def _ensure_eq_output(self) -> None:
+        """Đang phát qua mixer.music mà EQ bật và đã có PCM -> chuyển sang streamer tại vị trí hiện tại"""
+        if (self.equalizer.active and self._pcm is not None and self.is_playing
+                and not self._streaming and not self._crossfading):
+            self.seek(self.get_pos())
+    
+    def _silence_trim(self, path: str, duration: Optional[float] = None) -> tuple:
+        """(trim_start, trim_end) cho file - (0, 0) nếu tắt cắt im lặng hoặc chưa phân tích"""
+        if not self.trim_silence:
+            return 0.0, 0.0
+        start, end = self.silence.trim_for(path)
+        duration = self.duration if duration is None else duration
+        if duration > 0:
+            if start >= duration:
+                return 0.0, 0.0
+            if end >= duration:
+                end = 0.0
+        return start, end
+    
+    def _apply_trim(self, trim: tuple) -> None:
+        """Đặt điểm cắt cho bài hiện tại - clock kết thúc bài tại trim_end"""
+        self._trim_start, self._trim_end = trim
+        if self._trim_end:
+            self.duration = self._trim_end
+    
+    def analyze_track(self, path: str) -> Optional[dict]:
+        """Loudness + điểm cắt im lặng trong một lượt decode (worker của LibraryJob)"""
+        return analyze_track(self.loudness, self.silence, path)
+    
+    def is_track_analyzed(self, path: str) -> bool:
+        return self.loudness.is_known(path) and self.silence.is_known(path)
+    
+    def attach_store(self, store) -> None:
+        """Dùng chung ProbeStore cho probe, loudness và điểm cắt im lặng"""
+        self.probe.store = store
+        self.loudness.store = store
+        self.silence.store = store
+    
+    def shutdown(self) -> None:
+        """Dừng các job convert còn lại (khi đóng app)"""
+        self.transcoder.shutdown()
+    
+    def _update_track_gain(self) -> None:
+        """Lấy gain của bài hiện tại từ kết quả phân tích loudness"""
+        self._track_gain = self.loudness.gain_for(self._source_path)
+        self._apply_volume()
+    
+    def refresh_loudness(self, path: str) -> None:
+        """Bài vừa phân tích xong - áp gain ngay nếu đang phát bài đó"""
+        if path == self._source_path:
+            self._update_track_gain()
     
     def get_pos(self) -> float:
-        """Lấy vị trí hiện tại (giây) - track thủ công nếu đã seek"""
+        """Lấy vị trí hiện tại (giây) từ PlaybackClock, hiệu chỉnh định kỳ theo mixer"""
         if not PYGAME_AVAILABLE:
             return self.current_pos
         
-        # Nếu đang playing và không pause, luôn dùng manual tracking nếu có
-        if self.is_playing and not self.is_paused:
-            # Ưu tiên: dùng manual tracking nếu có _play_start_time
-            if (hasattr(self, '_play_start_time') and hasattr(self, '_play_start_pos') and 
-                self._play_start_time is not None):
-                import time
-                elapsed = time.time() - self._play_start_time
-                calculated_pos = self._play_start_pos + elapsed
-                
-                # Giới hạn trong duration
-                if self.duration > 0:
-                    calculated_pos = min(calculated_pos, self.duration)
-                
-                # Đảm bảo không âm
-                calculated_pos = max(0, calculated_pos)
-                
-                # Cập nhật current_pos
-                self.current_pos = calculated_pos
-                return calculated_pos
-            else:
-                # Nếu không có tracking, set tracking ngay từ đầu
-                import time
-                if not hasattr(self, '_play_start_time') or self._play_start_time is None:
-                    self._play_start_time = time.time()
-                    self._play_start_pos = 0.0
-                    self.current_pos = 0.0
-                    return 0.0
-            
-            # Fallback: dùng pygame position và set tracking nếu chưa có
-            pygame_pos = pygame.mixer.music.get_pos() / 1000.0
-            # pygame_pos có thể là 0 ngay sau khi play, nhưng vẫn cần set tracking
-            if pygame_pos >= 0:
-                # Nếu chưa có tracking, set tracking từ pygame position
-                if not hasattr(self, '_play_start_time') or self._play_start_time is None:
-                    import time
-                    self._play_start_time = time.time()
-                    self._play_start_pos = max(0, pygame_pos)
-                    return max(0, pygame_pos)
-                else:
-                    # Đã có tracking, dùng manual tracking
-                    import time
-                    elapsed = time.time() - self._play_start_time
-                    calculated_pos = self._play_start_pos + elapsed
-                    if self.duration > 0:
-                        calculated_pos = min(calculated_pos, self.duration)
-                    calculated_pos = max(0, calculated_pos)
-                    self.current_pos = calculated_pos
-                    return calculated_pos
-        
-        # Nếu không playing hoặc đang pause, trả về current_pos
-        return max(0, self.current_pos)
+        if self.is_playing and not self.is_paused and not self._streaming and not self._crossfading:
+            self.clock.correct(pygame.mixer.music.get_pos())
+        self.current_pos = self.clock.position()
+        return self.current_pos
     
     def is_active(self) -> bool:
         if not PYGAME_AVAILABLE:
             return False
-        return pygame.mixer.music.get_busy()
+        return self._crossfading or self._output_busy()
     
-    def _get_duration(self, path: str) -> float:
-        """Lấy duration chính xác từ file - sử dụng FFmpeg/pydub"""
-        # Thử dùng pydub để lấy duration chính xác
-        if PYDUB_AVAILABLE:
-            try:
-                from pydub import AudioSegment
-                audio = AudioSegment.from_file(path)
-                duration_seconds = len(audio) / 1000.0  # pydub trả về milliseconds
-                if duration_seconds > 0:
-                    return duration_seconds
-            except Exception as e:
-                print(f"Warning: Could not get duration with pydub: {e}")
+    # ==================== END-OF-TRACK WATCHER ====================
+    
+    def _rearm_end_watch(self) -> None:
+        """Trạng thái phát thay đổi - watcher tính lại thời điểm hết bài"""
+        with self._watch_cond:
+            self._watch_generation += 1
+            self._watch_cond.notify()
+    
+    def _end_watch_loop(self) -> None:
+        """Thread ngủ đến đúng thời điểm clock báo hết bài rồi xác nhận với mixer
         
-        # Thử dùng FFmpeg để lấy duration
-        if FFMPEG_AVAILABLE:
-            try:
-                import subprocess
-                import shutil
-                import json
-                
-                ffprobe_path = shutil.which("ffprobe")
-                if not ffprobe_path:
-                    # Thử tìm ffprobe trong cùng thư mục với ffmpeg
-                    ffmpeg_path = shutil.which("ffmpeg")
-                    if ffmpeg_path:
-                        ffprobe_path = os.path.join(os.path.dirname(ffmpeg_path), "ffprobe.exe")
-                        if not os.path.exists(ffprobe_path):
-                            ffprobe_path = None
-                
-                if ffprobe_path:
-                    cmd = [
-                        ffprobe_path,
-                        "-v", "quiet",
-                        "-print_format", "json",
-                        "-show_format",
-                        path
-                    ]
-                    
-                    result = subprocess.run(
-                        cmd,
-                        capture_output=True,
-                        text=True,
-                        timeout=10,
-                        creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
-                    )
-                    
-                    if result.returncode == 0:
-                        data = json.loads(result.stdout)
-                        if 'format' in data and 'duration' in data['format']:
-                            duration_seconds = float(data['format']['duration'])
-                            if duration_seconds > 0:
-                                return duration_seconds
-            except Exception as e:
-                print(f"Warning: Could not get duration with ffprobe: {e}")
+        Thay cho việc UI poll get_busy() mỗi 50ms: khi idle/pause thread chỉ chờ,
+        khi phát thì chỉ thức dậy gần cuối bài (hoặc mỗi MAX_WAIT để bắt bài kết thúc sớm).
+        """
+        MAX_WAIT = 1.0      # Bắt trường hợp duration ước tính dài hơn thực tế
+        END_POLL = 0.01     # Sát cuối bài: kiểm tra mixer mỗi 10ms
+        GAPLESS_WINDOW = 0.5  # Có bài queue: theo dõi mixer từ 0.5s cuối
         
-        # Thử dùng OpenCV cho video files
-        if VIDEO_AVAILABLE:
-            try:
-                cap = cv2.VideoCapture(path)
-                if cap.isOpened():
-                    fps = cap.get(cv2.CAP_PROP_FPS)
-                    frame_count = cap.get(cv2.CAP_PROP_FRAME_COUNT)
-                    cap.release()
-                    if fps > 0 and frame_count > 0:
-                        duration_seconds = frame_count / fps
-                        if duration_seconds > 0:
-                            return duration_seconds
-            except Exception as e:
-                print(f"Warning: Could not get duration with OpenCV: {e}")
+        last_mixer_ms = -1
+        last_generation = None
+        while True:
+            with self._watch_cond:
+                if not self.is_playing or self.is_paused:
+                    self._watch_cond.wait()
+                    continue
+                generation = self._watch_generation
+                if generation != last_generation:
+                    last_generation = generation
+                    last_mixer_ms = -1
+                queued = self._queued
+                if self._crossfading:
+                    # Chờ đến lúc hết đoạn overlap để giao lại cho mixer.music
+                    remaining = self._fade_active_length - self.clock.position()
+                else:
+                    if queued is not None and queued.fade_out is not None:
+                        window = queued.fade_length
+                    elif queued is not None and queued.handed:
+                        window = GAPLESS_WINDOW
+                    else:
+                        window = 0.0
+                    remaining = (self.clock.remaining() if self.duration > 0 else MAX_WAIT) - window
+                timeout = min(MAX_WAIT, remaining) if remaining > END_POLL else END_POLL
+                self._watch_cond.wait(timeout=timeout)
+                if generation != self._watch_generation:
+                    continue  # play/pause/seek/stop trong lúc chờ
+            
+            if not self.is_playing or self.is_paused:
+                continue
+            
+            if self._crossfading:
+                if self.clock.position() >= self._fade_active_length - END_POLL:
+                    self._finish_crossfade(generation)
+                continue
+            
+            queued = self._queued
+            if (queued is not None and queued.fade_out is not None
+                    and self._output_busy()
+                    and self.clock.remaining() <= queued.fade_length):
+                self._start_crossfade(generation)
+                continue
+            
+            if self.clock.remaining() <= END_POLL and self._output_busy():
+                if queued is not None and queued.fade_out is None and not queued.handed:
+                    # Điểm cắt im lặng - chuyển bài ngay, bỏ phần im lặng còn lại
+                    self._cut_to_queued(generation)
+                    continue
+                if self._trim_end > 0:
+                    with self._watch_cond:
+                        if generation == self._watch_generation and not self.is_paused:
+                            self._stop_output()  # Phần còn lại chỉ là im lặng
+            
+            if self._output_busy():
+                # Streamer tự báo chuyển bài qua on_switch
+                if (not self._streaming and self._queued is not None and self._queued.handed
+                        and self.clock.remaining() <= GAPLESS_WINDOW):
+                    mixer_ms = pygame.mixer.music.get_pos()
+                    if self._queued_started(mixer_ms, last_mixer_ms):
+                        self._complete_gapless_transition(generation)
+                    else:
+                        last_mixer_ms = mixer_ms
+                continue
+            
+            if self.is_playing and not self.is_paused:
+                with self._watch_cond:
+                    # Kiểm tra lại dưới lock - pause/stop/seek có thể vừa xảy ra
+                    if (generation != self._watch_generation
+                            or not self.is_playing or self.is_paused):
+                        continue
+                    self.is_playing = False
+                    self.clock.pause()
+                self.events.post(TRACK_ENDED, path=self._source_path)
+    
+    def _queued_started(self, mixer_ms: int, last_mixer_ms: int) -> bool:
+        """Mixer đã tự chuyển sang bài queue? (bộ đếm get_pos() về 0 khi chuyển bài)"""
+        if mixer_ms < 0:
+            return False
+        # Bộ đếm tụt hẳn so với lần đọc trước
+        if last_mixer_ms >= 0 and last_mixer_ms - mixer_ms > 200:
+            return True
+        # Hoặc lệch xa vị trí clock đang tính trong đoạn hiện tại
+        expected = self.clock.position() - self.clock.segment_start
+        return abs(expected - mixer_ms / 1000.0) > 1.0
+    
+    def _adopt_queued(self, queued: QueuedTrack) -> tuple:
+        """Chuyển trạng thái engine sang bài đã queue - gọi khi giữ _watch_cond
+        
+        Trả về (previous_path, previous_duration) cho sự kiện TRACK_CHANGED.
+        """
+        previous = (self._source_path, self.duration)
+        self._queued = None
+        self._source_path = queued.source_path
+        self._current_loaded_path = queued.playable_path
+        if queued.playable_path != queued.source_path:
+            self._temp_file = queued.playable_path
+        self.media_info = queued.info
+        self._has_video = queued.has_video
+        self._video_path = queued.source_path if queued.has_video else None
+        self.duration = queued.duration
+        self._trim_start, self._trim_end = queued.trim_start, queued.trim_end
+        self.clock.start(self._trim_start)
+        self._watch_generation += 1
+        if not self._crossfading:
+            self._update_track_gain()
+        return previous
+    
+    def _post_track_changed(self, queued: QueuedTrack, previous: tuple) -> None:
+        previous_path, previous_duration = previous
+        self.events.post(TRACK_CHANGED, path=queued.source_path, duration=queued.duration,
+                         has_video=queued.has_video, previous_path=previous_path,
+                         previous_duration=previous_duration)
+    
+    def _complete_gapless_transition(self, generation: int) -> None:
+        """Cập nhật trạng thái sang bài vừa được mixer phát - không đụng tới mixer"""
+        with self._watch_cond:
+            queued = self._queued
+            if (queued is None or generation != self._watch_generation
+                    or not self.is_playing or self.is_paused):
+                return
+            previous = self._adopt_queued(queued)
+            self._pcm = queued.pcm
+            self.clock.correct(pygame.mixer.music.get_pos(), force=True)
+            self.current_pos = self.clock.position()
+        if queued.pcm is None:
+            self._cache_current_async()
+        self._post_track_changed(queued, previous)
+    
+    def _cut_to_queued(self, generation: int) -> None:
+        """Chuyển sang bài queue tại điểm cắt im lặng: dừng output, phát bài mới từ trim_start"""
+        with self._watch_cond:
+            queued = self._queued
+            if (queued is None or queued.handed or generation != self._watch_generation
+                    or not self.is_playing or self.is_paused):
+                return
+            self._stop_output()
+            previous = self._adopt_queued(queued)
+            self._pcm = queued.pcm
+            if queued.pcm is None:
+                try:
+                    pygame.mixer.music.load(queued.playable_path)
+                except pygame.error as e:
+                    print(f"Error loading next track: {e}")
+            self._start_output_at(self._trim_start)
+            self._apply_volume()
+            self.current_pos = self.clock.position()
+        if queued.pcm is None:
+            self._cache_current_async()
+        self._post_track_changed(queued, previous)
+    
+    def _on_stream_switch(self) -> None:
+        """Streamer vừa phát chunk đầu của bài đã queue (gọi từ thread feeder)"""
+        with self._watch_cond:
+            queued = self._queued
+            if queued is None or not self._streaming or not self.is_playing:
+                return
+            previous = self._adopt_queued(queued)
+            self._pcm = queued.pcm
+            self.current_pos = 0.0
+        self._post_track_changed(queued, previous)
+    
+    def _start_crossfade(self, generation: int) -> None:
+        """Bắt đầu overlap: đuôi bài cũ + đầu bài mới trên hai Channel (PCM đã tính sẵn)"""
+        with self._watch_cond:
+            queued = self._queued
+            if (queued is None or queued.fade_out is None
+                    or generation != self._watch_generation
+                    or not self.is_playing or self.is_paused):
+                return
+            out_channel, in_channel = self._get_fade_channels()
+            # Mỗi bên giữ gain loudness của bài mình
+            out_channel.set_volume(self._effective_volume())
+            in_channel.set_volume(self._effective_volume(self.loudness.gain_for(queued.source_path)))
+            # Dừng stream trước rồi phát đuôi từ Sound - nối tại đầu ramp (gain 1.0)
+            self._stop_output()
+            out_channel.play(queued.fade_out)
+            in_channel.play(queued.fade_in)
+            if queued.pcm is None:
+                try:
+                    pygame.mixer.music.load(queued.playable_path)
+                except pygame.error as e:
+                    print(f"Error loading next track: {e}")
+            
+            self._crossfading = True
+            previous = self._adopt_queued(queued)
+            self._pcm = queued.pcm
+            self._track_gain = self.loudness.gain_for(queued.source_path)
+            # Overlap kết thúc tại trim_start + fade_length trên bài mới
+            self._fade_active_length = self._trim_start + queued.fade_length
+            self.current_pos = self._trim_start
+        self._post_track_changed(queued, previous)
+    
+    def _finish_crossfade(self, generation: int) -> None:
+        """Hết overlap: bài mới tiếp tục trên mixer.music từ cuối đoạn fade-in"""
+        with self._watch_cond:
+            if (not self._crossfading or generation != self._watch_generation
+                    or not self.is_playing or self.is_paused):
+                return
+            self._crossfading = False
+            start = self._fade_active_length
+            self._start_output_at(start)
+            self._apply_volume()
+            self.clock.seek(start)
+            self._watch_generation += 1
+    
+    def _get_duration(self, path: str) -> float:
+        """Lấy duration từ MediaProbe, fallback ước tính theo dung lượng file"""
+        info = self.probe.probe(path)
+        if info and info.duration > 0:
+            return info.duration
         
         # Fallback: estimate from file size (không chính xác)
         try:
@@ -592,24 +1018,52 @@ class MusicEngine:
 
 
 class VideoPlayer:
-    """Video player hiển thị trong Canvas chính"""
+    """Video player hiển thị trong Canvas chính
+    
+    Decode + convert màu + scale chạy trên thread VideoDecoder; Tk thread chỉ
+    chọn frame trong ring khớp với clock rồi vẽ.
+    """
+    
+    RING_SIZE = 8  # Số frame decode sẵn (~0.25s ở 30fps)
+    TIMING_SMOOTHING = 0.05  # Hệ số trung bình trượt cho thời gian vẽ mỗi frame
     
-    def __init__(self, canvas):
+    def __init__(self, canvas, clock: Optional[PlaybackClock] = None,
+                 keyframes: Optional[KeyframeIndexer] = None,
+                 backend: str = "opencv", probe: Optional[MediaProbe] = None,
+                 process: Optional[VideoProcess] = None,
+                 proxies: Optional[ProxyCache] = None):
         self.canvas = canvas  # Canvas để hiển thị video (vinyl)
+        self.clock = clock  # Đồng hồ chung với audio engine (None = tự đếm)
+        self.keyframes = keyframes  # Index keyframe cho seek nhanh (quét một lần mỗi file)
+        # "ffmpeg": ffmpeg decode + scale sẵn theo canvas, "opencv": VideoCapture
+        self.backend = backend
+        self.probe = probe or MediaProbe()  # fps cho backend ffmpeg (không mở VideoCapture)
+        self.process = process  # Decode ở process riêng, frame qua shared memory (None = thread)
+        self.proxies = proxies  # Proxy độ phân giải thấp cho video lớn (None = luôn dùng file gốc)
+        self._scrubbing = False  # Đang kéo slider - hiển thị keyframe gần nhất
         self.video_cap = None
+        self.decoder = None  # FrameProducer hoặc ProcessVideoDecoder
         self.is_playing = False
         self.is_paused = False
         self.fps = 30
         self.video_path = None
+        self.decode_path = None  # File đang decode (proxy hoặc chính video_path)
         self.update_id = None
         self.video_image_id = None
-        self.start_time = None  # Thời gian bắt đầu phát
+        self.start_time = None  # Thời gian bắt đầu phát (monotonic) khi không có clock chung
         self.seek_offset = 0.0  # Offset khi seek
-        self.last_sync_time = 0.0  # Thời gian sync cuối cùng
         self._cap_lock = threading.Lock()  # Lock để tránh xung đột khi truy cập video_cap
+        # Một PhotoImage + một canvas item cho mỗi kích thước, cập nhật pixel tại chỗ
+        self._photo = None
+        self._photo_size = None
+        self._geometry = None  # (width, height) canvas - cache đến khi có <Configure>
+        self.render_ms = 0.0   # Thời gian vẽ trung bình mỗi frame trên Tk thread
+        self.late_frames = 0   # Frame được vẽ trễ hơn một chu kỳ so với clock
+        if canvas is not None:
+            canvas.bind("<Configure>", self._on_configure, add="+")
     
     def open(self, video_path: str):
-        """Mở video với error suppression cho FFmpeg assertions và threading lock"""
+        """Mở video - backend ffmpeg nếu có FFmpeg, không thì OpenCV"""
         if not VIDEO_AVAILABLE or not self.canvas:
             return
         
@@ -617,7 +1071,50 @@ class VideoPlayer:
         self.stop()
         
         self.video_path = video_path
+        # Proxy nhỏ (nếu đã tạo và đủ lớn cho canvas) thay cho file gốc - audio vẫn từ file gốc
+        self.decode_path = self._decode_path(video_path)
+        if self.process is not None and self.process.is_alive():
+            self._open_process(self.decode_path)
+        elif self.backend == "ffmpeg" and FFMPEG_AVAILABLE:
+            self._open_ffmpeg(self.decode_path)
+        else:
+            self._open_opencv(self.decode_path)
         
+        # Play sau khi mở thành công
+        if self.decoder is not None:
+            self.play()
+    
+    def _decode_path(self, video_path: str) -> str:
+        """File thực sự decode: proxy nếu vừa canvas, không thì file gốc (và tạo proxy ở nền)"""
+        if self.proxies is None:
+            return video_path
+        proxy_path = self.proxies.for_display(video_path, self._canvas_size())
+        if proxy_path is not None:
+            return proxy_path
+        self.proxies.request(video_path)
+        return video_path
+    
+    def _probe_fps(self):
+        """fps theo file gốc (proxy giữ nguyên fps) - probe có cache"""
+        info = self.probe.probe(self.video_path)
+        if info is not None and info.fps:
+            self.fps = info.fps
+    
+    def _open_process(self, video_path: str):
+        """Decode + scale trong VideoProcess - Tk thread chỉ đọc frame từ shared memory"""
+        self._probe_fps()
+        backend = "ffmpeg" if self.backend == "ffmpeg" and FFMPEG_AVAILABLE else "opencv"
+        self._start_decoder(ProcessVideoDecoder(self.process, video_path, backend, self.fps,
+                                                self._video_position, ring_size=self.RING_SIZE))
+    
+    def _open_ffmpeg(self, video_path: str):
+        """ffmpeg decode + scale theo canvas, frame rgb24 đọc thẳng từ pipe"""
+        self._probe_fps()
+        self._start_decoder(FFmpegVideoDecoder(video_path, self.fps, self._video_position,
+                                               ring_size=self.RING_SIZE))
+    
+    def _open_opencv(self, video_path: str):
+        """Mở VideoCapture với error suppression cho FFmpeg assertions và threading lock"""
         # Suppress stderr hoàn toàn để bỏ qua FFmpeg assertion errors
         original_stderr = sys.stderr
         sys.stderr = _ffmpeg_suppressor
@@ -653,49 +1150,107 @@ class VideoPlayer:
                     print(f"Error opening video: {e}")
                     self.video_cap = None
                     return
-            
-            # Play sau khi mở thành công
-            if self.video_cap:
-                self.play()
+                
+                # Từ đây chỉ thread decoder đọc video_cap
+                self._start_decoder(VideoDecoder(self.video_cap, self.fps, self._video_position,
+                                                 ring_size=self.RING_SIZE))
         finally:
             # Restore stderr
             sys.stderr = original_stderr
     
+    def _start_decoder(self, decoder):
+        self.decoder = decoder
+        decoder.set_size(*self._canvas_size())
+        decoder.seek(self._video_position())
+        decoder.start()
+        self._attach_keyframes(self.decode_path, decoder)
+    
+    def is_open(self) -> bool:
+        """Đã mở video (backend bất kỳ)"""
+        return self.decoder is not None
+    
+    def _attach_keyframes(self, video_path: str, decoder):
+        """Gắn keyframe index cho decoder - chưa có thì quét ở nền (một lần mỗi file)"""
+        if self.keyframes is None:
+            return
+        index = self.keyframes.get(video_path)
+        if index is not None:
+            decoder.keyframes = index
+            return
+        
+        def worker():
+            built = self.keyframes.build(video_path)
+            if built is not None:
+                decoder.keyframes = built
+        
+        threading.Thread(target=worker, daemon=True, name="keyframe-index").start()
+    
+    def _video_position(self) -> float:
+        """Vị trí video nên hiển thị (giây) - theo clock chung hoặc thời gian riêng"""
+        if self.clock is not None:
+            return self.clock.position()
+        if self.start_time is not None and self.is_playing and not self.is_paused:
+            return time.monotonic() - self.start_time
+        return self.seek_offset
+    
+    def _canvas_size(self) -> tuple:
+        """Kích thước canvas - chỉ hỏi Tk lần đầu, sau đó cập nhật qua <Configure>"""
+        if self._geometry is None:
+            width = self.canvas.winfo_width()
+            height = self.canvas.winfo_height()
+            self._geometry = (width if width > 1 else 380, height if height > 1 else 380)
+        return self._geometry
+    
+    def _on_configure(self, event):
+        if event.width > 1 and event.height > 1:
+            self._geometry = (event.width, event.height)
+            if self.decoder is not None:
+                self.decoder.set_size(*self._geometry)
+    
     def play(self):
         """Phát video"""
-        if self.video_cap is None:
+        if self.decoder is None:
             return
         
         self.is_playing = True
         self.is_paused = False
+        self.decoder.pause(False)
         # Reset start time khi bắt đầu play
-        import time
-        self.start_time = time.time() - self.seek_offset
-        self.last_sync_time = self.seek_offset
-        self._update_frame()
+        self.start_time = time.monotonic() - self.seek_offset
+        self._schedule(0)
     
     def pause(self):
         """Tạm dừng video"""
+        if self.clock is None and self.start_time is not None:
+            self.seek_offset = time.monotonic() - self.start_time
         self.is_paused = True
-        if self.update_id:
-            self.canvas.after_cancel(self.update_id)
-            self.update_id = None
+        self._cancel_update()
+        if self.decoder is not None:
+            self.decoder.pause(True)
     
     def resume(self):
         """Tiếp tục video"""
         if self.is_paused:
             self.is_paused = False
-            self._update_frame()
+            self.start_time = time.monotonic() - self.seek_offset
+            if self.decoder is not None:
+                self.decoder.pause(False)
+            self._schedule(0)
     
     def stop(self):
         """Dừng video"""
         self.is_playing = False
-        if self.update_id:
-            try:
-                self.canvas.after_cancel(self.update_id)
-            except:
-                pass
-            self.update_id = None
+        self._cancel_update()
+        
+        # Dừng decoder trước rồi mới release capture
+        if self.decoder is not None:
+            self.decoder.stop()
+            if self.render_ms:
+                stats = self.frame_stats()
+                print(f"🎬 Video frame time: render {stats['render_ms']:.2f} ms, "
+                      f"decode/scale {stats['convert_ms']:.2f} ms, "
+                      f"dropped {stats['dropped']}, late {stats['late']}")
+            self.decoder = None
         
         # Suppress stderr khi release
         original_stderr = sys.stderr
@@ -713,168 +1268,135 @@ class VideoPlayer:
         if self.video_image_id:
             self.canvas.delete(self.video_image_id)
             self.video_image_id = None
+        self._photo = None
+        self._photo_size = None
+        self.render_ms = 0.0
+        self.late_frames = 0
+    
+    def frame_stats(self) -> dict:
+        """Bộ đếm đồng bộ A/V + thời gian xử lý mỗi frame"""
+        decoder = self.decoder
+        return {
+            'dropped': (decoder.dropped + decoder.ring.skipped) if decoder else 0,
+            'late': self.late_frames,
+            'render_ms': self.render_ms,
+            'convert_ms': decoder.convert_ms if decoder else 0.0,
+        }
+    
+    def preview(self, position: float):
+        """Đang kéo slider - nhảy tới keyframe gần nhất và hiển thị, chưa đổi vị trí phát"""
+        if not self.decoder or not self.canvas:
+            return
+        self._scrubbing = True
+        self.decoder.seek(position, exact=False)
+        self._schedule(0, show_first=True)
     
     def seek(self, position: float):
-        """Nhảy đến vị trí (giây)"""
-        if not self.video_cap or not self.canvas:
+        """Người dùng tua - chỗ duy nhất định vị lại VideoCapture (ở thread decoder)"""
+        if not self.decoder or not self.canvas:
             return
-        
-        # Suppress stderr khi seek để bỏ qua assertion errors
-        original_stderr = sys.stderr
-        sys.stderr = _ffmpeg_suppressor
-        
-        try:
-            # Hủy scheduled update hiện tại
-            if self.update_id:
-                try:
-                    self.canvas.after_cancel(self.update_id)
-                except:
-                    pass
-                self.update_id = None
-            
-            # Cập nhật seek offset
-            self.seek_offset = position
-            if self.is_playing:
-                import time
-                self.start_time = time.time() - position
-                self.last_sync_time = position
-            
-            # Seek và đọc frame với lock
-            ret = False
-            frame = None
-            with self._cap_lock:
-                if self.video_cap and self.video_cap.isOpened():
-                    # Seek đến frame mới
-                    frame_number = int(position * self.fps)
-                    self.video_cap.set(cv2.CAP_PROP_POS_FRAMES, max(0, frame_number))
-                    ret, frame = self.video_cap.read()
-            
-            if ret and frame is not None:
-                # Convert BGR to RGB
-                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                
-                # Lấy kích thước canvas thực tế
-                canvas_width = self.canvas.winfo_width() if self.canvas.winfo_width() > 1 else 380
-                canvas_height = self.canvas.winfo_height() if self.canvas.winfo_height() > 1 else 380
-                frame = cv2.resize(frame, (canvas_width, canvas_height))
-                
-                # Convert to PhotoImage
-                image = Image.fromarray(frame)
-                photo = ImageTk.PhotoImage(image=image)
-                
-                # Xóa image cũ nếu có
-                if self.video_image_id:
-                    self.canvas.delete(self.video_image_id)
-                
-                # Hiển thị image ở giữa canvas
-                self.video_image_id = self.canvas.create_image(
-                    canvas_width // 2, canvas_height // 2,
-                    image=photo, anchor=tk.CENTER
-                )
-                self.canvas.photo = photo  # Keep a reference
-                
-                # Tiếp tục update nếu đang playing
-                if self.is_playing and not self.is_paused:
-                    delay = int(1000 / self.fps)
-                    self.update_id = self.canvas.after(delay, self._update_frame)
-        except Exception as e:
-            print(f"Video seek error: {e}")
-        finally:
-            sys.stderr = original_stderr
+        self._scrubbing = False
+        self.seek_offset = position
+        if self.is_playing:
+            self.start_time = time.monotonic() - position
+        self.decoder.seek(position)
+        # Vẽ frame đầu tiên sau seek ngay cả khi đang pause
+        self._schedule(0, show_first=True)
     
     def sync_with_audio(self, audio_position: float):
         """Sync video với audio position"""
-        if not self.video_cap or not self.is_playing:
+        if not self.decoder or not self.is_playing:
             return
         
-        # Suppress stderr khi sync để bỏ qua assertion errors
-        original_stderr = sys.stderr
-        sys.stderr = _ffmpeg_suppressor
+        # Dùng chung clock với audio - không có drift riêng để sửa
+        if self.clock is not None:
+            return
         
-        try:
-            # Tính toán vị trí video nên ở đâu
-            video_position = audio_position
-            
-            # Nếu lệch quá nhiều (>0.5s), seek lại
-            if abs(video_position - self.last_sync_time) > 0.5:
-                with self._cap_lock:
-                    if self.video_cap and self.video_cap.isOpened():
-                        frame_number = int(video_position * self.fps)
-                        self.video_cap.set(cv2.CAP_PROP_POS_FRAMES, max(0, frame_number))
-                self.seek_offset = video_position
-                import time
-                self.start_time = time.time() - video_position
-                self.last_sync_time = video_position
-        finally:
-            sys.stderr = original_stderr
+        # Đồng hồ riêng lệch quá nhiều (>0.5s) - chỉ bám lại đồng hồ theo audio,
+        # decoder tự bỏ frame trễ / giữ frame sớm thay vì seek
+        if abs(audio_position - self._video_position()) > 0.5:
+            self.start_time = time.monotonic() - audio_position
+            self.seek_offset = audio_position
+    
+    def _cancel_update(self):
+        if self.update_id:
+            try:
+                self.canvas.after_cancel(self.update_id)
+            except Exception:
+                pass
+            self.update_id = None
+    
+    def _schedule(self, delay: int, show_first: bool = False):
+        self._cancel_update()
+        self.update_id = self.canvas.after(delay, lambda: self._update_frame(show_first))
     
-    def _update_frame(self):
-        """Cập nhật frame video trên Canvas - sync với audio"""
-        if not self.is_playing or self.is_paused or not self.canvas:
+    def _update_frame(self, show_first: bool = False):
+        """Chọn frame trong ring khớp clock rồi vẽ - không decode trên Tk thread"""
+        self.update_id = None
+        decoder = self.decoder
+        if not decoder or not self.canvas:
+            return
+        if not show_first and (not self.is_playing or self.is_paused or self._scrubbing):
             return
         
-        # Suppress stderr khi đọc frame để bỏ qua assertion errors
-        original_stderr = sys.stderr
-        sys.stderr = _ffmpeg_suppressor
+        if show_first:
+            picked = decoder.ring.first()
+            if picked is None and not decoder.finished:
+                # Decoder chưa kịp định vị - thử lại sau
+                self._schedule(10, show_first=True)
+                return
+        else:
+            position = self._video_position()
+            picked = decoder.ring.pick(position)
+            if picked is not None and position - picked[0] > 1.0 / self.fps:
+                self.late_frames += 1
         
-        ret = False
-        frame = None
-        try:
-            # Đọc frame với lock để tránh xung đột
-            with self._cap_lock:
-                if self.video_cap is None or not self.video_cap.isOpened():
-                    return
-                
-                # Tính toán vị trí video dựa trên thời gian
-                import time
-                if self.start_time:
-                    current_time = time.time()
-                    video_position = current_time - self.start_time
-                    expected_frame = int(video_position * self.fps)
-                    
-                    # Lấy frame hiện tại của video
-                    current_frame = int(self.video_cap.get(cv2.CAP_PROP_POS_FRAMES))
-                    
-                    # Nếu lệch quá nhiều (>2 frames), sync lại
-                    if abs(expected_frame - current_frame) > 2:
-                        self.video_cap.set(cv2.CAP_PROP_POS_FRAMES, max(0, expected_frame))
-                
-                ret, frame = self.video_cap.read()
-        finally:
-            sys.stderr = original_stderr
+        if picked is not None:
+            self._draw_frame(picked[1])
         
-        if ret and frame is not None:
-            # Convert BGR to RGB
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            
-            # Lấy kích thước canvas thực tế
-            canvas_width = self.canvas.winfo_width() if self.canvas.winfo_width() > 1 else 380
-            canvas_height = self.canvas.winfo_height() if self.canvas.winfo_height() > 1 else 380
-            frame = cv2.resize(frame, (canvas_width, canvas_height))
-            
-            # Convert to PhotoImage
-            image = Image.fromarray(frame)
-            photo = ImageTk.PhotoImage(image=image)
-            
-            # Xóa image cũ nếu có
+        if decoder.finished and not len(decoder.ring):
+            if not show_first:
+                # Video ended
+                self.stop()
+            return
+        if self.is_playing and not self.is_paused:
+            self._schedule(self._next_delay())
+    
+    def _next_delay(self) -> int:
+        """Ms đến frame kế tiếp trong ring (tối đa một chu kỳ frame)"""
+        frame_ms = 1000.0 / self.fps
+        next_pts = self.decoder.ring.next_pts() if self.decoder else None
+        if next_pts is None:
+            return max(1, int(frame_ms / 2))
+        wait_ms = (next_pts - self._video_position()) * 1000
+        return int(max(1, min(frame_ms, wait_ms)))
+    
+    def _draw_frame(self, frame):
+        """Vẽ frame RGB đã scale sẵn: paste vào PhotoImage có sẵn, không tạo item mới"""
+        started = time.perf_counter()
+        height, width = frame.shape[:2]
+        canvas_width, canvas_height = self._canvas_size()
+        
+        if self._photo is None or self._photo_size != (width, height):
+            # Kích thước mới - cấp phát PhotoImage một lần cho kích thước này
+            self._photo = ImageTk.PhotoImage(Image.new('RGB', (width, height)))
+            self._photo_size = (width, height)
             if self.video_image_id:
-                self.canvas.delete(self.video_image_id)
-            
-            # Hiển thị image ở giữa canvas
-            self.video_image_id = self.canvas.create_image(
-                canvas_width // 2, canvas_height // 2,
-                image=photo, anchor=tk.CENTER
-            )
-            self.canvas.photo = photo  # Keep a reference
-            
-            # Schedule next frame
-            delay = int(1000 / self.fps)
-            self.update_id = self.canvas.after(delay, self._update_frame)
-        else:
-            # Video ended
-            self.stop()
+                self.canvas.itemconfigure(self.video_image_id, image=self._photo)
+            else:
+                self.video_image_id = self.canvas.create_image(
+                    canvas_width // 2, canvas_height // 2,
+                    image=self._photo, anchor=tk.CENTER
+                )
+            self.canvas.photo = self._photo  # Keep a reference
+            self.canvas.coords(self.video_image_id, canvas_width // 2, canvas_height // 2)
+        
+        # Cập nhật pixel tại chỗ - frombuffer không copy mảng
+        self._photo.paste(Image.frombuffer('RGB', (width, height), frame, 'raw', 'RGB', 0, 1))
+        
+        elapsed = (time.perf_counter() - started) * 1000
+        self.render_ms += (elapsed - self.render_ms) * self.TIMING_SMOOTHING
     
     def close(self):
         """Đóng video"""
         self.stop()
-
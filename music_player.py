@@ -13,18 +13,42 @@ import traceback
 
 # Import từ các module đã tách
 from theme import Theme
-from ui_components import GlowButton, ModernSlider
+from ui_components import GlowButton, ModernSlider, SeekPreview, SpectrumView
 from music_engine import MusicEngine, VideoPlayer, VIDEO_AVAILABLE, PYDUB_AVAILABLE, FFMPEG_AVAILABLE
+from engine_process import RemoteEngine
+from transcoder import PRIORITY_BACKGROUND
+from engine_events import TRACK_ENDED, TRACK_CHANGED, LOAD_COMPLETE, ERROR
 from youtube_handler import (
     YT_DLP_AVAILABLE, parse_youtube_url, is_youtube_url,
     download_youtube, get_youtube_info, get_playlist_entries
 )
 from linked_list import PlaylistLinkedList, Song
+from media_probe import ProbeStore
+from library_jobs import LibraryJob
+from waveform import WaveformCache
+from spectrum import SpectrumAnalyzer
+from keyframes import KeyframeIndexer
+from video_process import VideoProcess
+from video_proxy import ProxyCache
+from thumbnails import ThumbnailCache
+from sprite_sheets import SpriteSheetCache
+from equalizer import EQ_BANDS, MAX_GAIN_DB
 
 
 class MelodifyApp:
     """Ứng dụng nghe nhạc chính"""
     
+    CROSSFADE_OPTIONS = (0, 2, 4, 6, 8, 12)  # Giây
+    PCM_CACHE_MB = 256  # RAM tối đa cho PCM các bài vừa phát (replay/tua lùi tức thì)
+    PROXY_CACHE_MB = 2048  # Đĩa tối đa cho proxy video độ phân giải thấp
+    ROW_THUMB_SIZE = (40, 22)  # Thumbnail video trong cột đầu playlist
+    # Chạy audio engine ở process riêng (không tranh GIL với UI/video) - hoặc MELODIFY_ENGINE_PROCESS=1
+    ENGINE_PROCESS = False
+    # "ffmpeg": ffmpeg scale frame theo canvas ngay lúc decode (ít pixel qua pipe/RAM), "opencv": VideoCapture
+    VIDEO_BACKEND = "ffmpeg"
+    # Decode video ở process riêng, frame qua shared memory (Tk/download không tranh GIL) - hoặc MELODIFY_VIDEO_PROCESS=1
+    VIDEO_PROCESS = False
+    
     def __init__(self):
         self.root = tk.Tk()
         self.root.title("Melodify - Music Player")
@@ -41,12 +65,19 @@ class MelodifyApp:
         # Core components
         self.playlist = PlaylistLinkedList()
         self.favorites = PlaylistLinkedList()  # Linked List thứ 2 cho favorites
-        self.engine = MusicEngine()
+        if self.ENGINE_PROCESS or os.environ.get("MELODIFY_ENGINE_PROCESS") == "1":
+            self.engine = RemoteEngine(pcm_cache_mb=self.PCM_CACHE_MB)
+        else:
+            self.engine = MusicEngine(pcm_cache_mb=self.PCM_CACHE_MB)
         self.video_player = None  # Sẽ khởi tạo sau khi tạo UI
         
         # State
         self.repeat_mode = 0  # 0: No Repeat, 1: Repeat All, 2: Repeat One
         self.shuffle_mode = False
+        self.show_spectrum = False  # Spectrum visualizer thay vinyl khi không có video
+        self.audio_only = False  # Không mở video cho mọi bài (Song.audio_only: từng bài)
+        self.spectrum_analyzer = SpectrumAnalyzer(bands=32)
+        self._upcoming_index = None  # Bài kế tiếp đã chọn trước (shuffle/gapless)
         self._vinyl_rotation = 0
         self.running = True
         
@@ -67,6 +98,43 @@ class MelodifyApp:
         self.favorites_file = os.path.join(self.data_dir, 'favorites.json')
         self.stats_file = os.path.join(self.data_dir, 'stats.json')
         
+        # Probe store trên đĩa - duration/metadata không phải probe lại mỗi lần mở app
+        self.probe_store = ProbeStore(os.path.join(self.data_dir, 'probe_store.json'))
+        self.engine.attach_store(self.probe_store)
+        self.prefill_job = LibraryJob("prefill", self.engine.probe.probe,
+                                      is_fresh=self.engine.probe.is_known)
+        self._prefill_pending = False
+        
+        # Phân tích loudness + điểm cắt im lặng nền (chạy sau prefill), lưu chung probe store
+        self.loudness_job = LibraryJob("loudness", self.engine.analyze_track,
+                                       is_fresh=self.engine.is_track_analyzed, max_workers=2)
+        self._loudness_pending = False
+        
+        # Proxy video 480p GOP ngắn cho video lớn - tạo nền (sau phân tích audio), giới hạn dung lượng
+        self.video_proxies = ProxyCache(os.path.join(self.data_dir, 'video_proxies'),
+                                        probe=self.engine.probe,
+                                        max_bytes=self.PROXY_CACHE_MB * 1024 * 1024)
+        self.proxy_job = LibraryJob("proxy", self.video_proxies.build,
+                                    is_fresh=self.video_proxies.is_fresh, max_workers=1)
+        self._proxy_pending = False
+        
+        # Sprite sheet preview khi tua video - một lượt ffmpeg nền mỗi file, JPEG trên đĩa
+        self.sprite_sheets = SpriteSheetCache(os.path.join(self.data_dir, 'sprite_sheets'),
+                                              self._call_on_main, probe=self.engine.probe,
+                                              proxies=self.video_proxies)
+        self._sprite_sheet = None  # SpriteSheet của video đang phát (None = chưa có)
+        self._sprite_path = None
+        
+        # Poster/thumbnail video - trích nền một frame mỗi file, JPEG trên đĩa + LRU PhotoImage
+        self.thumbnails = ThumbnailCache(os.path.join(self.data_dir, 'thumbnails'),
+                                         self._call_on_main, probe=self.engine.probe)
+        # Tk chỉ giữ tên ảnh - giữ PhotoImage đang gắn vào dòng/canvas để LRU bỏ ra không xóa mất
+        self._row_thumbnails: dict = {}   # item_id -> PhotoImage
+        self._poster_photo = None
+        
+        # Waveform cho progress slider - tính nền, cache .npy trên đĩa
+        self.waveforms = WaveformCache(os.path.join(self.data_dir, 'waveforms'))
+        
         # Load saved data
         self._load_saved_data()
         
@@ -78,6 +146,10 @@ class MelodifyApp:
         self._refresh_playlist_view()
         
         self._start_update_loop()
+        self._bind_engine_events()
+        
+        # Prefill duration/metadata cho thư viện sau khi UI đã hiện
+        self.root.after(500, self._start_library_prefill)
         
         # Keyboard bindings
         self.root.bind("<space>", lambda e: self.toggle_play())
@@ -85,6 +157,9 @@ class MelodifyApp:
         self.root.bind("<Right>", lambda e: self.next_song())
         
         self.root.protocol("WM_DELETE_WINDOW", self._on_close)
+        # Thu nhỏ cửa sổ thì đóng decoder video, hiện lại thì mở tại vị trí clock
+        self.root.bind("<Unmap>", self._on_window_map, add="+")
+        self.root.bind("<Map>", self._on_window_map, add="+")
         
         # Menu bar
         self._create_menu()
@@ -100,6 +175,7 @@ class MelodifyApp:
                        foreground=Theme.TEXT_PRIMARY,
                        fieldbackground=Theme.BG_CARD,
                        borderwidth=0,
+                       rowheight=self.ROW_THUMB_SIZE[1] + 6,
                        font=("Segoe UI", 11))
         
         style.configure("Playlist.Treeview.Heading",
@@ -135,6 +211,36 @@ class MelodifyApp:
         pl_menu.add_separator()
         pl_menu.add_command(label="Statistics", command=self.show_stats)
         
+        # Playback menu
+        playback_menu = tk.Menu(menubar, tearoff=0)
+        menubar.add_cascade(label="Playback", menu=playback_menu)
+        self.gapless_var = tk.BooleanVar(value=self.engine.gapless)
+        playback_menu.add_checkbutton(label="Gapless Playback", variable=self.gapless_var,
+                                      command=self._on_toggle_gapless)
+        self.spectrum_var = tk.BooleanVar(value=self.show_spectrum)
+        playback_menu.add_checkbutton(label="Spectrum Visualizer", variable=self.spectrum_var,
+                                      command=self._on_toggle_spectrum)
+        self.normalize_var = tk.BooleanVar(value=self.engine.normalize)
+        playback_menu.add_checkbutton(label="Normalize Loudness", variable=self.normalize_var,
+                                      command=self._on_toggle_normalize)
+        self.trim_var = tk.BooleanVar(value=self.engine.trim_silence)
+        playback_menu.add_checkbutton(label="Trim Silence", variable=self.trim_var,
+                                      command=self._on_toggle_trim)
+        self.audio_only_var = tk.BooleanVar(value=self.audio_only)
+        playback_menu.add_checkbutton(label="Audio Only (Video Files)", variable=self.audio_only_var,
+                                      command=self._on_toggle_audio_only)
+        
+        # Crossfade - độ dài overlap giữa hai bài
+        crossfade_menu = tk.Menu(playback_menu, tearoff=0)
+        playback_menu.add_cascade(label="Crossfade", menu=crossfade_menu)
+        self.crossfade_var = tk.DoubleVar(value=self.engine.crossfade)
+        for seconds in self.CROSSFADE_OPTIONS:
+            label = "Off" if seconds == 0 else f"{seconds:g} seconds"
+            crossfade_menu.add_radiobutton(label=label, value=seconds, variable=self.crossfade_var,
+                                           command=self._on_crossfade_change)
+        playback_menu.add_separator()
+        playback_menu.add_command(label="Equalizer...", command=self.show_equalizer)
+        
         # Linked List menu 
         ll_menu = tk.Menu(menubar, tearoff=0)
         menubar.add_cascade(label="Linked List", menu=ll_menu)
@@ -262,10 +368,13 @@ class MelodifyApp:
         
         self.playlist_tree = ttk.Treeview(tree_frame, style="Playlist.Treeview",
                                          columns=("title", "artist"),
-                                         show="headings", selectmode="browse")
+                                         show="tree headings", selectmode="browse")
         
         self.playlist_tree.heading("title", text="Title")
         self.playlist_tree.heading("artist", text="Artist")
+        # Cột đầu (#0) chỉ hiển thị thumbnail video
+        self.playlist_tree.column("#0", width=self.ROW_THUMB_SIZE[0] + 12,
+                                  minwidth=self.ROW_THUMB_SIZE[0] + 12, stretch=False)
         # Tăng width để hiển thị đầy đủ, không bị truncate
         self.playlist_tree.column("title", width=240, minwidth=200)
         self.playlist_tree.column("artist", width=140, minwidth=120)
@@ -316,7 +425,14 @@ class MelodifyApp:
         
         # Khởi tạo video player với canvas
         if VIDEO_AVAILABLE:
-            self.video_player = VideoPlayer(self.vinyl)
+            video_process = None
+            if self.VIDEO_PROCESS or os.environ.get("MELODIFY_VIDEO_PROCESS") == "1":
+                video_process = VideoProcess()
+            self.video_player = VideoPlayer(self.vinyl, clock=self.engine.clock,
+                                            keyframes=KeyframeIndexer(self.probe_store),
+                                            backend=self.VIDEO_BACKEND, probe=self.engine.probe,
+                                            process=video_process, proxies=self.video_proxies)
+        self.spectrum_view = SpectrumView(self.vinyl, bands=self.spectrum_analyzer.bands)
         
         # Song info
         info_frame = tk.Frame(now_playing, bg=Theme.BG_CARD)
@@ -339,10 +455,13 @@ class MelodifyApp:
         progress_frame.pack(fill=tk.X, padx=20, pady=8)
         
         # Progress slider - sẽ cập nhật max_val khi có bài hát
-        self.progress_slider = ModernSlider(progress_frame, width=380, height=26,
+        self.progress_slider = ModernSlider(progress_frame, width=380, height=34,
                                            min_val=0, max_val=100, value=0,
-                                           command=self._on_seek)
+                                           command=self._on_seek, live=False,
+                                           preview_command=self._on_seek_preview,
+                                           hover_command=self._on_seek_hover)
         self.progress_slider.pack()
+        self.seek_preview = SeekPreview(self.root)
         
         time_frame = tk.Frame(progress_frame, bg=Theme.BG_CARD)
         time_frame.pack(fill=tk.X, pady=5)
@@ -545,9 +664,12 @@ class MelodifyApp:
             for path in files:
                 song = Song.from_path(path)
                 self.playlist.append(song)
+                # Làm ấm cache convert ở nền (MP4/M4A...)
+                self.engine.prefetch(path, PRIORITY_BACKGROUND)
             
             self._refresh_playlist_view()
             self._update_status(f" Added {len(files)} song(s)")
+            self._start_library_prefill()
     
     # ==================== YOUTUBE SUPPORT ====================
     
@@ -871,7 +993,9 @@ class MelodifyApp:
                     def add_all_songs():
                         for song in songs_to_add:
                             self.playlist.append(song)
+                            self.engine.prefetch(song.path, PRIORITY_BACKGROUND)
                         self._refresh_playlist_view()
+                        self._start_library_prefill()
                     
                     # Sử dụng root.after để đảm bảo UI update
                     self.root.after(0, lambda d=downloaded, t=count, pw=progress_window, cb=add_all_songs: 
@@ -926,6 +1050,7 @@ class MelodifyApp:
             # Song đã được xử lý trong thread, thêm vào playlist NGAY
             self.playlist.append(song)
             print(f"DEBUG: Song added, new playlist size: {len(self.playlist)}")
+            self.engine.prefetch(song.path, PRIORITY_BACKGROUND)
             
             # Refresh playlist view ngay để hiển thị bài hát mới - đảm bảo trên main thread
             # Gọi trực tiếp vì đã ở main thread (từ root.after)
@@ -939,6 +1064,7 @@ class MelodifyApp:
             
             self._update_status(f" Added: {song.title}")
             print(f"DEBUG: Status updated: Added {song.title}")
+            self._start_library_prefill()
         except Exception as e:
             print(f"Error adding song: {e}")
             traceback.print_exc()
@@ -1002,6 +1128,7 @@ class MelodifyApp:
             # Xóa cũ - nhanh chóng
             for item in self.playlist_tree.get_children():
                 self.playlist_tree.delete(item)
+            self._row_thumbnails.clear()
             
             # Chuẩn bị dữ liệu trong background thread để không block UI
             def prepare_data():
@@ -1012,7 +1139,8 @@ class MelodifyApp:
                     if hasattr(song, 'youtube_url') and song.youtube_url:
                         title_display = "📺 " + title_display
                     
-                    items_to_add.append((title_display, song.artist, song == self.playlist.current_song))
+                    items_to_add.append((title_display, song.artist, song == self.playlist.current_song,
+                                         song.path))
                 return items_to_add
             
             # Chuẩn bị dữ liệu
@@ -1025,8 +1153,9 @@ class MelodifyApp:
                 end_idx = min(start_idx + batch_size, len(items_to_add))
                 
                 for i in range(start_idx, end_idx):
-                    title, artist, is_current = items_to_add[i]
+                    title, artist, is_current, path = items_to_add[i]
                     item_id = self.playlist_tree.insert("", tk.END, values=(title, artist))
+                    self._attach_row_thumbnail(item_id, path)
                     
                     # Highlight current song
                     if is_current:
@@ -1035,7 +1164,7 @@ class MelodifyApp:
                 
                 # Update count ngay sau batch đầu tiên
                 if start_idx == 0 and hasattr(self, 'playlist_count'):
-                    self.playlist_count.config(text=f"{len(self.playlist)} songs")
+                    self.playlist_count.config(text=self._playlist_count_text())
                 
                 # Nếu còn items, schedule batch tiếp theo
                 if end_idx < len(items_to_add):
@@ -1043,7 +1172,7 @@ class MelodifyApp:
                 else:
                     # Hoàn thành, update count và info
                     if hasattr(self, 'playlist_count'):
-                        self.playlist_count.config(text=f"{len(self.playlist)} songs")
+                        self.playlist_count.config(text=self._playlist_count_text())
                     self._update_ll_info()
             
             # Bắt đầu batch insert - insert ngay batch đầu tiên
@@ -1051,15 +1180,16 @@ class MelodifyApp:
                 # Insert ngay batch đầu tiên (không delay) để user thấy ngay
                 first_batch_size = min(50, len(items_to_add))
                 for i in range(first_batch_size):
-                    title, artist, is_current = items_to_add[i]
+                    title, artist, is_current, path = items_to_add[i]
                     item_id = self.playlist_tree.insert("", tk.END, values=(title, artist))
+                    self._attach_row_thumbnail(item_id, path)
                     if is_current:
                         self.playlist_tree.selection_set(item_id)
                         self.playlist_tree.see(item_id)
                 
                 # Update count ngay
                 if hasattr(self, 'playlist_count'):
-                    self.playlist_count.config(text=f"{len(self.playlist)} songs")
+                    self.playlist_count.config(text=self._playlist_count_text())
                 
                 # Nếu còn items, schedule batch tiếp theo
                 if len(items_to_add) > first_batch_size:
@@ -1075,6 +1205,40 @@ class MelodifyApp:
         except Exception as e:
             print(f"Error refreshing playlist view: {e}")
     
+    def _is_video_file(self, path: str) -> bool:
+        return os.path.splitext(path)[1].lower() in MusicEngine.VIDEO_FORMATS
+    
+    def _attach_row_thumbnail(self, item_id, path: str):
+        """Gắn thumbnail video vào dòng playlist - có sẵn thì gắn ngay, không thì khi trích xong"""
+        if not self._is_video_file(path):
+            return
+        
+        def on_thumbnail(_, photo):
+            if self.playlist_tree.exists(item_id):
+                self.playlist_tree.item(item_id, image=photo)
+                self._row_thumbnails[item_id] = photo
+        
+        self.thumbnails.request(path, self.ROW_THUMB_SIZE, on_thumbnail)
+    
+    def _poster_size(self) -> tuple:
+        width = self.vinyl.winfo_width() if self.vinyl.winfo_width() > 1 else 380
+        height = self.vinyl.winfo_height() if self.vinyl.winfo_height() > 1 else 340
+        return width, height
+    
+    def _show_poster(self, video_path: str):
+        """Vẽ poster lên canvas ngay khi đổi bài - frame video đầu tiên sẽ phủ lên khi decoder sẵn sàng"""
+        def on_poster(path, photo):
+            if path != self.engine._video_path or not self.engine._has_video:
+                return  # Đã chuyển bài khác
+            if self.video_player and self.video_player.video_image_id is not None:
+                return  # Video đã có frame thật
+            self.vinyl.delete("all")
+            self._poster_photo = photo
+            self.vinyl.create_image(0, 0, anchor=tk.NW, image=photo, tags="poster")
+            self.vinyl.tag_lower("poster")
+        
+        self.thumbnails.request(video_path, self._poster_size(), on_poster)
+    
     def _on_song_double_click(self, event):
         """Xử lý double-click vào bài hát"""
         selection = self.playlist_tree.selection()
@@ -1107,6 +1271,7 @@ class MelodifyApp:
             else:
                 # Đang pause, resume
                 self.engine.play()
+                self._ensure_ui_loop()
                 # Resume video
                 if self.video_player and self.engine._has_video:
                     self.video_player.resume()
@@ -1117,6 +1282,7 @@ class MelodifyApp:
             if self.engine.is_paused:
                 # Đang pause, resume
                 self.engine.play()
+                self._ensure_ui_loop()
                 if self.video_player and self.engine._has_video:
                     self.video_player.resume()
                 self.play_btn.icon = "⏸️"
@@ -1141,11 +1307,11 @@ class MelodifyApp:
             self.video_player.stop()
         
         if self.shuffle_mode:
-            # Random trong linked list
+            # Random trong linked list - dùng bài đã chọn trước nếu có (đã convert sẵn)
             if len(self.playlist) > 1:
-                index = random.randint(0, len(self.playlist) - 1)
-                while index == self.playlist.current_index:
-                    index = random.randint(0, len(self.playlist) - 1)
+                index = self._upcoming_index
+                if index is None or index == self.playlist.current_index or index >= len(self.playlist):
+                    index = self._random_other_index()
                 self.playlist.go_to(index)
             else:
                 # Chỉ có 1 bài, không cần chuyển
@@ -1185,6 +1351,7 @@ class MelodifyApp:
         self.shuffle_btn._draw()
         
         self._update_status(f"🔀 Shuffle: {'ON' if self.shuffle_mode else 'OFF'}")
+        self._queue_upcoming()
     
     def toggle_repeat(self):
         """Chuyển chế độ repeat"""
@@ -1202,6 +1369,7 @@ class MelodifyApp:
         
         modes = ["OFF", "REPEAT ALL", "REPEAT ONE"]
         self._update_status(f"🔁 Repeat: {modes[self.repeat_mode]}")
+        self._queue_upcoming()
     
     def shuffle_playlist(self):
         """Xáo trộn playlist"""
@@ -1227,7 +1395,8 @@ class MelodifyApp:
             self._update_status(" Playlist cleared")
     
     def _on_seek(self, value):
-        """Seek trong bài hát - reload và play từ vị trí mới"""
+        """Seek trong bài hát - định vị trực tiếp trên source đã load (gọi một lần khi thả slider)"""
+        self.seek_preview.hide()
         song = self.playlist.current_song
         if not song:
             return
@@ -1240,52 +1409,60 @@ class MelodifyApp:
         # value từ slider là giây (vì max_val = duration)
         position_seconds = max(0, min(value, final_duration))
         
-        was_playing = self.engine.is_playing and not self.engine.is_paused
+        if not self.engine.seek(position_seconds):
+            # Chưa có source (đã stop) - load lại một lần và phát từ vị trí mới
+            if not self.engine.load(song.path):
+                return
+            self.engine.play(start_pos=position_seconds)
+            self._ensure_ui_loop()
+            self.play_btn.icon = "⏸️"
+            self.play_btn._draw()
         
-        # Dừng hiện tại
-        self.engine.stop()
-        if self.video_player:
-            self.video_player.stop()
+        # Xử lý video (nếu có và đang hiển thị)
+        if self._video_wanted():
+            # Mở video nếu chưa mở hoặc đã bị đóng
+            if not self.video_player.is_open():
+                self._open_video()
+            self.video_player.seek(position_seconds)
+            if self.engine.is_paused and self.video_player.is_playing:
+                self.video_player.pause()
+        
+        # Cập nhật UI ngay
+        self.progress_slider.value = position_seconds
+        self.time_current.config(text=self._format_time(position_seconds))
+    
+    def _on_seek_preview(self, value):
+        """Đang kéo slider - cập nhật nhãn thời gian + keyframe gần nhất của video, chưa seek audio"""
+        self.time_current.config(text=self._format_time(max(0, value)))
+        if self._show_seek_preview(max(0, value)):
+            return  # Preview từ sprite sheet - không decode, chỉ seek thật khi thả chuột
+        if self.video_player and self.engine._has_video and self.video_player.decoder:
+            self.video_player.preview(max(0, value))
+    
+    def _on_seek_hover(self, value):
+        """Rê chuột trên slider - preview frame tại vị trí dưới con trỏ (nếu có sprite sheet)"""
+        if value is None or not self._show_seek_preview(value):
+            self.seek_preview.hide()
+    
+    def _show_seek_preview(self, value) -> bool:
+        """Hiện frame gần value nhất từ sprite sheet - False nếu video chưa có sheet"""
+        sheet = self._sprite_sheet
+        if sheet is None or not self.engine._has_video or self._sprite_path != self.engine._video_path:
+            return False
+        self.seek_preview.show(self.progress_slider, self.progress_slider.x_of(value),
+                               sheet.tile(value), self._format_time(value))
+        return True
+    
+    def _load_sprite_sheet(self, video_path: str):
+        """Sprite sheet cho video vừa bắt đầu phát - tạo nền nếu chưa có"""
+        self._sprite_sheet = None
+        self._sprite_path = video_path
         
-        # Load lại file
-        if self.engine.load(song.path):
-            # Xử lý video (nếu có) - seek trước khi play
-            if self.video_player and self.engine._has_video and self.engine._video_path:
-                # Mở video nếu chưa mở hoặc đã bị đóng
-                if not self.video_player.video_cap or not self.video_player.video_cap.isOpened():
-                    self.video_player.open(self.engine._video_path)
-                # Seek video đến vị trí mới
-                self.video_player.seek(position_seconds)
-            
-            # Play từ vị trí mới - play() sẽ set tracking variables đúng
-            if was_playing:
-                # Play audio từ vị trí cụ thể - play() sẽ set _play_start_time và _play_start_pos
-                self.engine.play(start_pos=position_seconds)
-                # Đảm bảo tracking variables được set đúng sau play()
-                import time
-                if not hasattr(self.engine, '_play_start_time') or self.engine._play_start_time is None:
-                    self.engine._play_start_time = time.time()
-                    self.engine._play_start_pos = position_seconds
-                
-                # Play video nếu có
-                if self.video_player and self.engine._has_video:
-                    if not self.video_player.is_playing:
-                        self.video_player.play()
-            else:
-                # Chỉ set position, không play - vẫn cần set tracking để khi play sau sẽ đúng
-                import time
-                self.engine.current_pos = position_seconds
-                self.engine._play_start_time = None  # Chưa play nên không set time
-                self.engine._play_start_pos = position_seconds
-                
-                # Video đã được seek ở trên, chỉ cần pause nếu đang playing
-                if self.video_player and self.engine._has_video:
-                    if self.video_player.is_playing:
-                        self.video_player.pause()
-            
-            # Cập nhật UI ngay - đảm bảo không bị reset
-            self.progress_slider.value = position_seconds
-            self.time_current.config(text=self._format_time(position_seconds))
+        def on_sheet(path, sheet):
+            if path == self._sprite_path:
+                self._sprite_sheet = sheet
+        
+        self.sprite_sheets.request(video_path, on_sheet)
     
     def _on_volume_change(self, value):
         """Thay đổi volume"""
@@ -1294,61 +1471,151 @@ class MelodifyApp:
     # ==================== UPDATE LOOP ====================
     
     def _start_update_loop(self):
-        """Bắt đầu update loop trên main thread (dùng root.after)"""
+        """Bắt đầu update loop trên main thread (dùng root.after) - chỉ chạy khi đang phát"""
         self._vinyl_rotation = 0
-        self._update_ui_loop()
+        self._ui_loop_id = None
+        self._ensure_ui_loop()
+    
+    def _ensure_ui_loop(self):
+        """Đảm bảo update loop đang chạy (gọi sau khi play/resume/seek)"""
+        if self._ui_loop_id is None and self.running:
+            self._ui_loop_id = self.root.after(0, self._update_ui_loop)
     
     def _update_ui_loop(self):
-        """Update loop chạy trên main thread"""
+        """Update loop chạy trên main thread - tự dừng khi idle/pause
+        
+        Hết bài được báo qua engine event (TRACK_ENDED), loop không poll get_busy().
+        """
+        self._ui_loop_id = None
         if not self.running:
             return
         
+        if not (self.engine.is_playing and not self.engine.is_paused):
+            # Idle - không đặt lịch lại, _ensure_ui_loop() sẽ bật khi phát tiếp
+            return
+        
         try:
-            # Update progress khi đang playing (không pause)
-            if self.engine.is_playing and not self.engine.is_paused:
-                # Lấy position từ engine (đã track thủ công sau seek)
-                pos = self.engine.get_pos()
-                
-                # Đảm bảo position hợp lệ
-                if pos < 0:
-                    pos = 0
-                
-                # Với video, cần sync với video player
-                if self.engine._has_video and self.video_player and self.video_player.is_playing:
-                    # Sync video với audio position
-                    self.video_player.sync_with_audio(pos)
-                
-                # Cập nhật UI trực tiếp (đã ở main thread)
-                try:
+            # Lấy position từ clock chung của engine
+            pos = self.engine.get_pos()
+            
+            # Đảm bảo position hợp lệ
+            if pos < 0:
+                pos = 0
+            
+            # Với video, cần sync với video player
+            if self.engine._has_video and self.video_player and self.video_player.is_playing:
+                # Sync video với audio position
+                self.video_player.sync_with_audio(pos)
+            
+            # Cập nhật UI trực tiếp (đã ở main thread)
+            try:
+                # Không ghi đè slider khi user đang kéo
+                if not self.progress_slider.is_dragging:
                     # Cập nhật slider (đảm bảo max_val đã được set)
                     if self.progress_slider.max_val > 0:
                         slider_value = min(pos, self.progress_slider.max_val)
                         self.progress_slider.value = slider_value
                     # Luôn update timer
                     self.time_current.config(text=self._format_time(pos))
-                except Exception as e:
-                    print(f"Error updating UI: {e}")
-                
-                # Rotate vinyl chỉ khi không có video
-                if not self.engine._has_video:
-                    self._vinyl_rotation = (self._vinyl_rotation + 2) % 360
-                    self._draw_vinyl(self._vinyl_rotation)
+            except Exception as e:
+                print(f"Error updating UI: {e}")
             
-            # Check if song ended - CHỈ khi đang playing và KHÔNG pause
-            # Với video, cần check cả video player
-            if self.engine.is_playing and not self.engine.is_paused:
-                if self.engine._has_video and self.video_player:
-                    # Với video, check cả video player và audio engine
-                    if not self.video_player.is_playing and not self.engine.is_active():
-                        self._on_song_end()
-                elif not self.engine.is_active():
-                    # Chỉ audio, check engine
-                    self._on_song_end()
+            # Spectrum hoặc rotate vinyl chỉ khi không hiển thị video
+            if not self._video_shown() and not self._update_spectrum(pos):
+                self._vinyl_rotation = (self._vinyl_rotation + 2) % 360
+                self._draw_vinyl(self._vinyl_rotation)
         except Exception as e:
             print(f"Error in update loop: {e}")
         
         # Schedule next update (50ms = ~20 FPS)
-        self.root.after(50, self._update_ui_loop)
+        self._ui_loop_id = self.root.after(50, self._update_ui_loop)
+    
+    def _update_spectrum(self, pos: float) -> bool:
+        """Vẽ spectrum tại vị trí clock - False nếu tắt hoặc PCM chưa decode xong (vẽ vinyl)"""
+        if not self.show_spectrum:
+            return False
+        result = self.spectrum_analyzer.analyze(self.engine.pcm, pos)
+        if result is None:
+            return False
+        levels, level = result
+        self.spectrum_view.update(levels, level)
+        return True
+    
+    def _on_toggle_spectrum(self):
+        """Bật/tắt spectrum visualizer từ menu Playback"""
+        self.show_spectrum = self.spectrum_var.get()
+        self.spectrum_analyzer.reset()
+        if not self.show_spectrum and not self._video_shown():
+            self.spectrum_view.clear()
+            self._draw_vinyl(self._vinyl_rotation)
+        self._update_status(f"📊 Spectrum: {'ON' if self.show_spectrum else 'OFF'}")
+    
+    # ==================== ENGINE EVENTS ====================
+    
+    def _bind_engine_events(self):
+        """Nhận sự kiện engine qua một hàng đợi dispatch trên main thread"""
+        events = self.engine.events
+        events.set_notifier(lambda: self._call_on_main(events.dispatch))
+        events.subscribe(TRACK_ENDED, self._on_engine_track_ended)
+        events.subscribe(TRACK_CHANGED, self._on_engine_track_changed)
+        events.subscribe(LOAD_COMPLETE, self._on_engine_load_complete)
+        events.subscribe(ERROR, self._on_engine_error)
+    
+    def _on_engine_track_ended(self, event):
+        """Engine báo hết bài đúng thời điểm mixer dừng"""
+        song = self.playlist.current_song
+        if song and event.data.get('path') not in (None, song.path):
+            return  # Sự kiện của bài cũ đến muộn
+        self._on_song_end()
+    
+    def _on_engine_track_changed(self, event):
+        """Mixer đã tự chuyển sang bài queue sẵn (gapless) - chỉ cập nhật playlist/UI"""
+        previous_duration = event.data.get('previous_duration', 0)
+        if previous_duration > 0:
+            self.stats["total_time"] = self.stats.get("total_time", 0) + previous_duration
+        
+        path = event.data.get('path')
+        index = self._upcoming_index
+        self._upcoming_index = None
+        if self.video_player:
+            self.video_player.stop()
+        
+        if index is None:
+            # Chế độ phát đã đổi (vd. tắt repeat ở bài cuối) sau khi mixer nhận bài queue
+            self.engine.stop()
+            self.play_btn.icon = "▶️"
+            self.play_btn._draw()
+            self._update_status("⏹️ End of playlist")
+            return
+        
+        song = self.playlist.get_at(index)
+        if not song or song.path != path:
+            # Playlist thay đổi sau khi queue - tìm lại bài theo path
+            index = next((i for i, s in enumerate(self.playlist) if s.path == path), None)
+            if index is None:
+                self.engine.stop()
+                self.play_btn.icon = "▶️"
+                self.play_btn._draw()
+                return
+        
+        song = self.playlist.go_to(index)
+        duration = event.data.get('duration', 0)
+        if song.duration <= 0 < duration:
+            song.duration = duration
+        self._on_track_started(song)
+    
+    def _on_engine_load_complete(self, event):
+        """Ghi lại duration đã probe vào Song (cho tổng thời lượng playlist)"""
+        duration = event.data.get('duration', 0)
+        song = self.playlist.current_song
+        if song and song.path == event.data.get('path') and song.duration <= 0 < duration:
+            song.duration = duration
+    
+    def _on_engine_error(self, event):
+        message = event.data.get('message', 'Unknown error')
+        path = event.data.get('path')
+        name = os.path.basename(path) if path else ''
+        self._update_status(f" Engine error {name}: {message}")
     
     def _on_song_end(self):
         """Xử lý khi bài hát kết thúc"""
@@ -1391,6 +1658,130 @@ class MelodifyApp:
         info = f"🔗 LL: {size} nodes | Head→Tail | Current: {current} | Next:{has_next} Prev:{has_prev} | {mode}"
         self.ll_info.config(text=info)
     
+    def _playlist_count_text(self) -> str:
+        """Số bài + tổng thời lượng playlist (chỉ tính bài đã biết duration)"""
+        count = len(self.playlist)
+        total = sum(song.duration for song in self.playlist if song.duration > 0)
+        if total > 0:
+            return f"{count} songs • {self._format_time(total)}"
+        return f"{count} songs"
+    
+    # ==================== LIBRARY PREFILL ====================
+    
+    def _library_songs(self) -> list:
+        """Tất cả Song trong playlist và favorites (có thể trùng path)"""
+        return list(self.playlist) + list(self.favorites)
+    
+    def _start_library_prefill(self):
+        """Probe nền duration/metadata cho toàn bộ thư viện - bỏ qua file không đổi"""
+        if self.prefill_job.is_running:
+            # Đang chạy - chạy lại khi xong để bắt các bài mới thêm
+            self._prefill_pending = True
+            return
+        self._prefill_pending = False
+        
+        songs_by_path = {}
+        for song in self._library_songs():
+            songs_by_path.setdefault(song.path, []).append(song)
+        
+        def on_result(path, info):
+            # Ghi thẳng vào Song (gán float là atomic, UI đọc ở lần refresh sau)
+            if info and info.duration > 0:
+                for song in songs_by_path.get(path, []):
+                    song.duration = info.duration
+        
+        def on_progress(done, total):
+            self._call_on_main(lambda: self._update_status(f"🔍 Scanning library: {done}/{total}"))
+        
+        def on_done(processed, skipped):
+            self.probe_store.save()
+            self._call_on_main(lambda: self._on_library_prefill_done(processed))
+        
+        self.prefill_job.start(list(songs_by_path), on_result, on_progress, on_done)
+    
+    def _on_library_prefill_done(self, processed: int):
+        """Cập nhật UI sau khi prefill xong (main thread)"""
+        if hasattr(self, 'playlist_count'):
+            self.playlist_count.config(text=self._playlist_count_text())
+        
+        # Bài đang phát dùng fallback duration - cập nhật lại slider
+        song = self.playlist.current_song
+        if song and song.duration > 0 and self.engine.is_playing:
+            if abs(self.progress_slider.max_val - song.duration) > 1:
+                self.progress_slider.max_val = song.duration
+                self.engine.duration = song.duration
+                self.time_total.config(text=self._format_time(song.duration))
+        
+        if processed:
+            self._update_status(f"✅ Library scan complete: {processed} file(s) probed")
+        
+        if self._prefill_pending:
+            self._start_library_prefill()
+        else:
+            self._start_loudness_analysis()
+    
+    def _start_loudness_analysis(self):
+        """Đo loudness + im lặng đầu/cuối nền cho các bài chưa phân tích (bỏ qua file không đổi)"""
+        if self.loudness_job.is_running:
+            self._loudness_pending = True
+            return
+        self._loudness_pending = False
+        paths = [song.path for song in self._library_songs()]
+        
+        def on_result(path, result):
+            self.engine.refresh_loudness(path)
+        
+        def on_progress(done, total):
+            self._call_on_main(lambda: self._update_status(f"🔊 Analyzing audio: {done}/{total}"))
+        
+        def on_done(processed, skipped):
+            self.probe_store.save()
+            self._call_on_main(lambda: self._on_loudness_analysis_done(processed))
+        
+        self.loudness_job.start(paths, on_result, on_progress, on_done)
+    
+    def _on_loudness_analysis_done(self, processed: int):
+        if processed:
+            self._update_status(f"✅ Audio analysis complete: {processed} file(s)")
+        if self._loudness_pending:
+            self._start_loudness_analysis()
+        else:
+            self._start_proxy_generation()
+    
+    def _start_proxy_generation(self):
+        """Tạo proxy độ phân giải thấp nền cho video trong thư viện (bỏ qua video nhỏ/đã có proxy)"""
+        if not FFMPEG_AVAILABLE:
+            return
+        if self.proxy_job.is_running:
+            self._proxy_pending = True
+            return
+        self._proxy_pending = False
+        paths = [song.path for song in self._library_songs()
+                 if os.path.splitext(song.path)[1].lower() in MusicEngine.VIDEO_FORMATS]
+        
+        def on_progress(done, total):
+            self._call_on_main(lambda: self._update_status(f"🎞️ Creating video proxies: {done}/{total}"))
+        
+        def on_done(processed, skipped):
+            self._call_on_main(lambda: self._on_proxy_generation_done(processed))
+        
+        self.proxy_job.start(paths, on_progress=on_progress, on_done=on_done)
+    
+    def _on_proxy_generation_done(self, processed: int):
+        if processed:
+            self._update_status(f"✅ Video proxies ready: {processed} file(s)")
+        if self._proxy_pending:
+            self._start_proxy_generation()
+    
+    def _call_on_main(self, callback):
+        """Chuyển callback từ thread nền về Tk main thread"""
+        if not self.running:
+            return
+        try:
+            self.root.after(0, callback)
+        except Exception:
+            pass
+    
     def _format_time(self, seconds: float) -> str:
         """Format thời gian mm:ss"""
         minutes = int(seconds // 60)
@@ -1410,6 +1801,7 @@ class MelodifyApp:
             self._load_saved_data()
             self._refresh_playlist_view()
             self._update_status("📂 Playlist loaded!")
+            self._start_library_prefill()
     
     def export_playlist(self):
         """Export playlist ra file"""
@@ -1440,6 +1832,7 @@ class MelodifyApp:
                         self.playlist.append(song)
                 self._refresh_playlist_view()
                 self._update_status(" Imported successfully!")
+                self._start_library_prefill()
             else:
                 self._update_status(" Import failed!")
     
@@ -1483,6 +1876,12 @@ class MelodifyApp:
                                command=lambda: self._open_youtube_in_browser(song.youtube_url))
                 menu.add_separator()
             
+            if self._is_video_file(song.path):
+                audio_only_var = tk.BooleanVar(value=song.audio_only)
+                menu.add_checkbutton(label="🎵 Audio Only", variable=audio_only_var,
+                                     command=lambda: self._set_track_audio_only(song, audio_only_var.get()))
+                menu.add_separator()
+            
             menu.add_command(label="❤️ Add to Favorites", command=self.add_to_favorites)
             menu.add_command(label="➡️ Remove from Favorites", command=self.remove_from_favorites)
             menu.add_separator()
@@ -1659,70 +2058,292 @@ class MelodifyApp:
         if self.engine.load(song.path):
             # Play từ đầu (start_pos=0.0)
             self.engine.play(start_pos=0.0)
-            
-            # Mở video player nếu có video
-            if self.engine._has_video and self.video_player and self.engine._video_path:
-                self.video_player.open(self.engine._video_path)
-            else:
-                # Không có video, vẽ vinyl
-                self._draw_vinyl()
-            
-            # Update stats
-            self.stats["total_played"] = self.stats.get("total_played", 0) + 1
-            self.stats["last_played"] = datetime.now().strftime("%Y-%m-%d %H:%M")
-            path = song.path
-            self.stats["song_play_count"][path] = \
-            self.stats["song_play_count"].get(path, 0) + 1
-
-            # Update UI với fade animation
-            self._fade_update_song_info(song.title, song.artist)
-            self.play_btn.icon = "⏸️"
-            self.play_btn._draw()
-            
-            # Update progress - ưu tiên duration từ song object (từ YouTube), nếu không có thì dùng engine duration
-            final_duration = song.duration if song.duration > 0 else self.engine.duration
-            if final_duration <= 0:
-                final_duration = 100  # Fallback
-            
-            self.progress_slider.max_val = final_duration
-            self.progress_slider.value = 0  # Reset về đầu
-            self.time_total.config(text=self._format_time(final_duration))
-            self.time_current.config(text="0:00")  # Reset thời gian hiện tại
-            
-            # Cập nhật engine duration nếu song có duration chính xác hơn
-            if song.duration > 0 and abs(song.duration - self.engine.duration) > 1:
-                self.engine.duration = song.duration
-            
-            self._refresh_playlist_view()
-            
-            # Status với thông tin convert
-            convert_info = f" (converted from {ext})" if needs_convert and self.engine._temp_file else ""
-            video_info = " 🎬 [Video]" if self.engine._has_video else ""
-            self._update_status(f"▶️ Now playing: {song}{convert_info}{video_info}")
+            self._ensure_ui_loop()
+            self._on_track_started(song)
         else:
             if needs_convert:
-                if not PYDUB_AVAILABLE:
-                    self._update_status(f" Cannot play {ext}: Install pydub (pip install pydub)")
-                elif not FFMPEG_AVAILABLE:
+                if not FFMPEG_AVAILABLE:
                     self._update_status(f" Cannot play {ext}: Restart terminal for FFmpeg")
                 else:
                     self._update_status(f" Error converting: {song.title}")
             else:
                 self._update_status(f" Error loading: {song.title}")
     
+    def _on_track_started(self, song: Song):
+        """Cập nhật video/stats/UI khi engine bắt đầu phát song (load mới hoặc gapless)"""
+        ext = os.path.splitext(song.path)[1].lower()
+        needs_convert = ext in MusicEngine.CONVERT_FORMATS
+        
+        # Mở video player nếu có video và đang hiển thị (audio-only/thu nhỏ: mở sau khi cần)
+        if self._video_wanted():
+            self._open_video()
+        else:
+            if self.video_player:
+                self.video_player.stop()
+            # Không có video, vẽ vinyl
+            self._draw_vinyl()
+        
+        # Update stats
+        self.stats["total_played"] = self.stats.get("total_played", 0) + 1
+        self.stats["last_played"] = datetime.now().strftime("%Y-%m-%d %H:%M")
+        path = song.path
+        self.stats["song_play_count"][path] = \
+        self.stats["song_play_count"].get(path, 0) + 1
+
+        # Update UI với fade animation
+        self._fade_update_song_info(song.title, song.artist)
+        self.play_btn.icon = "⏸️"
+        self.play_btn._draw()
+        
+        # Update progress - ưu tiên duration từ song object (từ YouTube), nếu không có thì dùng engine duration
+        final_duration = song.duration if song.duration > 0 else self.engine.duration
+        if final_duration <= 0:
+            final_duration = 100  # Fallback
+        
+        self.progress_slider.max_val = final_duration
+        self.progress_slider.value = 0  # Reset về đầu
+        self._show_waveform(song, final_duration)
+        self.time_total.config(text=self._format_time(final_duration))
+        self.time_current.config(text="0:00")  # Reset thời gian hiện tại
+        
+        # Cập nhật engine duration nếu song có duration chính xác hơn
+        if song.duration > 0 and abs(song.duration - self.engine.duration) > 1:
+            self.engine.duration = song.duration
+        
+        self._refresh_playlist_view()
+        self._queue_upcoming()
+        
+        # Status với thông tin convert
+        convert_info = f" (converted from {ext})" if needs_convert and self.engine._temp_file else ""
+        video_info = " 🎬 [Video]" if self.engine._has_video else ""
+        eq_info = " 🎚️ [EQ off: track too long]" if self.engine.eq_bypassed else ""
+        self._update_status(f"▶️ Now playing: {song}{convert_info}{video_info}{eq_info}")
+    
+    def _show_waveform(self, song: Song, duration: float):
+        """Waveform của bài trong progress slider - cache thì vẽ ngay, chưa có thì tính nền"""
+        self.progress_slider.set_waveform(None)
+        
+        def on_peaks(path, peaks):
+            def apply():
+                current = self.playlist.current_song
+                if current and current.path == path:
+                    self.progress_slider.set_waveform((peaks / 32768.0).tolist())
+            if threading.current_thread() is threading.main_thread():
+                apply()
+            else:
+                self._call_on_main(apply)
+        
+        self.waveforms.request(song.path, duration, on_peaks)
+    
+    def _random_other_index(self) -> int:
+        """Index ngẫu nhiên khác bài hiện tại (playlist có từ 2 bài)"""
+        index = random.randint(0, len(self.playlist) - 1)
+        while index == self.playlist.current_index:
+            index = random.randint(0, len(self.playlist) - 1)
+        return index
+    
+    def _pick_upcoming_index(self) -> Optional[int]:
+        """Bài sẽ phát khi bài hiện tại kết thúc - cùng luật với _on_song_end/next_song"""
+        current = self.playlist.current_index
+        if current < 0:
+            return None
+        if self.repeat_mode == 2:
+            return current
+        if not self.playlist.has_next():
+            return None
+        if self.shuffle_mode:
+            return self._random_other_index() if len(self.playlist) > 1 else None
+        return current + 1 if current + 1 < len(self.playlist) else 0
+    
+    def _queue_upcoming(self):
+        """Chọn trước bài kế tiếp: gapless thì giao cho mixer, không thì chỉ convert trước ở nền"""
+        self._upcoming_index = self._pick_upcoming_index()
+        if self._upcoming_index is None:
+            return
+        upcoming = self.playlist.get_at(self._upcoming_index)
+        if not upcoming:
+            return
+        if self._is_video_file(upcoming.path):
+            # Làm ấm poster để đổi bài hiển thị ngay
+            self.thumbnails.request(upcoming.path, self._poster_size(), lambda path, photo: None)
+        if (self.engine.gapless or self.engine.crossfade > 0) and self.engine.is_playing:
+            self.engine.queue_next(upcoming.path)
+        else:
+            self.engine.prefetch(upcoming.path)
+    
+    def _on_toggle_gapless(self):
+        """Bật/tắt gapless từ menu Playback"""
+        self.engine.gapless = self.gapless_var.get()
+        self._update_status(f"🎚️ Gapless: {'ON' if self.engine.gapless else 'OFF'}")
+        if self.engine.gapless:
+            self._queue_upcoming()
+    
+    def _on_toggle_normalize(self):
+        """Bật/tắt chuẩn hóa loudness từ menu Playback"""
+        self.engine.normalize = self.normalize_var.get()
+        self._update_status(f"🔊 Normalize loudness: {'ON' if self.engine.normalize else 'OFF'}")
+    
+    def _on_toggle_audio_only(self):
+        """Bật/tắt audio-only cho mọi video từ menu Playback"""
+        self.audio_only = self.audio_only_var.get()
+        self._update_status(f"🎵 Audio only: {'ON' if self.audio_only else 'OFF'}")
+        self._sync_video_visibility()
+    
+    def _set_track_audio_only(self, song: Song, audio_only: bool):
+        """Audio-only cho riêng một bài (lưu trong playlist)"""
+        song.audio_only = audio_only
+        if song is self.playlist.current_song:
+            self._sync_video_visibility()
+    
+    def _video_wanted(self) -> bool:
+        """Bài đang phát có video, không ở chế độ audio-only và cửa sổ đang hiện"""
+        if not (self.video_player and self.engine._has_video and self.engine._video_path):
+            return False
+        if self.audio_only:
+            return False
+        song = self.playlist.current_song
+        if song and song.audio_only:
+            return False
+        return self.root.state() not in ("iconic", "withdrawn")
+    
+    def _video_shown(self) -> bool:
+        return bool(self.video_player and self.video_player.is_open())
+    
+    def _open_video(self):
+        """Mở decoder tại vị trí clock hiện tại (poster hiển thị trong lúc chờ frame đầu)"""
+        path = self.engine._video_path
+        self._show_poster(path)
+        if self._sprite_path != path:
+            self._load_sprite_sheet(path)
+        self.video_player.open(path)
+        if self.engine.is_paused and self.video_player.is_playing:
+            self.video_player.pause()
+    
+    def _sync_video_visibility(self):
+        """Mở video khi cần hiển thị, đóng hẳn decoder khi ẩn (không decode video không ai xem)"""
+        if not self.video_player:
+            return
+        if self._video_wanted():
+            if not self.video_player.is_open() and (self.engine.is_playing or self.engine.is_paused):
+                self._open_video()
+        elif self.video_player.is_open():
+            self.video_player.stop()
+            self._draw_vinyl(self._vinyl_rotation)
+    
+    def _on_window_map(self, event):
+        """Cửa sổ thu nhỏ/hiện lại - chỉ xét sự kiện của chính cửa sổ chính"""
+        if event.widget is self.root:
+            self._sync_video_visibility()
+    
+    def _on_toggle_trim(self):
+        """Bật/tắt cắt im lặng đầu/cuối bài - áp dụng từ bài kế tiếp"""
+        self.engine.trim_silence = self.trim_var.get()
+        self._update_status(f"✂️ Trim silence: {'ON' if self.engine.trim_silence else 'OFF'}")
+        self._queue_upcoming()
+    
+    def _on_crossfade_change(self):
+        """Đổi độ dài crossfade - chuẩn bị lại vùng overlap cho bài kế tiếp"""
+        self.engine.crossfade = float(self.crossfade_var.get())
+        if self.engine.crossfade > 0:
+            self._update_status(f"🎚️ Crossfade: {self.engine.crossfade:g}s")
+        else:
+            self._update_status("🎚️ Crossfade: OFF")
+        self._queue_upcoming()
+    
+    def show_equalizer(self):
+        """Cửa sổ EQ 10 dải - kéo slider áp ngay lên phần chưa phát"""
+        eq = self.engine.equalizer
+        eq_window = tk.Toplevel(self.root)
+        eq_window.title("🎚️ Equalizer")
+        eq_window.geometry("560x340")
+        eq_window.configure(bg=Theme.BG_DARK)
+        
+        content = tk.Frame(eq_window, bg=Theme.BG_CARD, padx=15, pady=15)
+        content.pack(fill=tk.BOTH, expand=True, padx=15, pady=15)
+        
+        header = tk.Frame(content, bg=Theme.BG_CARD)
+        header.pack(fill=tk.X)
+        enabled_var = tk.BooleanVar(value=eq.enabled)
+        tk.Checkbutton(header, text="Enabled", variable=enabled_var,
+                      command=lambda: self.engine.set_eq_enabled(enabled_var.get()),
+                      bg=Theme.BG_CARD, fg=Theme.TEXT_PRIMARY, selectcolor=Theme.BG_DARK,
+                      activebackground=Theme.BG_CARD, font=("Segoe UI", 10)).pack(side=tk.LEFT)
+        
+        bands_frame = tk.Frame(content, bg=Theme.BG_CARD)
+        bands_frame.pack(fill=tk.BOTH, expand=True, pady=10)
+        scales = []
+        for i, freq in enumerate(EQ_BANDS):
+            column = tk.Frame(bands_frame, bg=Theme.BG_CARD)
+            column.pack(side=tk.LEFT, expand=True, fill=tk.Y)
+            scale = tk.Scale(column, from_=MAX_GAIN_DB, to=-MAX_GAIN_DB, resolution=0.5,
+                             orient=tk.VERTICAL, length=200, showvalue=False,
+                             bg=Theme.BG_CARD, fg=Theme.TEXT_PRIMARY, troughcolor=Theme.BG_DARK,
+                             highlightthickness=0, border=0,
+                             command=lambda value, band=i: self.engine.set_eq_gain(band, float(value)))
+            scale.set(eq.gains[i])
+            scale.pack()
+            label = f"{freq // 1000}k" if freq >= 1000 else str(freq)
+            tk.Label(column, text=label, font=("Segoe UI", 8),
+                    bg=Theme.BG_CARD, fg=Theme.TEXT_SECONDARY).pack()
+            scales.append(scale)
+        
+        footer = tk.Frame(content, bg=Theme.BG_CARD)
+        footer.pack(fill=tk.X)
+        cost_label = tk.Label(footer, text="", font=("Segoe UI", 9),
+                             bg=Theme.BG_CARD, fg=Theme.TEXT_SECONDARY)
+        cost_label.pack(side=tk.LEFT)
+        
+        def reset():
+            for scale in scales:
+                scale.set(0)  # command của Scale tự gọi set_eq_gain
+        
+        tk.Button(footer, text="Reset", command=reset,
+                 bg=Theme.BG_HOVER, fg=Theme.TEXT_PRIMARY,
+                 font=("Segoe UI", 10), padx=15, pady=3, border=0).pack(side=tk.RIGHT)
+        
+        def refresh_cost():
+            """Chi phí CPU: ms xử lý cho mỗi giây audio"""
+            if not eq_window.winfo_exists():
+                return
+            if self.engine.eq_bypassed:
+                # Bài quá dài để decode vào RAM - EQ không áp được, báo rõ thay vì im lặng
+                cost_label.config(text="⚠️ Bypassed: track too long for EQ", fg=Theme.WARNING)
+                eq_window.after(1000, refresh_cost)
+                return
+            cost_label.config(fg=Theme.TEXT_SECONDARY)
+            if eq.active:
+                cost_label.config(text=f"CPU: {eq.cost_per_second() * 1000:.1f} ms / s audio")
+            elif not eq.enabled:
+                cost_label.config(text="CPU: off")
+            else:
+                cost_label.config(text="CPU: flat (bypass)")
+            eq_window.after(1000, refresh_cost)
+        
+        refresh_cost()
+    
     def _on_close(self):
         """Xử lý đóng app"""
         self.running = False
+        self.prefill_job.cancel()
+        self.loudness_job.cancel()
+        self.proxy_job.cancel()
         self.engine.stop()
         
         # Dừng video player
         if self.video_player:
             self.video_player.stop()
+            if self.video_player.process is not None:
+                self.video_player.process.shutdown()
         
         # Lưu dữ liệu trước khi đóng
         self._save_all_data()
+        self.probe_store.save()
         
-        # Dọn dẹp thư mục temp
+        # Dừng các job convert còn lại rồi dọn dẹp thư mục temp
+        self.engine.shutdown()
+        self.waveforms.shutdown()
+        self.thumbnails.shutdown()
+        self.sprite_sheets.shutdown()
         temp_dir = self.engine._temp_dir
         if os.path.exists(temp_dir):
             try:
@@ -0,0 +1,99 @@
+
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from audio_decode import NUMPY_AVAILABLE, SAMPLE_RATE, CHANNELS, decode_pcm
+from media_probe import file_fingerprint
+
+
+class PCMCache:
+    """
+    Cache PCM đã decode (NumPy int16, (frames, channels)) của các bài vừa phát
+
+    - Giới hạn theo tổng số byte, bỏ bài ít dùng nhất trước (LRU)
+    - Khóa theo (path, size, mtime): file đổi thì entry cũ không còn khớp
+    - Phát lại / repeat-one / tua lùi trên bài đã cache không cần đĩa hay FFmpeg
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._loading: dict = {}   # key -> Event, set khi decode xong
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def get(self, path: str) -> Optional['np.ndarray']:
+        """PCM của file nếu có trong cache (đánh dấu vừa dùng)"""
+        key = file_fingerprint(path)
+        if key is None:
+            return None
+        with self._lock:
+            pcm = self._entries.get(key)
+            if pcm is not None:
+                self._entries.move_to_end(key)
+            return pcm
+
+    def __contains__(self, path: str) -> bool:
+        key = file_fingerprint(path)
+        with self._lock:
+            return key is not None and key in self._entries
+
+    def put(self, path: str, pcm) -> bool:
+        """Thêm PCM - False nếu một mình nó đã vượt giới hạn"""
+        key = file_fingerprint(path)
+        if key is None or pcm is None or pcm.nbytes > self.max_bytes:
+            return False
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old.nbytes
+            self._entries[key] = pcm
+            self._bytes += pcm.nbytes
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+        return True
+
+    def fits(self, duration: float) -> bool:
+        """Bài dài duration giây có đáng cache không (không chiếm quá nửa dung lượng)"""
+        if duration <= 0:
+            return False
+        estimated = duration * SAMPLE_RATE * CHANNELS * 2
+        return estimated <= self.max_bytes / 2
+
+    def load(self, path: str, decode_path: Optional[str] = None) -> Optional['np.ndarray']:
+        """Decode toàn bộ file (decode_path nếu có, vd. WAV đã convert) rồi cache - chạy trên thread nền"""
+        if not NUMPY_AVAILABLE:
+            return None
+        pcm = self.get(path)
+        if pcm is not None:
+            return pcm
+        key = file_fingerprint(path)
+        if key is None:
+            return None
+        with self._lock:
+            done = self._loading.get(key)
+            if done is None:
+                self._loading[key] = threading.Event()
+        if done is not None:
+            # Thread khác đang decode cùng file - chờ rồi lấy kết quả từ cache
+            done.wait()
+            return self.get(path)
+        try:
+            pcm = decode_pcm(decode_path or path)
+            if pcm is not None and len(pcm) and self.put(path, pcm):
+                return pcm
+            return None
+        finally:
+            with self._lock:
+                self._loading.pop(key).set()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
@@ -0,0 +1,178 @@
+
+import threading
+import time
+from typing import Callable, Optional
+
+from audio_decode import SAMPLE_RATE
+
+try:
+    import pygame
+    PYGAME_AVAILABLE = True
+except ImportError:
+    PYGAME_AVAILABLE = False
+
+
+class PCMStreamer:
+    """
+    Phát PCM trong RAM qua một pygame Channel, từng chunk nhỏ (Channel.queue)
+
+    - Bắt đầu/seek tức thì: chỉ cần cắt mảng NumPy, không đọc đĩa
+    - queue(pcm): bài kế tiếp nối liền sau chunk cuối, on_switch() được gọi
+      (từ thread feeder) khi chunk đầu của bài mới bắt đầu phát
+    - process_chunk(pcm, start, end): hook trả về chunk [start, end) đã xử lý (EQ)
+    """
+
+    CHUNK_SECONDS = 0.2
+
+    def __init__(self, channel_factory: Callable[[], object], sample_rate: int = SAMPLE_RATE):
+        self._get_channel = channel_factory
+        self.sample_rate = sample_rate
+        self.chunk_frames = int(sample_rate * self.CHUNK_SECONDS)
+        self.on_switch: Optional[Callable[[], None]] = None
+        self.process_chunk: Optional[Callable] = None
+
+        self._cond = threading.Condition()
+        self._generation = 0
+        self._pcm = None
+        self._next_pcm = None
+        self._cursor = 0            # Frame kế tiếp sẽ được đưa vào Channel
+        self._switch_armed = False  # Chunk đầu của bài kế tiếp đang nằm trong hàng đợi
+        self._paused = False
+        self._active = False
+        self._channel = None
+
+    @property
+    def active(self) -> bool:
+        """Đang phát (hoặc pause) PCM từ RAM"""
+        return self._active
+
+    @property
+    def busy(self) -> bool:
+        """Còn âm thanh đang phát/chờ phát"""
+        return self._active and not self._paused
+
+    def start(self, pcm, position: float = 0.0) -> None:
+        """Phát pcm từ position (giây)"""
+        with self._cond:
+            self._generation += 1
+            generation = self._generation
+            self._pcm = pcm
+            self._next_pcm = None
+            self._switch_armed = False
+            self._cursor = max(0, min(len(pcm), int(position * self.sample_rate)))
+            self._paused = False
+            self._active = True
+        self._channel = self._get_channel()
+        self._channel.stop()
+        threading.Thread(target=self._feed_loop, args=(generation,),
+                         daemon=True, name="pcm-stream").start()
+
+    def queue(self, pcm) -> None:
+        """Bài kế tiếp - phát liền sau khi hết pcm hiện tại"""
+        with self._cond:
+            self._next_pcm = pcm
+
+    def clear_queue(self) -> None:
+        with self._cond:
+            self._next_pcm = None
+
+    def pause(self) -> None:
+        with self._cond:
+            self._paused = True
+        if self._channel is not None:
+            self._channel.pause()
+
+    def resume(self) -> None:
+        if self._channel is not None:
+            self._channel.unpause()
+        with self._cond:
+            self._paused = False
+            self._cond.notify_all()
+
+    def stop(self) -> None:
+        with self._cond:
+            self._generation += 1
+            self._active = False
+            self._paused = False
+            self._pcm = None
+            self._next_pcm = None
+            self._cond.notify_all()
+        if self._channel is not None:
+            self._channel.stop()
+
+    def set_volume(self, volume: float) -> None:
+        if self._channel is not None:
+            self._channel.set_volume(volume)
+
+    def unplayed(self) -> tuple:
+        """(pcm, frame đầu tiên chưa đưa vào Channel)"""
+        with self._cond:
+            return self._pcm, self._cursor
+
+    def _next_sound(self, generation: int):
+        """Lấy chunk tiếp theo (chuyển sang bài queue khi hết bài) - None nếu hết hoặc đã start/stop lại"""
+        with self._cond:
+            if generation != self._generation or self._pcm is None:
+                return None
+            if self._cursor >= len(self._pcm):
+                if self._next_pcm is None:
+                    return None
+                self._pcm = self._next_pcm
+                self._next_pcm = None
+                self._cursor = 0
+                self._switch_armed = True
+            pcm = self._pcm
+            start = self._cursor
+            end = min(start + self.chunk_frames, len(pcm))
+            self._cursor = end
+        if self.process_chunk is not None:
+            chunk = self.process_chunk(pcm, start, end)
+        else:
+            chunk = pcm[start:end]
+        return pygame.mixer.Sound(buffer=chunk.tobytes())
+
+    def _feed_loop(self, generation: int) -> None:
+        """Giữ luôn một chunk chờ sẵn trong Channel"""
+        poll = self.CHUNK_SECONDS / 4
+        channel = self._channel
+        first = self._next_sound(generation)
+        if first is None:
+            with self._cond:
+                if generation == self._generation:
+                    self._active = False
+            return
+        channel.play(first)
+        with self._cond:
+            # Chunk đầu đã phát - lần chuyển bài đầu tiên chỉ tính từ chunk queue sau đó
+            if generation == self._generation:
+                self._switch_armed = False
+        finished = False
+
+        while True:
+            with self._cond:
+                if generation != self._generation:
+                    return
+                if self._paused:
+                    self._cond.wait()
+                    continue
+                # Hàng đợi trống: chunk đã queue trước đó vừa bắt đầu phát
+                idle = channel.get_queue() is None
+                switched = idle and self._switch_armed
+                if switched:
+                    self._switch_armed = False
+
+            if idle:
+                if switched and self.on_switch is not None:
+                    self.on_switch()
+                if not finished:
+                    sound = self._next_sound(generation)
+                    if sound is None:
+                        finished = True
+                    else:
+                        channel.queue(sound)
+                if finished and not channel.get_busy():
+                    with self._cond:
+                        if generation == self._generation:
+                            self._active = False
+                    return
+            time.sleep(poll)
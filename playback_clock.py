@@ -0,0 +1,126 @@
+
+import threading
+import time
+from typing import Optional
+
+
+class PlaybackClock:
+    """
+    Đồng hồ phát nhạc duy nhất - audio engine, UI loop và VideoPlayer cùng đọc
+
+    - Nội suy bằng time.monotonic (không nhảy khi đổi giờ hệ thống)
+    - Định kỳ hiệu chỉnh theo bộ đếm mẫu của mixer (pygame.mixer.music.get_pos),
+      đã trừ độ trễ buffer đầu ra
+    - Lệch nhỏ được bù dần (slew) để vị trí không giật, lệch lớn thì nhảy thẳng
+    - Thread-safe: thread decode video đọc được trực tiếp
+    """
+
+    SYNC_INTERVAL = 0.5     # Giây giữa hai lần hiệu chỉnh
+    SNAP_THRESHOLD = 0.25   # Lệch lớn hơn (giây) -> nhảy thẳng đến vị trí mixer
+    SLEW_FACTOR = 0.2       # Phần lệch được bù mỗi lần hiệu chỉnh
+
+    def __init__(self, latency: float = 0.0, quantum: float = 0.0):
+        self.latency = latency    # Độ trễ từ lúc mix đến lúc nghe thấy (giây)
+        self.quantum = quantum    # Bước nhảy của bộ đếm mixer (một buffer)
+        self.duration = 0.0
+        self.drift = 0.0          # Độ lệch đo được ở lần hiệu chỉnh gần nhất
+        self._lock = threading.Lock()
+        self._anchor_pos = 0.0                  # Vị trí (giây) tại _anchor_time
+        self._anchor_time: Optional[float] = None  # None = đang dừng/pause
+        self._segment_start = 0.0               # Vị trí khi mixer bắt đầu play() gần nhất
+        self._last_sync = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._anchor_time is not None
+
+    @property
+    def segment_start(self) -> float:
+        """Vị trí track khi mixer bắt đầu đếm get_pos() từ 0"""
+        return self._segment_start
+
+    def start(self, position: float = 0.0, segment_start: Optional[float] = None) -> None:
+        """Mixer vừa play() từ position (segment_start khác position khi track
+        đã chạy được một đoạn, ví dụ chuyển bài gapless phát hiện hơi muộn)"""
+        with self._lock:
+            now = time.monotonic()
+            self._segment_start = position if segment_start is None else segment_start
+            self._anchor_pos = position
+            self._anchor_time = now
+            self._last_sync = now
+            self.drift = 0.0
+
+    def pause(self) -> None:
+        with self._lock:
+            if self._anchor_time is not None:
+                self._anchor_pos = self._position_locked(time.monotonic())
+                self._anchor_time = None
+
+    def resume(self) -> None:
+        with self._lock:
+            if self._anchor_time is None:
+                self._anchor_time = time.monotonic()
+                self._last_sync = self._anchor_time
+
+    def seek(self, position: float) -> None:
+        """Mixer vừa được định vị lại (play(start=position)) - giữ trạng thái chạy/pause"""
+        with self._lock:
+            now = time.monotonic()
+            self._segment_start = position
+            self._anchor_pos = position
+            if self._anchor_time is not None:
+                self._anchor_time = now
+            self._last_sync = now
+
+    def stop(self) -> None:
+        with self._lock:
+            self._anchor_pos = 0.0
+            self._anchor_time = None
+            self._segment_start = 0.0
+            self.drift = 0.0
+
+    def position(self) -> float:
+        """Vị trí hiện tại (giây), giới hạn trong [0, duration]"""
+        with self._lock:
+            pos = self._position_locked(time.monotonic())
+        if self.duration > 0:
+            pos = min(pos, self.duration)
+        return max(0.0, pos)
+
+    def remaining(self) -> float:
+        """Thời gian còn lại đến hết bài (giây) - 0 nếu chưa biết duration"""
+        if self.duration <= 0:
+            return 0.0
+        return max(0.0, self.duration - self.position())
+
+    def correct(self, mixer_ms: int, force: bool = False) -> None:
+        """Hiệu chỉnh theo mixer - mixer_ms là số ms mixer đã phát kể từ play() gần nhất"""
+        if mixer_ms is None or mixer_ms < 0:
+            return
+        with self._lock:
+            if self._anchor_time is None:
+                return
+            now = time.monotonic()
+            if not force and now - self._last_sync < self.SYNC_INTERVAL:
+                return
+            self._last_sync = now
+
+            # Bộ đếm nhảy theo từng buffer: lấy điểm giữa buffer, trừ độ trễ đầu ra
+            mixed = mixer_ms / 1000.0
+            if mixed <= 0:
+                return  # Mixer chưa mix buffer đầu tiên
+            reference = self._segment_start + mixed + self.quantum / 2 - self.latency
+            estimate = self._position_locked(now)
+            error = reference - estimate
+            self.drift = error
+
+            if abs(error) > self.SNAP_THRESHOLD:
+                self._anchor_pos = reference
+            else:
+                self._anchor_pos = estimate + error * self.SLEW_FACTOR
+            self._anchor_time = now
+
+    def _position_locked(self, now: float) -> float:
+        if self._anchor_time is None:
+            return self._anchor_pos
+        return self._anchor_pos + (now - self._anchor_time)
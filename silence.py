@@ -0,0 +1,138 @@
+
+from typing import Optional
+
+from audio_decode import NUMPY_AVAILABLE, SAMPLE_RATE, iter_pcm_blocks
+from media_probe import ProbeStore
+
+if NUMPY_AVAILABLE:
+    import numpy as np
+
+
+WINDOW = SAMPLE_RATE // 20        # Cửa sổ RMS 50ms
+THRESHOLD_DB = -50.0              # dBFS - dưới mức này coi là im lặng
+PAD = 0.1                         # Giữ lại 100ms trước/sau phần có tiếng (không cắt mất attack/reverb)
+MIN_TRIM = 0.5                    # Đoạn im lặng ngắn hơn thì giữ nguyên
+
+
+class SilenceScanner:
+    """
+    Tìm cửa sổ có tiếng đầu tiên/cuối cùng - nạp PCM từng block, không giữ cả bài
+
+    RMS theo cửa sổ 50ms được tính vectorized (reshape + mean) cho cả block.
+    """
+
+    def __init__(self):
+        self._threshold = (10 ** (THRESHOLD_DB / 20.0) * 32768.0) ** 2
+        self._leftover = None
+        self._windows = 0
+        self.frames = 0
+        self.first: Optional[int] = None   # Chỉ số cửa sổ có tiếng đầu tiên
+        self.last: Optional[int] = None
+
+    def feed(self, block) -> None:
+        self.frames += len(block)
+        if self._leftover is not None and len(self._leftover):
+            block = np.concatenate((self._leftover, block))
+        usable = len(block) - len(block) % WINDOW
+        self._leftover = block[usable:]
+        if not usable:
+            return
+        samples = block[:usable].astype(np.float32).reshape(-1, WINDOW * block.shape[1])
+        loud = np.flatnonzero(np.mean(samples * samples, axis=1) > self._threshold)
+        if len(loud):
+            if self.first is None:
+                self.first = self._windows + int(loud[0])
+            self.last = self._windows + int(loud[-1])
+        self._windows += len(samples)
+
+    def result(self) -> dict:
+        """{'start', 'end'} (giây) - end = 0 nghĩa là không cắt đuôi"""
+        total = self.frames / SAMPLE_RATE
+        if self.first is None:
+            return {'start': 0.0, 'end': 0.0}  # Cả bài im lặng - không cắt gì
+        start = max(0.0, self.first * WINDOW / SAMPLE_RATE - PAD)
+        end = min(total, (self.last + 1) * WINDOW / SAMPLE_RATE + PAD)
+        return {
+            'start': round(start, 3) if start >= MIN_TRIM else 0.0,
+            'end': round(end, 3) if total - end >= MIN_TRIM else 0.0,
+        }
+
+
+def detect_silence(path: str) -> Optional[dict]:
+    """Điểm cắt im lặng đầu/cuối bài trong MỘT lượt decode streaming"""
+    if not NUMPY_AVAILABLE:
+        return None
+    scanner = SilenceScanner()
+    for block in iter_pcm_blocks(path, SAMPLE_RATE * 5):
+        scanner.feed(block)
+    if not scanner.frames:
+        return None
+    return scanner.result()
+
+
+def scan_pcm(pcm) -> dict:
+    """Như detect_silence nhưng trên PCM đã có trong RAM (xử lý từng đoạn 10s)"""
+    scanner = SilenceScanner()
+    step = SAMPLE_RATE * 10
+    for start in range(0, len(pcm), step):
+        scanner.feed(pcm[start:start + step])
+    return scanner.result()
+
+
+def analyze_track(loudness, silence: 'SilenceAnalyzer', path: str) -> Optional[dict]:
+    """
+    Loudness + điểm cắt im lặng trong MỘT lượt decode (worker của LibraryJob)
+
+    loudness: LoudnessAnalyzer. Dùng chung cho MusicEngine và RemoteEngine.
+    Trả về kết quả loudness.
+    """
+    scanner = None if silence.is_known(path) else SilenceScanner()
+    result = loudness.analyze(path, scanner.feed if scanner else None)
+    if scanner is not None:
+        if scanner.frames:
+            silence.put(path, scanner.result())
+        else:
+            silence.analyze(path)  # Loudness đã có sẵn - decode riêng cho silence
+    return result
+
+
+class SilenceAnalyzer:
+    """
+    Điểm cắt im lặng cho thư viện, lưu vào ProbeStore (field 'trim')
+
+    Giống LoudnessAnalyzer: phân tích một lần mỗi file, file đổi thì tự tính lại.
+    """
+
+    def __init__(self, store: Optional[ProbeStore] = None):
+        self.store = store
+
+    def analyze(self, path: str) -> Optional[dict]:
+        if self.store is not None:
+            stored = self.store.get(path, 'trim')
+            if stored is not None:
+                return stored
+        result = detect_silence(path)
+        if result is not None:
+            self.put(path, result)
+        return result
+
+    def analyze_pcm(self, path: str, pcm) -> None:
+        """Bài vừa decode vào RAM - tính luôn từ PCM, không decode lại"""
+        if NUMPY_AVAILABLE and pcm is not None and len(pcm) and not self.is_known(path):
+            self.put(path, scan_pcm(pcm))
+
+    def put(self, path: str, result: dict) -> None:
+        if self.store is not None:
+            self.store.put(path, 'trim', result)
+
+    def is_known(self, path: str) -> bool:
+        return self.store is not None and self.store.get(path, 'trim') is not None
+
+    def trim_for(self, path: Optional[str]) -> tuple:
+        """(start, end) giây - (0.0, 0.0) nếu chưa phân tích hoặc không cần cắt"""
+        if not path or self.store is None:
+            return 0.0, 0.0
+        stored = self.store.get(path, 'trim')
+        if not stored:
+            return 0.0, 0.0
+        return float(stored.get('start', 0.0)), float(stored.get('end', 0.0))
@@ -0,0 +1,95 @@
+
+import time
+from typing import Optional
+
+from audio_decode import NUMPY_AVAILABLE, SAMPLE_RATE
+
+if NUMPY_AVAILABLE:
+    import numpy as np
+
+
+class SpectrumAnalyzer:
+    """
+    Năng lượng theo dải tần (thang log) + mức âm lượng tại vị trí đang phát
+
+    - FFT có cửa sổ Hann trên PCM đã decode (PCMCache) quanh vị trí clock
+    - Dải tần, cửa sổ và chỉ số bin được tính sẵn theo từng kích thước FFT
+    - Giữ trong ngân sách CPU mỗi frame: vượt thì giảm kích thước FFT,
+      dư nhiều thì tăng lại
+    """
+
+    MIN_FREQ = 40.0
+    MAX_FREQ = 16000.0
+    FLOOR_DB = -60.0
+    FFT_SIZES = (256, 512, 1024, 2048)
+    FALL_RATE = 0.08   # Mức giảm tối đa mỗi frame (thanh rơi mượt)
+
+    def __init__(self, bands: int = 32, budget: float = 0.004):
+        self.bands = bands
+        self.budget = budget        # Giây CPU tối đa cho phân tích mỗi frame
+        self.last_cost = 0.0
+        self._size_index = len(self.FFT_SIZES) - 1
+        self._plans: dict = {}
+        self._levels = np.zeros(bands, dtype=np.float32) if NUMPY_AVAILABLE else None
+        self._level = 0.0
+
+    def _plan(self, size: int):
+        """Cửa sổ Hann + biên các dải cho một kích thước FFT (tính một lần)"""
+        plan = self._plans.get(size)
+        if plan is None:
+            window = np.hanning(size).astype(np.float32)
+            freqs = np.fft.rfftfreq(size, 1.0 / SAMPLE_RATE)
+            edges = np.geomspace(self.MIN_FREQ, self.MAX_FREQ, self.bands + 1)
+            idx = np.searchsorted(freqs, edges)
+            # Mỗi dải có ít nhất một bin
+            idx = np.maximum(idx, np.arange(len(idx)) + 1)
+            idx = np.minimum(idx, len(freqs) - 1)
+            lo, hi = idx[:-1], np.maximum(idx[1:], idx[:-1] + 1)
+            norm = float(np.sum(window)) / 2
+            plan = (window, lo, hi, norm)
+            self._plans[size] = plan
+        return plan
+
+    def analyze(self, pcm, position: float) -> Optional[tuple]:
+        """(levels[bands] trong [0, 1], level tổng trong [0, 1]) tại position giây"""
+        if not NUMPY_AVAILABLE or pcm is None or not len(pcm):
+            return None
+        started = time.perf_counter()
+
+        size = self.FFT_SIZES[self._size_index]
+        window, lo, hi, norm = self._plan(size)
+        center = int(position * SAMPLE_RATE)
+        start = max(0, min(center - size // 2, len(pcm) - size))
+        block = pcm[start:start + size]
+        if len(block) < size:
+            return None
+
+        mono = block.mean(axis=1, dtype=np.float32) / 32768.0
+        spectrum = np.abs(np.fft.rfft(mono * window)) / norm
+        # Năng lượng trung bình mỗi dải qua cumsum (không lặp Python)
+        power = np.concatenate(([0.0], np.cumsum(spectrum * spectrum)))
+        band_power = (power[hi] - power[lo]) / (hi - lo)
+        db = 10 * np.log10(np.maximum(band_power, 1e-12))
+        target = np.clip(1.0 - db / self.FLOOR_DB, 0.0, 1.0).astype(np.float32)
+        self._levels = np.maximum(target, self._levels - self.FALL_RATE)
+
+        rms = float(np.sqrt(np.mean(mono * mono)))
+        level_db = 20 * np.log10(max(rms, 1e-6))
+        self._level = max(min(1.0, max(0.0, 1.0 - level_db / self.FLOOR_DB)),
+                          self._level - self.FALL_RATE)
+
+        self._adapt(time.perf_counter() - started)
+        return self._levels, self._level
+
+    def _adapt(self, cost: float) -> None:
+        """Điều chỉnh kích thước FFT theo thời gian CPU đo được"""
+        self.last_cost = cost
+        if cost > self.budget and self._size_index > 0:
+            self._size_index -= 1
+        elif cost < self.budget / 4 and self._size_index < len(self.FFT_SIZES) - 1:
+            self._size_index += 1
+
+    def reset(self) -> None:
+        if NUMPY_AVAILABLE:
+            self._levels = np.zeros(self.bands, dtype=np.float32)
+        self._level = 0.0
@@ -0,0 +1,125 @@
+import os
+from typing import Callable, Optional
+
+from file_cache import FileCache
+from media_probe import MediaProbe
+
+try:
+    from PIL import Image, ImageTk
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+
+SPRITE_COUNT = 100       # Số frame rải đều trên toàn bộ video
+SPRITE_COLUMNS = 10      # Lưới 10x10 trong một ảnh JPEG
+TILE_WIDTH = 160         # Chiều rộng mỗi frame preview
+SPRITE_QUALITY = 5       # -q:v của mjpeg
+
+
+class SpriteSheet:
+    """
+    Sprite sheet đã decode trong RAM - preview vị trí bất kỳ chỉ là crop + PhotoImage
+
+    Tile đã tạo được giữ lại nên rê chuột qua lại không tốn gì thêm.
+    Chỉ dùng trên Tk thread.
+    """
+
+    def __init__(self, image, duration: float, count: int = SPRITE_COUNT,
+                 columns: int = SPRITE_COLUMNS):
+        self.image = image
+        self.duration = duration
+        self.count = count
+        self.columns = columns
+        rows = (count + columns - 1) // columns
+        self.tile_size = (image.width // columns, image.height // rows)
+        self._tiles: dict = {}
+
+    def index_at(self, position: float) -> int:
+        if self.duration <= 0:
+            return 0
+        return max(0, min(self.count - 1, int(position / self.duration * self.count)))
+
+    def tile(self, position: float):
+        """PhotoImage của frame gần position nhất"""
+        index = self.index_at(position)
+        photo = self._tiles.get(index)
+        if photo is None:
+            width, height = self.tile_size
+            x = (index % self.columns) * width
+            y = (index // self.columns) * height
+            photo = ImageTk.PhotoImage(self.image.crop((x, y, x + width, y + height)))
+            self._tiles[index] = photo
+        return photo
+
+
+class SpriteSheetCache(FileCache):
+    """
+    Sprite sheet preview khi tua video: SPRITE_COUNT frame nhỏ rải đều, ghép lưới
+
+    - Tạo trong MỘT lượt ffmpeg streaming (fps=N/duration, scale, tile) trên worker nền
+    - Có proxy GOP ngắn thì đọc proxy và chỉ decode keyframe (-skip_frame nokey)
+    - Lưu JPEG trên đĩa theo hash (path, size, mtime); giữ vài sheet đã decode trong RAM
+    """
+
+    SUFFIX = '.jpg'
+    LABEL = "Sprite sheet"
+    TIMEOUT = 600
+
+    def __init__(self, cache_dir: str, call_on_main: Callable[[Callable], None],
+                 probe: Optional[MediaProbe] = None, proxies=None, max_sheets: int = 4):
+        super().__init__(cache_dir, call_on_main, max_items=max_sheets,
+                         thread_name="sprite-sheet")
+        self.probe = probe or MediaProbe()
+        self.proxies = proxies  # ProxyCache (tùy chọn)
+
+    def get(self, path: str) -> Optional[SpriteSheet]:
+        """Sheet đã decode trong RAM - None nếu chưa (gọi trên Tk thread)"""
+        cache_path = self.cache_path(path)
+        return self.recall(cache_path) if cache_path is not None else None
+
+    def request(self, path: str, callback: Callable[[str, SpriteSheet], None]) -> None:
+        """Gọi callback(path, sheet) trên Tk thread - ngay nếu đã có, không thì sau khi tạo ở nền"""
+        cache_path = self.cache_path(path)
+        if not PIL_AVAILABLE or cache_path is None:
+            return
+        # Khóa theo (path, size, mtime) như file trên đĩa - file đổi thì không dùng sheet cũ
+        self._request(path, callback, key=cache_path)
+
+    def _duration(self, path: str) -> float:
+        info = self.probe.probe(path)
+        return info.duration if info is not None else 0.0
+
+    def command(self, ffmpeg_path: str, path: str, output_path: str) -> Optional[list]:
+        duration = self._duration(path)
+        if duration <= 0:
+            return None
+        source = self.proxies.get(path) if self.proxies is not None else None
+        rows = (SPRITE_COUNT + SPRITE_COLUMNS - 1) // SPRITE_COLUMNS
+        cmd = [ffmpeg_path, "-v", "error", "-threads", "1"]
+        if source is not None:
+            # Proxy có keyframe mỗi 0.5s - đủ dày để chỉ decode keyframe
+            cmd += ["-skip_frame", "nokey"]
+        cmd += [
+            "-i", source or path,
+            "-map", "0:v:0",
+            "-an", "-sn",
+            "-vf", (f"fps={SPRITE_COUNT / duration:.6f},"
+                    f"scale={TILE_WIDTH}:-2,"
+                    f"tile={SPRITE_COLUMNS}x{rows}"),
+            "-frames:v", "1",
+            "-q:v", str(SPRITE_QUALITY),
+            "-f", "mjpeg",
+            "-y",
+            output_path
+        ]
+        print(f"🖼️ Creating seek preview: {os.path.basename(path)}")
+        return cmd
+
+    def load(self, path: str, sheet_path: str, key) -> tuple:
+        with Image.open(sheet_path) as sheet:
+            return sheet.convert('RGB'), self._duration(path)
+
+    def deliver(self, key, loaded) -> SpriteSheet:
+        image, duration = loaded
+        return SpriteSheet(image, duration)
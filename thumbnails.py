@@ -0,0 +1,75 @@
+from typing import Callable, Optional
+
+from file_cache import FileCache
+from media_probe import MediaProbe
+
+try:
+    from PIL import Image, ImageTk
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+
+POSTER_WIDTH = 480       # Ảnh lưu trên đĩa - đủ cho vinyl canvas, mọi cỡ nhỏ hơn resize từ đây
+POSTER_QUALITY = 5       # -q:v của mjpeg (2 = tốt nhất, 31 = tệ nhất)
+POSTER_POSITION = 0.1    # Lấy frame ở 10% thời lượng (bỏ intro/màn hình đen)
+POSTER_MAX_OFFSET = 30.0  # ...nhưng không quá 30s với video dài
+
+
+class ThumbnailCache(FileCache):
+    """
+    Poster/thumbnail cho video: một frame đại diện mỗi file
+
+    - Trích frame bằng MỘT lần seek + decode (ffmpeg -ss trước -i, -frames:v 1)
+    - Lưu JPEG nén trên đĩa, tên theo hash (path, size, mtime) - file đổi thì trích lại
+    - Trích + resize chạy trên worker nền; PhotoImage chỉ tạo trên Tk thread
+      (qua call_on_main) và giữ trong LRU theo (path, kích thước)
+    """
+
+    SUFFIX = '.jpg'
+    LABEL = "Thumbnail"
+    TIMEOUT = 30
+
+    def __init__(self, cache_dir: str, call_on_main: Callable[[Callable], None],
+                 probe: Optional[MediaProbe] = None, max_images: int = 128,
+                 max_workers: int = 2):
+        super().__init__(cache_dir, call_on_main, max_items=max_images,
+                         max_workers=max_workers, thread_name="thumbnail")
+        self.probe = probe or MediaProbe()
+
+    def get(self, path: str, size: tuple):
+        """PhotoImage đã có trong RAM - None nếu chưa (gọi trên Tk thread)"""
+        return self.recall((path, size))
+
+    def request(self, path: str, size: tuple,
+                callback: Callable[[str, object], None]) -> None:
+        """Gọi callback(path, photo) trên Tk thread - ngay nếu đã có, không thì sau khi trích ở nền"""
+        if not PIL_AVAILABLE:
+            return
+        self._request(path, callback, key=(path, size))
+
+    def command(self, ffmpeg_path: str, path: str, output_path: str) -> list:
+        info = self.probe.probe(path)
+        duration = info.duration if info is not None else 0.0
+        offset = min(duration * POSTER_POSITION, POSTER_MAX_OFFSET)
+        return [
+            ffmpeg_path,
+            "-v", "error",
+            "-ss", f"{offset:.3f}",          # Seek trên input: nhảy tới keyframe, không decode đoạn trước
+            "-i", path,
+            "-map", "0:v:0",
+            "-frames:v", "1",
+            "-vf", f"scale={POSTER_WIDTH}:-2",
+            "-q:v", str(POSTER_QUALITY),
+            "-f", "mjpeg",
+            "-y",
+            output_path
+        ]
+
+    def load(self, path: str, poster_path: str, key):
+        with Image.open(poster_path) as poster:
+            return poster.convert('RGB').resize(key[1], Image.BILINEAR)
+
+    def deliver(self, key, image):
+        """Tk thread: PhotoImage chỉ tạo ở đây"""
+        return ImageTk.PhotoImage(image)
@@ -0,0 +1,182 @@
+
+import os
+import hashlib
+import itertools
+import queue
+import shutil
+import subprocess
+import threading
+from concurrent.futures import Future
+from typing import Optional
+
+from media_probe import file_fingerprint
+
+
+# Độ ưu tiên - số nhỏ chạy trước
+PRIORITY_PLAY_NOW = 0      # Bài user vừa bấm phát
+PRIORITY_PREFETCH = 5      # Bài kế tiếp trong playlist
+PRIORITY_BACKGROUND = 10   # Làm ấm cache khi import
+
+
+class TranscodePool:
+    """
+    Worker pool convert audio sang WAV bằng FFmpeg
+
+    - Nhiều job chạy song song (max_workers), mỗi job dùng threads_per_job thread
+    - Cùng một file chỉ convert một lần: các caller dùng chung một Future
+    - Hàng đợi ưu tiên: "play now" chen lên trước các job nền
+    - Ghi ra file .part rồi os.replace để caller không bao giờ đọc file dở
+    """
+
+    def __init__(self, output_dir: str, max_workers: Optional[int] = None,
+                 threads_per_job: int = 2):
+        self.output_dir = output_dir
+        cpu = os.cpu_count() or 2
+        self.max_workers = max_workers or max(1, min(4, cpu // 2))
+        self.threads_per_job = max(1, threads_per_job)
+
+        self._queue: queue.PriorityQueue = queue.PriorityQueue()
+        self._inflight: dict[str, Future] = {}
+        self._priorities: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._counter = itertools.count()
+        self._workers: list[threading.Thread] = []
+        self._shutdown = False
+
+    def output_path(self, path: str) -> str:
+        """Đường dẫn WAV cho file nguồn - hash theo (path, size, mtime): file đổi thì convert lại"""
+        stem = os.path.splitext(os.path.basename(path))[0]
+        key = file_fingerprint(path) or os.path.abspath(path)
+        digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()[:8]
+        return os.path.join(self.output_dir, f"{stem}_{digest}.wav")
+
+    def submit(self, path: str, priority: int = PRIORITY_BACKGROUND) -> Future:
+        """Đưa file vào hàng đợi convert - trả về Future(str | None)"""
+        key = os.path.abspath(path)
+        out_path = self.output_path(path)
+
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                # Đã có job - nâng ưu tiên nếu caller mới gấp hơn
+                if priority < self._priorities.get(key, priority) and not future.running():
+                    self._priorities[key] = priority
+                    self._queue.put((priority, next(self._counter), key))
+                return future
+
+            future = Future()
+            if os.path.exists(out_path):
+                future.set_result(out_path)
+                return future
+
+            self._inflight[key] = future
+            self._priorities[key] = priority
+            self._queue.put((priority, next(self._counter), key))
+            self._ensure_workers()
+        return future
+
+    def convert(self, path: str, priority: int = PRIORITY_PLAY_NOW,
+                timeout: Optional[float] = 300) -> Optional[str]:
+        """Convert và chờ kết quả"""
+        try:
+            return self.submit(path, priority).result(timeout=timeout)
+        except Exception as e:
+            print(f" Convert error: {e}")
+            return None
+
+    def shutdown(self) -> None:
+        """Dừng workers, hủy các job chưa chạy"""
+        with self._lock:
+            self._shutdown = True
+            for future in self._inflight.values():
+                future.cancel()
+            self._inflight.clear()
+        for _ in self._workers:
+            self._queue.put((-1, next(self._counter), None))
+
+    def _ensure_workers(self):
+        # Gọi khi đang giữ _lock
+        self._workers = [w for w in self._workers if w.is_alive()]
+        while len(self._workers) < self.max_workers:
+            worker = threading.Thread(target=self._worker_loop, daemon=True,
+                                      name=f"transcode-{len(self._workers)}")
+            worker.start()
+            self._workers.append(worker)
+
+    def _worker_loop(self):
+        while True:
+            _, _, key = self._queue.get()
+            if key is None or self._shutdown:
+                return
+
+            with self._lock:
+                future = self._inflight.get(key)
+                # Entry cũ sau khi nâng ưu tiên, hoặc worker khác đã nhận
+                if future is None or future.running() or future.done():
+                    continue
+                if not future.set_running_or_notify_cancel():
+                    self._inflight.pop(key, None)
+                    continue
+
+            result = None
+            try:
+                result = self._transcode(key, self.output_path(key))
+            finally:
+                with self._lock:
+                    self._inflight.pop(key, None)
+                    self._priorities.pop(key, None)
+                future.set_result(result)
+
+    def _transcode(self, path: str, out_path: str) -> Optional[str]:
+        """Chạy FFmpeg (fallback pydub) - trả về path WAV hoặc None"""
+        filename = os.path.basename(path)
+        part_path = out_path + '.part'
+        print(f"Converting {filename}...")
+
+        ffmpeg_path = shutil.which("ffmpeg")
+        if ffmpeg_path:
+            cmd = [
+                ffmpeg_path,
+                "-v", "error",
+                "-threads", str(self.threads_per_job),
+                "-i", path,
+                "-vn",                     # Bỏ video stream - không decode video
+                "-acodec", "pcm_s16le",    # PCM 16-bit
+                "-ar", "44100",            # Sample rate
+                "-ac", "2",                # Stereo
+                "-f", "wav",
+                "-y",                      # Overwrite output
+                part_path
+            ]
+            try:
+                result = subprocess.run(
+                    cmd,
+                    capture_output=True,
+                    timeout=300,  # 5 phút timeout
+                    creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+                )
+                if result.returncode == 0 and os.path.exists(part_path):
+                    os.replace(part_path, out_path)
+                    print(f" Converted successfully: {filename}")
+                    return out_path
+                print(f" FFmpeg error: {result.stderr.decode('utf-8', errors='ignore')}")
+            except (subprocess.TimeoutExpired, OSError) as e:
+                print(f" Subprocess failed, using pydub: {e}")
+
+        # Fallback về pydub - chỉ decode khi FFmpeg trực tiếp thất bại
+        try:
+            from pydub import AudioSegment
+            audio = AudioSegment.from_file(path)
+            audio.export(part_path, format="wav",
+                         parameters=["-threads", str(self.threads_per_job)])
+            os.replace(part_path, out_path)
+            print(f" Converted successfully: {filename}")
+            return out_path
+        except Exception as e:
+            print(f" Convert error: {e}")
+            try:
+                if os.path.exists(part_path):
+                    os.remove(part_path)
+            except OSError:
+                pass
+            return None
@@ -147,7 +147,7 @@ class ModernSlider(tk.Canvas):
     
     def __init__(self, parent, width=300, height=20, 
                  min_val=0, max_val=100, value=0,
-                 command=None, **kwargs):
+                 command=None, live=True, preview_command=None, hover_command=None, **kwargs):
         super().__init__(parent, width=width, height=height,
                         bg=Theme.BG_DARK, highlightthickness=0, **kwargs)
         
@@ -155,16 +155,25 @@ class ModernSlider(tk.Canvas):
         self.max_val = max_val
         self._value = value
         self.command = command
+        # live=False: gộp các event kéo, chỉ gọi command một lần khi thả chuột
+        self.live = live
+        self.preview_command = preview_command  # Gọi khi kéo (live=False)
+        self.hover_command = hover_command  # Gọi khi rê chuột (value dưới con trỏ, None khi rời slider)
+        self._pending_commit = False
         self.width = width
         self.height = height
         self.is_dragging = False
         self.gradient_offset = 0.0
+        # Waveform: polygon nền vẽ một lần (tag "waveform"), _draw chỉ vẽ lại phần đã phát
+        self._wave_top = None
+        self._wave_bottom = None
         
         self.bind("<Button-1>", self._on_click)
         self.bind("<B1-Motion>", self._on_drag)
         self.bind("<ButtonRelease-1>", self._on_release)
         self.bind("<Enter>", self._on_enter)
         self.bind("<Leave>", self._on_leave)
+        self.bind("<Motion>", self._on_motion)
         
         self._animate_gradient()
         self._draw()
@@ -178,6 +187,38 @@ class ModernSlider(tk.Canvas):
         self._value = max(self.min_val, min(self.max_val, val))
         self._draw()
     
+    def set_waveform(self, peaks):
+        """Hiển thị waveform trong track - peaks: dãy (min, max) trong [-1, 1], None để xóa"""
+        self.delete("waveform")
+        self._wave_top = None
+        self._wave_bottom = None
+        if peaks is None or not len(peaks):
+            self._draw()
+            return
+        
+        padding = 8
+        mid = self.height / 2
+        amp = self.height / 2 - 2
+        columns = max(1, int((self.width - 2 * padding) / 2))  # Một cột mỗi 2px
+        bins = len(peaks)
+        top, bottom = [], []
+        for c in range(columns):
+            start = c * bins // columns
+            end = max(start + 1, (c + 1) * bins // columns)
+            chunk = peaks[start:end]
+            lo = min(p[0] for p in chunk)
+            hi = max(p[1] for p in chunk)
+            x = padding + c * 2
+            top.append((x, mid - max(hi, 0.02) * amp))
+            bottom.append((x, mid - min(lo, -0.02) * amp))
+        self._wave_top = top
+        self._wave_bottom = bottom
+        
+        points = [v for pt in top + bottom[::-1] for v in pt]
+        self.create_polygon(points, fill=Theme.BG_HOVER, outline="", tags="waveform")
+        self.tag_lower("waveform")
+        self._draw()
+    
     def _animate_gradient(self):
         """Animate gradient effect"""
         self.gradient_offset = (self.gradient_offset + 0.02) % (2 * math.pi)
@@ -186,25 +227,36 @@ class ModernSlider(tk.Canvas):
         self.after(30, self._animate_gradient)
     
     def _draw(self):
-        self.delete("all")
+        # Waveform nền giữ nguyên, chỉ vẽ lại các phần động
+        self.delete("dynamic")
         
         padding = 8
         track_height = 8
         track_y = self.height // 2 - track_height // 2
         
-        # Track background với shadow
-        self.create_rectangle(padding + 1, track_y + 1, 
-                            self.width - padding + 1, track_y + track_height + 1,
-                            fill="#000000", outline="")
-        self.create_rectangle(padding, track_y, 
-                            self.width - padding, track_y + track_height,
-                            fill=Theme.BG_HOVER, outline="")
-        
-        # Progress với gradient animation
         progress_ratio = (self._value - self.min_val) / (self.max_val - self.min_val) if self.max_val > self.min_val else 0
         progress_width = (self.width - 2 * padding) * progress_ratio
         
-        if progress_width > 0:
+        if self._wave_top:
+            # Phần đã phát của waveform, màu theo gradient đang chạy
+            progress_x = padding + progress_width
+            count = sum(1 for x, _ in self._wave_top if x <= progress_x)
+            if count >= 2:
+                t = (self.gradient_offset / (2 * math.pi)) % 1.0
+                color = f"#{int(255 * t):02x}{int(212 * (1 - t)):02x}{int(255 - 145 * t):02x}"
+                points = [v for pt in self._wave_top[:count] + self._wave_bottom[count - 1::-1] for v in pt]
+                self.create_polygon(points, fill=color, outline="", tags="dynamic")
+        else:
+            # Track background với shadow
+            self.create_rectangle(padding + 1, track_y + 1, 
+                                self.width - padding + 1, track_y + track_height + 1,
+                                fill="#000000", outline="", tags="dynamic")
+            self.create_rectangle(padding, track_y, 
+                                self.width - padding, track_y + track_height,
+                                fill=Theme.BG_HOVER, outline="", tags="dynamic")
+        
+        # Progress với gradient animation
+        if progress_width > 0 and not self._wave_top:
             # Gradient effect với animation
             segments = 20
             segment_width = progress_width / segments
@@ -222,7 +274,7 @@ class ModernSlider(tk.Canvas):
                 color = f"#{r:02x}{g:02x}{b:02x}"
                 
                 self.create_rectangle(x1, track_y, x2, track_y + track_height,
-                                     fill=color, outline="")
+                                     fill=color, outline="", tags="dynamic")
         
         # Knob với glow effect
         knob_x = padding + progress_width
@@ -235,16 +287,16 @@ class ModernSlider(tk.Canvas):
                 glow_color = self._hex_with_alpha(Theme.ACCENT_PRIMARY, int(alpha * 100))
                 self.create_oval(knob_x - r, self.height // 2 - r,
                                knob_x + r, self.height // 2 + r,
-                               fill="", outline=glow_color, width=1)
+                               fill="", outline=glow_color, width=1, tags="dynamic")
         
         # Knob shadow
         self.create_oval(knob_x - knob_radius + 1, self.height // 2 - knob_radius + 1,
                         knob_x + knob_radius + 1, self.height // 2 + knob_radius + 1,
-                        fill="#000000", outline="")
+                        fill="#000000", outline="", tags="dynamic")
         # Knob
         self.create_oval(knob_x - knob_radius, self.height // 2 - knob_radius,
                         knob_x + knob_radius, self.height // 2 + knob_radius,
-                        fill=Theme.ACCENT_PRIMARY, outline=Theme.TEXT_PRIMARY, width=2)
+                        fill=Theme.ACCENT_PRIMARY, outline=Theme.TEXT_PRIMARY, width=2, tags="dynamic")
     
     def _hex_with_alpha(self, hex_color, alpha):
         """Convert hex color với alpha (0-255)"""
@@ -267,21 +319,157 @@ class ModernSlider(tk.Canvas):
     def _on_release(self, event):
         self.is_dragging = False
         self._draw()
+        
+        # Chỉ vị trí cuối cùng mới kích hoạt command
+        if self._pending_commit:
+            self._pending_commit = False
+            if self.command:
+                self.command(self._value)
     
     def _on_enter(self, event):
         pass
     
     def _on_leave(self, event):
-        self.is_dragging = False
+        # Non-live: Tk vẫn gửi ButtonRelease khi kéo ra ngoài, giữ trạng thái kéo
+        if self.live:
+            self.is_dragging = False
+        if self.hover_command and not self.is_dragging:
+            self.hover_command(None)
     
-    def _update_value(self, x):
+    def _on_motion(self, event):
+        if self.hover_command and not self.is_dragging:
+            self.hover_command(self.value_at(event.x))
+    
+    def value_at(self, x) -> float:
+        """Giá trị tương ứng với tọa độ x trên slider"""
         padding = 8
         ratio = (x - padding) / (self.width - 2 * padding)
         ratio = max(0, min(1, ratio))
-        self._value = self.min_val + ratio * (self.max_val - self.min_val)
+        return self.min_val + ratio * (self.max_val - self.min_val)
+    
+    def x_of(self, value) -> float:
+        """Tọa độ x của giá trị value"""
+        padding = 8
+        span = self.max_val - self.min_val
+        ratio = (value - self.min_val) / span if span > 0 else 0
+        return padding + max(0, min(1, ratio)) * (self.width - 2 * padding)
+    
+    def _update_value(self, x):
+        self._value = self.value_at(x)
         self._draw()
         
-        if self.command:
-            self.command(self._value)
+        if self.live:
+            if self.command:
+                self.command(self._value)
+        else:
+            self._pending_commit = True
+            if self.preview_command:
+                self.preview_command(self._value)
+
+
+class SeekPreview:
+    """Popup nhỏ phía trên slider: frame preview (sprite sheet) + thời gian
 
+    Một Toplevel không viền tạo một lần; show() chỉ đổi ảnh/chữ và vị trí.
+    """
+    
+    def __init__(self, parent):
+        self.window = tk.Toplevel(parent)
+        self.window.overrideredirect(True)
+        self.window.withdraw()
+        self.window.configure(bg=Theme.ACCENT_PRIMARY)
+        self.image_label = tk.Label(self.window, bg=Theme.BG_DARK, bd=0)
+        self.image_label.pack(padx=1, pady=(1, 0))
+        self.time_label = tk.Label(self.window, font=("Segoe UI", 9, "bold"),
+                                   bg=Theme.BG_DARK, fg=Theme.TEXT_PRIMARY)
+        self.time_label.pack(fill=tk.X, padx=1, pady=(0, 1))
+        self._visible = False
+    
+    def show(self, anchor_widget, x: float, photo, text: str):
+        """Hiện popup căn giữa tại x (tọa độ trong anchor_widget), ngay trên widget"""
+        self.image_label.configure(image=photo)
+        self.image_label.image = photo
+        self.time_label.configure(text=text)
+        width = photo.width() + 2
+        height = photo.height() + self.time_label.winfo_reqheight() + 2
+        left = int(anchor_widget.winfo_rootx() + x - width / 2)
+        top = int(anchor_widget.winfo_rooty() - height - 6)
+        self.window.geometry(f"+{left}+{top}")
+        if not self._visible:
+            self.window.deiconify()
+            self.window.lift()
+            self._visible = True
+    
+    def hide(self):
+        if self._visible:
+            self.window.withdraw()
+            self._visible = False
 
+
+class SpectrumView:
+    """Vẽ spectrum + level meter trên một Canvas có sẵn bằng một tập item cố định
+    
+    Các item được tạo một lần; mỗi frame chỉ cập nhật coords, không delete/create.
+    """
+    
+    TAG = "spectrum"
+    
+    def __init__(self, canvas, bands=32):
+        self.canvas = canvas
+        self.bands = bands
+        self._bars = []
+        self._level_bar = None
+        self._geometry = None
+        self._meter_x = 0
+        self._meter_width = 0
+    
+    def is_built(self) -> bool:
+        return bool(self._bars) and bool(self.canvas.find_withtag(self.TAG))
+    
+    def build(self):
+        """Xóa nội dung canvas (vinyl) và tạo các thanh spectrum"""
+        self.canvas.delete("all")
+        width = self.canvas.winfo_width() if self.canvas.winfo_width() > 1 else 380
+        height = self.canvas.winfo_height() if self.canvas.winfo_height() > 1 else 340
+        
+        padding = 20
+        meter_width = 10
+        bottom = height - padding
+        usable_height = height - 2 * padding
+        bar_area = width - 2 * padding - meter_width - 10
+        bar_width = bar_area / self.bands
+        self._geometry = (padding, bottom, usable_height, bar_width)
+        
+        self._bars = []
+        for i in range(self.bands):
+            # Màu chuyển cyan -> pink theo dải tần
+            t = i / max(1, self.bands - 1)
+            color = f"#{int(255 * t):02x}{int(212 * (1 - t)):02x}{int(255 - 145 * t):02x}"
+            x1 = padding + i * bar_width + 1
+            bar = self.canvas.create_rectangle(x1, bottom, x1 + bar_width - 2, bottom,
+                                               fill=color, outline="", tags=self.TAG)
+            self._bars.append(bar)
+        
+        meter_x = width - padding - meter_width
+        self.canvas.create_rectangle(meter_x, bottom - usable_height, meter_x + meter_width, bottom,
+                                     fill=Theme.BG_HOVER, outline="", tags=self.TAG)
+        self._level_bar = self.canvas.create_rectangle(meter_x, bottom, meter_x + meter_width, bottom,
+                                                       fill=Theme.SUCCESS, outline="", tags=self.TAG)
+        self._meter_x = meter_x
+        self._meter_width = meter_width
+    
+    def update(self, levels, level):
+        """levels: dãy [0, 1] theo dải, level: mức tổng [0, 1]"""
+        if not self.is_built():
+            self.build()
+        padding, bottom, usable_height, bar_width = self._geometry
+        coords = self.canvas.coords
+        for i, bar in enumerate(self._bars):
+            x1 = padding + i * bar_width + 1
+            coords(bar, x1, bottom - float(levels[i]) * usable_height, x1 + bar_width - 2, bottom)
+        coords(self._level_bar, self._meter_x, bottom - level * usable_height,
+               self._meter_x + self._meter_width, bottom)
+    
+    def clear(self):
+        self.canvas.delete(self.TAG)
+        self._bars = []
@@ -0,0 +1,441 @@
+
+import os
+import shutil
+from abc import ABC, abstractmethod
+import subprocess
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional, Tuple
+
+try:
+    import cv2
+    CV2_AVAILABLE = True
+except ImportError:
+    CV2_AVAILABLE = False
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+
+class FrameRing:
+    """
+    Hàng đợi frame đã decode + scale sẵn, có giới hạn, sắp theo timestamp (pts)
+
+    Producer put() bị chặn khi đầy; Tk thread pick() frame khớp clock.
+    clear() (khi seek) đánh dấu thế hệ mới - put() của thế hệ cũ bị bỏ.
+    """
+
+    def __init__(self, capacity: int = 8):
+        self.capacity = capacity
+        self._frames: deque = deque()
+        self._cond = threading.Condition()
+        self._generation = 0
+        self.skipped = 0   # Frame đã decode nhưng bị frame mới hơn thay trước khi kịp vẽ
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def put(self, pts: float, image, generation: int, stop: threading.Event) -> bool:
+        """Thêm frame - chờ khi đầy; False nếu đã seek/stop trong lúc chờ"""
+        with self._cond:
+            while len(self._frames) >= self.capacity:
+                if generation != self._generation or stop.is_set():
+                    return False
+                self._cond.wait(timeout=0.1)
+            if generation != self._generation:
+                return False
+            self._frames.append((pts, image))
+            return True
+
+    def pick(self, position: float) -> Optional[Tuple[float, object]]:
+        """Frame mới nhất có pts <= position (bỏ các frame cũ hơn) - None nếu chưa đến"""
+        picked = None
+        with self._cond:
+            while self._frames and self._frames[0][0] <= position:
+                if picked is not None:
+                    self.skipped += 1
+                picked = self._frames.popleft()
+            if picked is not None:
+                self._cond.notify_all()
+        return picked
+
+    def first(self) -> Optional[Tuple[float, object]]:
+        """Lấy frame đầu tiên bất kể pts (hiển thị ngay sau seek khi đang pause)"""
+        with self._cond:
+            if not self._frames:
+                return None
+            frame = self._frames.popleft()
+            self._cond.notify_all()
+            return frame
+
+    def next_pts(self) -> Optional[float]:
+        with self._cond:
+            return self._frames[0][0] if self._frames else None
+
+    def clear(self) -> int:
+        """Bỏ hết frame, trả về thế hệ mới"""
+        with self._cond:
+            self._frames.clear()
+            self._generation += 1
+            self._cond.notify_all()
+            return self._generation
+
+
+class FrameProducer(ABC):
+    """
+    Phần chung của các backend decode: thread producer đẩy frame RGB đã scale vào FrameRing
+
+    Đồng bộ theo clock audio, không seek tự động:
+    - Frame đã trễ hơn clock quá LATE_FRAMES chu kỳ thì bị bỏ, đếm vào dropped
+    - Frame sớm nằm chờ trong ring (put() chặn khi đầy) cho đến khi clock tới
+    - Chỉ seek() (người dùng tua) mới định vị lại nguồn video
+    Tk thread chỉ chọn frame theo clock và vẽ - không decode, không convert, không resize.
+    """
+
+    LATE_FRAMES = 1.0        # Trễ quá số chu kỳ frame này thì bỏ frame
+    TIMING_SMOOTHING = 0.05  # Hệ số trung bình trượt cho thời gian xử lý mỗi frame
+
+    def __init__(self, fps: float, position_fn: Callable[[], float], ring_size: int = 8):
+        self.fps = fps or 30
+        self.position_fn = position_fn
+        self.ring = FrameRing(ring_size)
+        self.finished = False
+        self._size = (380, 380)
+        # Buffer RGB dùng lại (không cấp phát mỗi frame)
+        self._pool: list = []
+        self._pool_index = 0
+        self.convert_ms = 0.0   # Thời gian decode/scale/convert trung bình mỗi frame
+        self.dropped = 0        # Frame bị bỏ vì đã trễ
+        self.keyframes = None   # KeyframeIndex - gán khi quét xong (có thể sau khi đã chạy)
+        self._seek_to: Optional[tuple] = (0.0, True, self.ring.generation)
+        self.owns_generation = True   # False khi ring do process khác tăng thế hệ (SharedFrameRing)
+        self._scrubbing = False  # Seek xấp xỉ: hiển thị keyframe, chưa bám clock
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True, name="video-decode")
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self.owns_generation:
+            self.ring.clear()
+        self._interrupt()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    def seek(self, position: float, exact: bool = True, generation: Optional[int] = None) -> None:
+        """Yêu cầu định vị lại - producer xử lý ở lần lặp kế tiếp (chỉ lấy yêu cầu mới nhất)
+
+        exact=False: dừng ở keyframe gần nhất, dùng khi kéo slider.
+        generation: thế hệ bên đọc đã đặt (ring chung giữa hai process) - None thì tự clear().
+        """
+        # Xóa ring trước: frame của yêu cầu này mang đúng thế hệ mới
+        if generation is None:
+            generation = self.ring.clear()
+        with self._lock:
+            self._seek_to = (max(0.0, position), exact, generation)
+            self._scrubbing = not exact
+        self._wake.set()
+        self._interrupt()
+
+    def set_size(self, width: int, height: int) -> None:
+        """Kích thước đích (canvas) - áp dụng cho các frame decode sau đó"""
+        self._size = (max(1, width), max(1, height))
+
+    def pause(self, paused: bool) -> None:
+        """Không cần làm gì: khi clock dừng, ring đầy và put() tự chặn producer"""
+
+    def _take_seek(self) -> Optional[tuple]:
+        with self._lock:
+            seek_to, self._seek_to = self._seek_to, None
+        return seek_to
+
+    def _is_late(self, pts: float) -> bool:
+        return not self._scrubbing and self.position_fn() - pts > self.LATE_FRAMES / self.fps
+
+    def _wait_for_seek(self) -> None:
+        """Hết video - chờ seek hoặc stop"""
+        self._wake.wait()
+        self._wake.clear()
+
+    def _next_buffer(self, width: int, height: int):
+        """Buffer RGB kế tiếp trong pool (cấp phát lại khi đổi kích thước)
+
+        Pool có capacity + 2 buffer: ring giữ tối đa capacity frame, Tk thread
+        đang vẽ frame mới nhất đã lấy ra, producer ghi vào buffer cũ nhất -
+        buffer đó chắc chắn đã được lấy ra và vẽ xong.
+        """
+        if not self._pool or self._pool[0].shape[:2] != (height, width):
+            self._pool = [np.empty((height, width, 3), dtype=np.uint8)
+                          for _ in range(self.ring.capacity + 2)]
+            self._pool_index = 0
+            self._on_resize(width, height)
+        buffer = self._pool[self._pool_index]
+        self._pool_index = (self._pool_index + 1) % len(self._pool)
+        return buffer
+
+    def _record_time(self, started: float) -> None:
+        elapsed = (time.perf_counter() - started) * 1000
+        self.convert_ms += (elapsed - self.convert_ms) * self.TIMING_SMOOTHING
+
+    def _interrupt(self) -> None:
+        """Backend đang chặn trên I/O thì đánh thức (seek/stop)"""
+
+    def _on_resize(self, width: int, height: int) -> None:
+        pass
+
+    @abstractmethod
+    def _run(self) -> None:
+        """Vòng lặp của thread producer (mỗi backend một kiểu đọc nguồn)"""
+
+
+class VideoDecoder(FrameProducer):
+    """
+    Backend OpenCV: đọc VideoCapture, scale rồi BGR->RGB vào buffer của pool
+
+    Chỉ thread này chạm vào VideoCapture trong lúc chạy. Frame trễ được
+    grab() bỏ qua (không retrieve/convert/scale).
+
+    Có KeyframeIndex thì seek đặt thẳng vào keyframe (không để OpenCV dò ngược
+    nhiều lần) rồi chỉ grab() tới đúng vị trí; seek xấp xỉ (kéo slider) dừng
+    luôn ở keyframe gần nhất.
+    """
+
+    def __init__(self, cap, fps: float, position_fn: Callable[[], float], ring_size: int = 8):
+        super().__init__(fps, position_fn, ring_size)
+        self.cap = cap
+        self._scaled = None
+
+    def _run(self) -> None:
+        index = 0
+        skip_until = None
+        generation = self.ring.generation
+        while not self._stop.is_set():
+            seek_to = self._take_seek()
+            if seek_to is not None:
+                position, exact, generation = seek_to
+                index, skip_until = self._locate(position, exact)
+                self.finished = False
+
+            if self.finished:
+                self._wait_for_seek()
+                continue
+
+            # Sau seek chính xác: đi tiếp từ keyframe tới vị trí đích, không retrieve
+            if skip_until is not None:
+                if index / self.fps < skip_until - 0.5 / self.fps:
+                    if not self.cap.grab():
+                        self.finished = True
+                        continue
+                    index += 1
+                    continue
+                skip_until = None
+
+            # Frame kế tiếp đã trễ so với clock - bỏ qua mà không retrieve/convert
+            if self._is_late(index / self.fps):
+                if not self.cap.grab():
+                    self.finished = True
+                    continue
+                index += 1
+                self.dropped += 1
+                continue
+
+            ok, frame = self.cap.read()
+            if not ok or frame is None:
+                self.finished = True
+                continue
+            # Timestamp thật của frame (video VFR), fallback theo số thứ tự frame
+            msec = self.cap.get(cv2.CAP_PROP_POS_MSEC)
+            pts = msec / 1000.0 if msec > 0 else index / self.fps
+            index += 1
+
+            rgb = self._convert(frame)
+            if not self.ring.put(pts, rgb, generation, self._stop):
+                continue  # Vừa seek - frame cũ bị bỏ
+
+    def _locate(self, position: float, exact: bool) -> tuple:
+        """Định vị VideoCapture - trả về (số thứ tự frame kế tiếp, vị trí cần grab tới)"""
+        keyframes = self.keyframes
+        if keyframes is None:
+            # Chưa có index - OpenCV tự tìm keyframe và decode tới frame đích
+            index = int(position * self.fps)
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+            return index, None
+        start = keyframes.before(position) if exact else keyframes.nearest(position)
+        # Đặt đúng vào keyframe: demuxer nhảy thẳng, không phải decode phần trước đó
+        self.cap.set(cv2.CAP_PROP_POS_MSEC, start * 1000.0)
+        return int(round(start * self.fps)), (position if exact else None)
+
+    def _on_resize(self, width: int, height: int) -> None:
+        self._scaled = np.empty((height, width, 3), dtype=np.uint8)
+
+    def _convert(self, frame):
+        """Scale (BGR) rồi convert sang RGB vào buffer của pool (dst=)"""
+        started = time.perf_counter()
+        width, height = self._size
+        rgb = self._next_buffer(width, height)
+
+        # Scale trước khi convert màu: thường là thu nhỏ nên convert ít pixel hơn
+        if frame.shape[1] != width or frame.shape[0] != height:
+            frame = cv2.resize(frame, (width, height), dst=self._scaled)
+        cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=rgb)
+
+        self._record_time(started)
+        return rgb
+
+
+class FFmpegVideoDecoder(FrameProducer):
+    """
+    Backend FFmpeg: decode + scale ngay trong ffmpeg (-vf scale), đọc rgb24 từ pipe
+
+    Chỉ frame đã thu nhỏ (vd 380x340 thay vì 1920x1080) đi qua pipe và vào RAM
+    của Python - CPU/băng thông bộ nhớ mỗi frame giảm theo tỉ lệ số pixel.
+    Đổi kích thước canvas thì khởi động lại ffmpeg tại timestamp hiện tại.
+    """
+
+    def __init__(self, path: str, fps: float, position_fn: Callable[[], float], ring_size: int = 8):
+        super().__init__(fps, position_fn, ring_size)
+        self.path = path
+        self._ffmpeg_path = shutil.which("ffmpeg")
+        self._proc: Optional[subprocess.Popen] = None
+        self._proc_lock = threading.Lock()
+
+    def _spawn(self, position: float, exact: bool, size: tuple) -> float:
+        """Khởi động ffmpeg từ position - trả về timestamp của frame đầu tiên"""
+        self._kill()
+        start = position
+        cmd = [self._ffmpeg_path, "-v", "error", "-nostdin"]
+        if not exact:
+            # Kéo slider: dừng ở keyframe, không decode tiếp tới vị trí chính xác
+            if self.keyframes is not None:
+                start = self.keyframes.nearest(position)
+            cmd += ["-noaccurate_seek"]
+        if start > 0:
+            cmd += ["-ss", f"{start:.3f}"]
+        width, height = size
+        cmd += [
+            "-i", self.path,
+            "-an", "-sn",
+            "-vf", f"scale={width}:{height}",
+            "-r", f"{self.fps:.3f}",      # Frame rate cố định -> pts = start + n/fps
+            "-f", "rawvideo",
+            "-pix_fmt", "rgb24",
+            "pipe:1"
+        ]
+        try:
+            proc = subprocess.Popen(
+                cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+            )
+        except OSError as e:
+            print(f"⚠️ FFmpeg video decode failed for {os.path.basename(self.path)}: {e}")
+            return start
+        with self._proc_lock:
+            self._proc = proc
+        return start
+
+    def _kill(self) -> None:
+        with self._proc_lock:
+            proc, self._proc = self._proc, None
+        if proc is not None:
+            if proc.poll() is None:
+                proc.kill()
+            proc.stdout.close()
+            proc.wait()
+
+    def _interrupt(self) -> None:
+        # Thread producer có thể đang chặn trong read() - kill để read() trả về ngay
+        with self._proc_lock:
+            proc = self._proc
+        if proc is not None and proc.poll() is None:
+            proc.kill()
+
+    def _read_frame(self, stream, buffer) -> bool:
+        """Đọc đúng một frame vào buffer có sẵn (không tạo bytes mới)"""
+        view = memoryview(buffer.reshape(-1))
+        filled = 0
+        while filled < len(view):
+            try:
+                count = stream.readinto(view[filled:])
+            except (OSError, ValueError):
+                return False
+            if not count:
+                return False
+            filled += count
+        return True
+
+    def _run(self) -> None:
+        if not self._ffmpeg_path:
+            print("⚠️ FFmpeg not found - cannot decode video")
+            self.finished = True
+            return
+
+        start = 0.0
+        count = 0
+        size = None
+        generation = self.ring.generation
+        last_pts = 0.0
+        buffer = None
+        while not self._stop.is_set():
+            seek_to = self._take_seek()
+            if seek_to is not None:
+                position, exact, generation = seek_to
+                size = self._size
+                start = self._spawn(position, exact, size)
+                count = 0
+                self.finished = False
+            elif size != self._size and not self.finished:
+                # Canvas đổi kích thước - chạy lại ffmpeg tại frame kế tiếp với scale mới
+                size = self._size
+                start = self._spawn(last_pts + 1.0 / self.fps, True, size)
+                count = 0
+
+            if self.finished:
+                self._wait_for_seek()
+                continue
+
+            with self._proc_lock:
+                proc = self._proc
+            if proc is None:
+                self.finished = True
+                continue
+
+            started = time.perf_counter()
+            # Frame trễ trước đó không vào ring - ghi đè lên buffer của nó
+            if buffer is None or buffer.shape[:2] != (size[1], size[0]):
+                buffer = self._next_buffer(*size)
+            if not self._read_frame(proc.stdout, buffer):
+                # Hết video, hoặc ffmpeg vừa bị kill để seek/stop
+                if self._seek_to is None:
+                    self.finished = True
+                continue
+            pts = start + count / self.fps
+            count += 1
+            last_pts = pts
+
+            # Pipe không bỏ qua decode được - frame trễ chỉ không được đưa lên ring
+            if self._is_late(pts):
+                self.dropped += 1
+                continue
+            self._record_time(started)
+            frame, buffer = buffer, None
+            if not self.ring.put(pts, frame, generation, self._stop):
+                continue  # Vừa seek - frame cũ bị bỏ
+        self._kill()
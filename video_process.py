@@ -0,0 +1,451 @@
+import multiprocessing
+import threading
+import time
+from multiprocessing import shared_memory
+from typing import Callable, Optional, Tuple
+
+from playback_clock import PlaybackClock
+from video_decode import NUMPY_AVAILABLE
+
+if NUMPY_AVAILABLE:
+    import numpy as np
+
+
+# Điều khiển qua multiprocessing Pipe (tuple, pickle) - frame KHÔNG đi qua pipe:
+#   UI -> video:  ('open', path, backend, fps, shm_name, slots, slot_bytes, size, position, keyframes)
+#                 ('seek', position, exact, generation)
+#                 ('size', width, height)
+#                 ('pause', paused, position)
+#                 ('clock', position, sent_time, running)
+#                 ('keyframes', times)
+#                 ('close',)
+#                 ('shutdown',)
+# Frame được ghi thẳng vào ring trong shared memory, process UI đọc tại chỗ.
+
+# Header của ring (float64) - mỗi ô chỉ một phía ghi
+WRITE = 0        # Số frame đã ghi (process video)
+READ = 1         # Số frame đã lấy ra (process UI)
+GENERATION = 2   # Thế hệ hiện tại - tăng mỗi lần seek (process UI, gửi kèm lệnh seek)
+FINISHED = 3     # Thế hệ đã decode hết video, -1 nếu chưa (process video)
+DROPPED = 4      # Frame bỏ vì trễ (process video)
+CONVERT_MS = 5   # Thời gian decode/scale trung bình mỗi frame (process video)
+HEADER_SIZE = 8
+META_FIELDS = 4  # pts, generation, width, height
+
+CLOCK_INTERVAL = 0.05   # Giây giữa hai lần gửi vị trí clock sang process video
+PUBLISH_INTERVAL = 0.05  # Giây giữa hai lần process video cập nhật bộ đếm
+PUT_POLL = 0.005         # Ring đầy - producer kiểm tra lại sau (không có Condition giữa hai process)
+
+
+class SharedFrameRing:
+    """
+    Ring frame RGB trong shared memory: process video ghi, process UI đọc tại chỗ
+
+    Cùng giao diện với FrameRing (put/pick/first/next_pts/clear/generation) nên
+    FrameProducer và VideoPlayer dùng được mà không đổi gì.
+
+    Có capacity + 2 slot nhưng producer chỉ ghi trước tối đa capacity frame:
+    slot của frame UI vừa lấy ra (đang vẽ) không bị ghi đè, giống pool buffer.
+    clear() chỉ tăng thế hệ - frame thế hệ cũ được bên đọc bỏ qua dần.
+    Chỉ process UI gọi clear(); process video nhận thế hệ mới qua lệnh seek.
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, slots: int, slot_bytes: int):
+        self.shm = shm
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.capacity = slots - 2
+        self.skipped = 0
+        meta_offset = HEADER_SIZE * 8
+        data_offset = meta_offset + slots * META_FIELDS * 8
+        self._header = np.ndarray((HEADER_SIZE,), dtype=np.float64, buffer=shm.buf)
+        self._meta = np.ndarray((slots, META_FIELDS), dtype=np.float64,
+                                buffer=shm.buf, offset=meta_offset)
+        self._data = np.ndarray((slots, slot_bytes), dtype=np.uint8,
+                                buffer=shm.buf, offset=data_offset)
+
+    @staticmethod
+    def size_for(slots: int, slot_bytes: int) -> int:
+        return HEADER_SIZE * 8 + slots * (META_FIELDS * 8 + slot_bytes)
+
+    def release(self) -> None:
+        """Bỏ các view numpy - cần trước khi shm.close()"""
+        self._header = self._meta = self._data = None
+
+    @property
+    def generation(self) -> int:
+        return int(self._header[GENERATION])
+
+    def clear(self) -> int:
+        self._header[GENERATION] += 1
+        return self.generation
+
+    # ==================== Phía ghi (process video) ====================
+
+    def put(self, pts: float, image, generation: int, stop: threading.Event) -> bool:
+        header = self._header
+        while header[WRITE] - header[READ] >= self.capacity:
+            if generation != header[GENERATION] or stop.is_set():
+                return False
+            time.sleep(PUT_POLL)
+        if generation != header[GENERATION]:
+            return False
+        height, width = image.shape[:2]
+        size = height * width * 3
+        if size > self.slot_bytes:
+            return False  # Canvas lớn hơn slot - phía UI sẽ mở lại ring mới
+        write = int(header[WRITE])
+        index = write % self.slots
+        self._data[index, :size] = image.reshape(-1)
+        self._meta[index] = (pts, generation, width, height)
+        header[WRITE] = write + 1  # Ghi sau cùng: bên đọc chỉ thấy slot đã đầy đủ
+        return True
+
+    def publish(self, finished_generation: int, dropped: int, convert_ms: float) -> None:
+        self._header[FINISHED] = finished_generation
+        self._header[DROPPED] = dropped
+        self._header[CONVERT_MS] = convert_ms
+
+    # ==================== Phía đọc (process UI) ====================
+
+    def _drop_stale(self) -> None:
+        header = self._header
+        generation = header[GENERATION]
+        read = int(header[READ])
+        write = int(header[WRITE])
+        while read < write and self._meta[read % self.slots, 1] != generation:
+            read += 1
+        header[READ] = read
+
+    def _take(self) -> Tuple[float, object]:
+        read = int(self._header[READ])
+        index = read % self.slots
+        pts, _, width, height = self._meta[index]
+        width, height = int(width), int(height)
+        # View thẳng vào shared memory - không copy
+        frame = self._data[index, :width * height * 3].reshape(height, width, 3)
+        self._header[READ] = read + 1
+        return float(pts), frame
+
+    def __len__(self) -> int:
+        if self._header is None:
+            return 0
+        self._drop_stale()
+        return int(self._header[WRITE] - self._header[READ])
+
+    def pick(self, position: float) -> Optional[Tuple[float, object]]:
+        if self._header is None:
+            return None
+        self._drop_stale()
+        picked = None
+        while self._header[READ] < self._header[WRITE]:
+            if self._meta[int(self._header[READ]) % self.slots, 0] > position:
+                break
+            if picked is not None:
+                self.skipped += 1
+            picked = self._take()
+        return picked
+
+    def first(self) -> Optional[Tuple[float, object]]:
+        if self._header is None:
+            return None
+        self._drop_stale()
+        if self._header[READ] >= self._header[WRITE]:
+            return None
+        return self._take()
+
+    def next_pts(self) -> Optional[float]:
+        if self._header is None:
+            return None
+        self._drop_stale()
+        if self._header[READ] >= self._header[WRITE]:
+            return None
+        return float(self._meta[int(self._header[READ]) % self.slots, 0])
+
+    def is_finished(self) -> bool:
+        return self._header is not None and self._header[FINISHED] == self._header[GENERATION]
+
+    @property
+    def dropped(self) -> int:
+        return int(self._header[DROPPED]) if self._header is not None else 0
+
+    @property
+    def convert_ms(self) -> float:
+        return float(self._header[CONVERT_MS]) if self._header is not None else 0.0
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """Map ring do process UI tạo - process UI giữ quyền unlink"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        # Không để resource tracker unlink hộ khi process video thoát
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+
+class VideoSession:
+    """Một video đang mở trong process video: decoder + ring shared memory"""
+
+    def __init__(self, path: str, backend: str, fps: float, shm_name: str,
+                 slots: int, slot_bytes: int, size: tuple, position: float,
+                 keyframes, clock: PlaybackClock):
+        from video_decode import FFmpegVideoDecoder, VideoDecoder
+        self.shm = _attach(shm_name)
+        self.ring = SharedFrameRing(self.shm, slots, slot_bytes)
+        self.cap = None
+        if backend == 'ffmpeg':
+            self.decoder = FFmpegVideoDecoder(path, fps, clock.position, ring_size=slots - 2)
+        else:
+            import cv2
+            self.cap = cv2.VideoCapture(path)
+            self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+            self.decoder = VideoDecoder(self.cap, fps, clock.position, ring_size=slots - 2)
+        self.decoder.ring = self.ring
+        self.decoder.owns_generation = False  # Chỉ process UI ghi ô GENERATION
+        self.set_keyframes(keyframes)
+        self.decoder.set_size(*size)
+        self.decoder.seek(position, generation=self.ring.generation)
+        self.decoder.start()
+
+    def set_keyframes(self, times) -> None:
+        if times:
+            from keyframes import KeyframeIndex
+            self.decoder.keyframes = KeyframeIndex(times)
+
+    def publish(self) -> None:
+        decoder = self.decoder
+        finished = self.ring.generation if decoder.finished else -1
+        self.ring.publish(finished, decoder.dropped, decoder.convert_ms)
+
+    def close(self) -> None:
+        self.decoder.stop()
+        if self.cap is not None:
+            self.cap.release()
+        self.ring.release()
+        self.shm.close()
+
+
+def run_video_process(conn) -> None:
+    """Entry của process video - decode + scale không tranh GIL với Tk/download"""
+    clock = PlaybackClock()
+    session: Optional[VideoSession] = None
+    while True:
+        try:
+            ready = conn.poll(PUBLISH_INTERVAL)
+            message = conn.recv() if ready else None
+        except (EOFError, OSError):
+            break  # Process UI đã thoát
+
+        if message is not None:
+            kind = message[0]
+            if kind == 'shutdown':
+                break
+            try:
+                if kind == 'open':
+                    if session is not None:
+                        session.close()
+                        session = None
+                    session = VideoSession(*message[1:], clock=clock)
+                elif kind == 'close':
+                    if session is not None:
+                        session.close()
+                        session = None
+                elif kind == 'clock':
+                    _sync_clock(clock, *message[1:])
+                elif kind == 'pause':
+                    paused, position = message[1:]
+                    _sync_clock(clock, position, time.monotonic(), not paused)
+                elif session is not None:
+                    if kind == 'seek':
+                        session.decoder.seek(*message[1:])
+                    elif kind == 'size':
+                        session.decoder.set_size(*message[1:])
+                    elif kind == 'keyframes':
+                        session.set_keyframes(message[1])
+            except Exception as e:
+                print(f"⚠️ Video process command {kind} failed: {e}")
+
+        if session is not None:
+            session.publish()
+
+    if session is not None:
+        session.close()
+
+
+def _sync_clock(clock: PlaybackClock, position: float, sent_time: float, running: bool) -> None:
+    """Bám clock của process video theo clock chung bên UI (monotonic dùng chung toàn máy)"""
+    if running:
+        position += time.monotonic() - sent_time
+        if not clock.running:
+            clock.start(position)
+        elif abs(clock.position() - position) > 0.02:
+            clock.seek(position)
+    else:
+        clock.pause()
+        if abs(clock.position() - position) > 0.02:
+            clock.seek(position)
+
+
+class VideoProcess:
+    """Process decode video dùng chung cho cả phiên app (spawn một lần)"""
+
+    def __init__(self):
+        context = multiprocessing.get_context('spawn')
+        self._conn, child_conn = context.Pipe()
+        self._process = context.Process(target=run_video_process, args=(child_conn,),
+                                        daemon=True, name="melodify-video")
+        self._process.start()
+        child_conn.close()
+        self._send_lock = threading.Lock()
+
+    def send(self, *message) -> None:
+        with self._send_lock:
+            try:
+                self._conn.send(message)
+            except (OSError, BrokenPipeError) as e:
+                print(f"⚠️ Video process unavailable: {e}")
+
+    def is_alive(self) -> bool:
+        return self._process.is_alive()
+
+    def shutdown(self) -> None:
+        self.send('shutdown')
+        self._process.join(timeout=3)
+        if self._process.is_alive():
+            self._process.terminate()
+
+
+class ProcessVideoDecoder:
+    """
+    Phía UI của decoder chạy trong VideoProcess - cùng giao diện với FrameProducer
+
+    VideoPlayer vẫn pick() frame theo clock rồi vẽ; frame là view numpy trỏ
+    thẳng vào shared memory nên process UI không decode, không convert, không copy.
+    """
+
+    MIN_SLOT = (640, 480)  # Slot đủ cho canvas nhỏ hơn mức này - resize không phải mở lại ring
+
+    def __init__(self, host: VideoProcess, path: str, backend: str, fps: float,
+                 position_fn: Callable[[], float], ring_size: int = 8):
+        self.host = host
+        self.path = path
+        self.backend = backend
+        self.fps = fps or 30
+        self.position_fn = position_fn
+        self.ring_size = ring_size
+        self.ring: Optional[SharedFrameRing] = None
+        self._shm: Optional[shared_memory.SharedMemory] = None
+        self._size = (380, 380)
+        self._seek_to = 0.0
+        self._keyframes = None
+        self._paused = False
+        self._stop = threading.Event()
+        self._clock_thread: Optional[threading.Thread] = None
+
+    # ==================== Giao diện FrameProducer ====================
+
+    @property
+    def finished(self) -> bool:
+        return self.ring is not None and self.ring.is_finished()
+
+    @property
+    def dropped(self) -> int:
+        return self.ring.dropped if self.ring is not None else 0
+
+    @property
+    def convert_ms(self) -> float:
+        return self.ring.convert_ms if self.ring is not None else 0.0
+
+    @property
+    def keyframes(self):
+        return self._keyframes
+
+    @keyframes.setter
+    def keyframes(self, index) -> None:
+        # Gán từ thread quét keyframe - gửi danh sách timestamp sang process video
+        self._keyframes = index
+        if self.ring is not None and index is not None:
+            self.host.send('keyframes', index.times)
+
+    def start(self) -> None:
+        if self.ring is None:
+            self._open(self._seek_to)
+        if self._clock_thread is None:
+            self._stop.clear()
+            self._clock_thread = threading.Thread(target=self._clock_loop, daemon=True,
+                                                  name="video-clock")
+            self._clock_thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._clock_thread is not None:
+            self._clock_thread.join(timeout=1.0)
+            self._clock_thread = None
+        if self.ring is not None:
+            self.host.send('close')
+            self._close_ring()
+
+    def seek(self, position: float, exact: bool = True) -> None:
+        position = max(0.0, position)
+        if self.ring is None:
+            self._seek_to = position
+            return
+        generation = self.ring.clear()
+        self._send_clock()
+        self.host.send('seek', position, exact, generation)
+
+    def set_size(self, width: int, height: int) -> None:
+        self._size = (max(1, width), max(1, height))
+        if self.ring is None:
+            return
+        if self._size[0] * self._size[1] * 3 > self.ring.slot_bytes:
+            # Slot hiện tại quá nhỏ - mở lại ring mới tại vị trí đang phát
+            self.host.send('close')
+            self._close_ring()
+            self._open(self.position_fn())
+        else:
+            self.host.send('size', *self._size)
+
+    def pause(self, paused: bool) -> None:
+        self._paused = paused
+        if self.ring is not None:
+            self.host.send('pause', paused, self.position_fn())
+
+    # ==================== Nội bộ ====================
+
+    def _open(self, position: float) -> None:
+        width = max(self._size[0], self.MIN_SLOT[0])
+        height = max(self._size[1], self.MIN_SLOT[1])
+        slot_bytes = width * height * 3
+        slots = self.ring_size + 2
+        self._shm = shared_memory.SharedMemory(create=True,
+                                               size=SharedFrameRing.size_for(slots, slot_bytes))
+        self.ring = SharedFrameRing(self._shm, slots, slot_bytes)
+        self.ring.publish(-1, 0, 0.0)
+        self._send_clock()
+        times = self._keyframes.times if self._keyframes is not None else None
+        self.host.send('open', self.path, self.backend, self.fps, self._shm.name,
+                       slots, slot_bytes, self._size, position, times)
+
+    def _close_ring(self) -> None:
+        ring, self.ring = self.ring, None
+        shm, self._shm = self._shm, None
+        if ring is not None:
+            ring.release()
+        if shm is not None:
+            try:
+                shm.close()
+            except BufferError:
+                pass  # Frame cuối vẫn đang được tham chiếu - mapping tự đóng khi GC
+            shm.unlink()  # Process video vẫn giữ mapping riêng tới khi 'close'
+
+    def _send_clock(self) -> None:
+        self.host.send('clock', self.position_fn(), time.monotonic(), not self._paused)
+
+    def _clock_loop(self) -> None:
+        """Gửi clock chung định kỳ - process video bỏ frame trễ theo clock này"""
+        while not self._stop.wait(CLOCK_INTERVAL):
+            self._send_clock()
@@ -0,0 +1,178 @@
+import os
+from typing import Optional
+
+from file_cache import FileCache
+from media_probe import MediaInfo, MediaProbe
+
+
+PROXY_HEIGHT = 480       # Chiều cao proxy - vinyl canvas chỉ ~380x340
+PROXY_GOP = 0.5          # Giây giữa hai keyframe - seek/scrub chỉ decode tối đa 0.5s
+PROXY_CRF = 28           # Chất lượng x264 (ảnh nhỏ, không cần cao)
+
+
+class ProxyCache(FileCache):
+    """
+    Bản proxy độ phân giải thấp, GOP ngắn cho video lớn (vd. YouTube 1080p)
+
+    - Chỉ video stream (audio vẫn phát từ file gốc), scale xuống PROXY_HEIGHT
+    - Keyframe mỗi PROXY_GOP giây: seek chính xác/kéo slider gần như tức thì
+    - Tên file theo hash (path, size, mtime) - file gốc đổi thì tạo proxy mới
+    - Giới hạn tổng dung lượng, bỏ proxy lâu không dùng nhất trước (LRU theo mtime)
+    - Ghi ra file .part rồi os.replace để player không bao giờ mở file dở
+    """
+
+    SUFFIX = '.mp4'
+    LABEL = "Video proxy"
+    TIMEOUT = 1800
+
+    def __init__(self, cache_dir: str, probe: Optional[MediaProbe] = None,
+                 max_bytes: int = 2048 * 1024 * 1024, threads: int = 2):
+        super().__init__(cache_dir, thread_name="video-proxy")
+        self.probe = probe or MediaProbe()
+        self.max_bytes = max_bytes
+        self.threads = max(1, threads)
+        self._remove_stale_parts()  # .part của lần chạy trước bị kill/crash
+
+    def wants_proxy(self, info: Optional[MediaInfo]) -> bool:
+        """Video lớn hơn proxy mới cần tạo"""
+        return info is not None and info.has_video and info.height > PROXY_HEIGHT
+
+    def proxy_size(self, info: MediaInfo) -> tuple:
+        """(width, height) của proxy tạo từ video này"""
+        height = min(info.height, PROXY_HEIGHT)
+        width = round(info.width * height / info.height) if info.height else 0
+        return width - width % 2, height
+
+    def get(self, path: str) -> Optional[str]:
+        """Proxy đã tạo - None nếu chưa có (đánh dấu vừa dùng)"""
+        proxy_path = self.cache_path(path)
+        if proxy_path is None or not os.path.exists(proxy_path):
+            return None
+        try:
+            os.utime(proxy_path)
+        except OSError:
+            pass
+        return proxy_path
+
+    def for_display(self, path: str, size: tuple) -> Optional[str]:
+        """Proxy nếu đủ lớn cho vùng hiển thị size=(width, height) - không thì None"""
+        proxy_path = self.get(path)
+        if proxy_path is None:
+            return None
+        info = self.probe.probe(path)
+        if info is None or not info.height:
+            return None
+        width, height = self.proxy_size(info)
+        if size[0] > width or size[1] > height:
+            return None  # Hiển thị lớn hơn proxy - dùng file gốc để không mờ
+        return proxy_path
+
+    def is_fresh(self, path: str) -> bool:
+        """Đã có proxy, hoặc video không cần proxy (cho LibraryJob bỏ qua)"""
+        if self.cache_path(path) is None:
+            return True
+        return self.get(path) is not None or not self.wants_proxy(self.probe.probe(path))
+
+    def request(self, path: str) -> None:
+        """Tạo proxy ở nền nếu cần (lần mở sau sẽ dùng)"""
+        if self.is_fresh(path):
+            return
+        self._request(path, None)
+
+    def build(self, path: str) -> Optional[str]:
+        """Transcode proxy (chạy trên thread nền) - trả về path proxy hoặc None"""
+        proxy_path = self.cache_path(path)
+        if proxy_path is None:
+            return None
+        if os.path.exists(proxy_path):
+            return proxy_path
+        if not self.wants_proxy(self.probe.probe(path)):
+            return None
+        # Thread khác đang tạo cùng proxy thì chờ xong rồi dùng chung
+        proxy_path = super().build(path)
+        if proxy_path is not None:
+            self._evict(keep=proxy_path)
+        return proxy_path
+
+    def load(self, path: str, proxy_path: str, key) -> None:
+        return None  # Proxy mở qua get() - không giữ trong RAM
+
+    def produce(self, path: str, part_path: str) -> bool:
+        if not super().produce(path, part_path):
+            return False
+        print(f"✅ Video proxy ready: {os.path.basename(path)}")
+        return True
+
+    def command(self, ffmpeg_path: str, path: str, output_path: str) -> list:
+        print(f"🎞️ Creating video proxy: {os.path.basename(path)}")
+        return [
+            ffmpeg_path,
+            "-v", "error",
+            "-threads", str(self.threads),
+            "-i", path,
+            "-map", "0:v:0",
+            "-an", "-sn",                                   # Audio phát từ file gốc
+            "-vf", f"scale=-2:{PROXY_HEIGHT}",
+            "-c:v", "libx264",
+            "-preset", "veryfast",
+            "-crf", str(PROXY_CRF),
+            "-pix_fmt", "yuv420p",
+            "-force_key_frames", f"expr:gte(t,n_forced*{PROXY_GOP})",  # GOP ngắn theo thời gian
+            "-sc_threshold", "0",
+            "-movflags", "+faststart",
+            "-f", "mp4",
+            "-y",
+            output_path
+        ]
+
+    def size_bytes(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def _entries(self) -> list:
+        """[(path, size, mtime)] các proxy trên đĩa, kể cả file .part"""
+        entries = []
+        try:
+            names = os.listdir(self.cache_dir)
+        except OSError:
+            return entries
+        for name in names:
+            if not name.endswith(('.mp4', '.mp4.part')):
+                continue
+            full_path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(full_path)
+            except OSError:
+                continue
+            entries.append((full_path, st.st_size, st.st_mtime))
+        return entries
+
+    def _remove_stale_parts(self) -> None:
+        """Xóa file .part không còn build nào ghi (build bị kill/crash/timeout)"""
+        for full_path, _, _ in self._entries():
+            if not full_path.endswith('.part'):
+                continue
+            with self._lock:
+                building = full_path[:-len('.part')] in self._building
+            if building:
+                continue
+            try:
+                os.remove(full_path)
+            except OSError:
+                pass
+
+    def _evict(self, keep: Optional[str] = None) -> None:
+        """Xóa proxy lâu không dùng nhất đến khi tổng dung lượng <= max_bytes"""
+        self._remove_stale_parts()
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        # .part của build đang chạy vẫn tính vào tổng nhưng không xóa
+        total = sum(size for _, size, _ in entries)
+        for full_path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            if full_path == keep or full_path.endswith('.part'):
+                continue
+            try:
+                os.remove(full_path)
+                total -= size
+            except OSError:
+                pass  # Đang được mở (Windows) - để lần sau
@@ -0,0 +1,103 @@
+
+import os
+import math
+from typing import Callable, Optional
+
+from audio_decode import NUMPY_AVAILABLE, SAMPLE_RATE, iter_pcm_blocks
+from file_cache import FileCache
+
+if NUMPY_AVAILABLE:
+    import numpy as np
+
+
+WAVEFORM_BINS = 1000   # Số cột min/max mỗi bài (đủ cho slider rộng ~1000px)
+
+
+def compute_peaks(path: str, duration: float, bins: int = WAVEFORM_BINS) -> Optional['np.ndarray']:
+    """
+    Tính min/max theo từng bin trong MỘT lượt decode streaming
+
+    Chỉ giữ một block PCM + phần dư chưa đủ một bin trong RAM.
+    Trả về int16 shape (n, 2): cột 0 = min, cột 1 = max (gộp mọi kênh).
+    """
+    if not NUMPY_AVAILABLE or duration <= 0:
+        return None
+
+    frames_per_bin = max(1, math.ceil(duration * SAMPLE_RATE / bins))
+    block_frames = frames_per_bin * max(1, SAMPLE_RATE // frames_per_bin)
+    peaks = []
+    leftover = None
+
+    for block in iter_pcm_blocks(path, block_frames):
+        if leftover is not None and len(leftover):
+            block = np.concatenate((leftover, block))
+        usable = len(block) - len(block) % frames_per_bin
+        if usable:
+            grouped = block[:usable].reshape(-1, frames_per_bin * block.shape[1])
+            peaks.append(np.stack((grouped.min(axis=1), grouped.max(axis=1)), axis=1))
+        leftover = block[usable:]
+
+    if leftover is not None and len(leftover):
+        peaks.append(np.array([[leftover.min(), leftover.max()]], dtype=np.int16))
+    if not peaks:
+        return None
+    return np.concatenate(peaks).astype(np.int16)
+
+
+class WaveformCache(FileCache):
+    """
+    Cache peaks trên đĩa (.npy nhỏ, ~4KB/bài) + trong RAM
+
+    Tên file theo hash (path, size, mtime) - file đổi thì tự tính lại.
+    Tính toán chạy trên một worker nền để không tranh CPU với phát nhạc.
+    """
+
+    SUFFIX = '.npy'
+    LABEL = "Waveform"
+
+    def __init__(self, cache_dir: str):
+        super().__init__(cache_dir, thread_name="waveform")
+
+    def get(self, path: str) -> Optional['np.ndarray']:
+        """Peaks đã tính (RAM hoặc đĩa) - None nếu chưa có"""
+        if not NUMPY_AVAILABLE:
+            return None
+        cache_path = self.cache_path(path)
+        if cache_path is None:
+            return None
+        peaks = self.recall(cache_path)
+        if peaks is not None:
+            return peaks
+        if not os.path.exists(cache_path):
+            return None
+        try:
+            peaks = np.load(cache_path)
+        except Exception as e:
+            print(f"Error loading waveform cache: {e}")
+            return None
+        self.remember(cache_path, peaks)
+        return peaks
+
+    def request(self, path: str, duration: float,
+                callback: Callable[[str, 'np.ndarray'], None]) -> None:
+        """Gọi callback(path, peaks) - ngay nếu đã cache, không thì sau khi tính xong ở nền"""
+        peaks = self.get(path)
+        if peaks is not None:
+            callback(path, peaks)
+            return
+        cache_path = self.cache_path(path)
+        if cache_path is None or not NUMPY_AVAILABLE:
+            return
+        # Đang tính thì chỉ thêm callback - báo cùng lúc khi xong
+        self._request(path, callback, key=cache_path, args=(duration,))
+
+    def produce(self, path: str, part_path: str, duration: float) -> bool:
+        peaks = compute_peaks(path, duration)
+        if peaks is None:
+            return False
+        with open(part_path, 'wb') as f:
+            np.save(f, peaks)
+        return True
+
+    def load(self, path: str, cache_path: str, key) -> 'np.ndarray':
+        return np.load(cache_path)